@@ -0,0 +1,143 @@
+import os
+import json
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+from validate_articles import parse_dates
+
+### aggregate_cube.py ###
+# Ce script maintient une table agrégée compacte des labels de biais, indexée par (fichier source, journal, date),
+# avec pour chaque jour le nombre d'articles, la somme et la somme des carrés des scores, et l'histogramme
+# des labels arrondis (-3 à 3). Les graphiques et rapports (plot.py, comptages de csv_edit.py) se calculent
+# à partir de quelques milliers de lignes au lieu de relire les fichiers d'articles complets.
+# La mise à jour est incrémentale : un manifeste garde, pour chaque fichier labellisé, le nombre d'octets déjà
+# agrégés et leur hash. Si le fichier a seulement grandi, seules les nouvelles lignes sont lues ; s'il a été
+# réécrit, ses agrégats sont recalculés.
+
+LABELED_FILES = "*_with_bias*.csv"  # Motif (glob) des fichiers d'articles labellisés
+CUBE_FILE = "bias_cube.csv"  # Table agrégée
+MANIFEST_FILE = "bias_cube_manifest.json"  # État de l'agrégation de chaque fichier source
+CSV_CHUNK_SIZE = 50_000  # Nombre de lignes lues à la fois
+LABELS = list(range(-3, 4))  # Valeurs de l'histogramme des labels
+HIST_COLUMNS = [f"hist_{label}" for label in LABELS]
+KEY_COLUMNS = ["source", "newspaper", "date"]
+VALUE_COLUMNS = ["count", "sum", "sumsq"] + HIST_COLUMNS
+VALUE_DTYPES = {"count": np.int64, "sum": np.float64, "sumsq": np.float64, **{c: np.int64 for c in HIST_COLUMNS}}
+
+# Hash des n premiers octets d'un fichier (lus par blocs)
+def prefix_hash(path, n_bytes, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        remaining = n_bytes
+        while remaining > 0:
+            block = file.read(min(block_size, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+# Table vide avec les types des colonnes (sinon object, qui se propage aux sommes lors de la concaténation)
+def empty_cube():
+    cube = pd.DataFrame(columns=KEY_COLUMNS + VALUE_COLUMNS).astype(VALUE_DTYPES)
+    return cube.astype({"date": "datetime64[ns]"})
+
+def load_cube(cube_file=CUBE_FILE):
+    if not os.path.exists(cube_file):
+        return empty_cube()
+    return pd.read_csv(cube_file, parse_dates=["date"])
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, "r") as file:
+        return json.load(file)
+
+def save_manifest(manifest, manifest_file=MANIFEST_FILE):
+    with open(manifest_file, "w") as file:
+        json.dump(manifest, file, indent=2)
+
+# Agrège un morceau d'articles labellisés par (journal, date)
+def aggregate_chunk(chunk, source):
+    scores = pd.to_numeric(chunk["bias_label"], errors="coerce")
+    rows = pd.DataFrame({
+        "newspaper": chunk["newspaper"].fillna("Unknown") if "newspaper" in chunk else "Unknown",
+        "date": parse_dates(chunk["date"]),  # Dates ISO ou françaises (Le Monde)
+        "count": 1,
+        "sum": scores,
+        "sumsq": scores ** 2,
+    })
+    # Histogramme : une colonne indicatrice par label arrondi
+    rounded = np.clip(np.rint(scores), LABELS[0], LABELS[-1])
+    for label, column in zip(LABELS, HIST_COLUMNS):
+        rows[column] = (rounded == label).astype(np.int64)
+    rows = rows[scores.notna() & rows["date"].notna()]
+    cube = rows.groupby(["newspaper", "date"], as_index=False).sum()
+    cube.insert(0, "source", source)
+    return cube
+
+# Lit un fichier labellisé à partir d'une position (en octets) et retourne ses agrégats
+def aggregate_file(path, start_byte=0):
+    header = pd.read_csv(path, nrows=0).columns.tolist()
+    parts = []
+    with open(path, "rb") as file:
+        file.seek(start_byte)
+        reader = pd.read_csv(file, chunksize=CSV_CHUNK_SIZE, header=0 if start_byte == 0 else None,
+                             names=None if start_byte == 0 else header)
+        for chunk in reader:
+            parts.append(aggregate_chunk(chunk, os.path.basename(path)))
+    if not parts:
+        return empty_cube()
+    return pd.concat(parts, ignore_index=True)
+
+# Additionne les lignes de même clé (source, journal, date)
+def merge_rows(cube):
+    return cube.groupby(KEY_COLUMNS, as_index=False)[VALUE_COLUMNS].sum().astype(VALUE_DTYPES)
+
+# Met à jour la table agrégée avec les fichiers labellisés (nouveaux, agrandis ou réécrits)
+def update_cube(pattern=LABELED_FILES, cube_file=CUBE_FILE, manifest_file=MANIFEST_FILE):
+    cube = load_cube(cube_file)
+    manifest = load_manifest(manifest_file)
+    updates = []
+    changed = False
+    for path in sorted(glob.glob(pattern)):
+        source = os.path.basename(path)
+        size = os.path.getsize(path)
+        state = manifest.get(source)
+        if state and state["bytes"] == size and state["hash"] == prefix_hash(path, size):
+            continue  # Fichier inchangé
+        if state and state["bytes"] < size and state["hash"] == prefix_hash(path, state["bytes"]):
+            print(f"{source}: aggregating {size - state['bytes']} new bytes")
+            updates.append(aggregate_file(path, state["bytes"]))
+        else:
+            # Nouveau fichier ou fichier réécrit : ses anciens agrégats sont remplacés
+            print(f"{source}: aggregating the whole file")
+            cube = cube[cube["source"] != source]
+            updates.append(aggregate_file(path))
+        manifest[source] = {"bytes": size, "hash": prefix_hash(path, size)}
+        changed = True
+    if changed:
+        cube = merge_rows(pd.concat([cube] + updates, ignore_index=True))
+        cube.sort_values(KEY_COLUMNS).to_csv(cube_file, index=False, date_format="%Y-%m-%d")
+        save_manifest(manifest, manifest_file)
+    print(f"Cube: {len(cube)} rows, {int(cube['count'].sum())} articles")
+    return cube
+
+# Agrège la table à la granularité voulue ("D" jour, "W" semaine, "M" mois) par journal
+# Retourne une ligne par (journal, période) avec count, mean, std et l'histogramme des labels.
+def query_cube(cube, freq="D", newspapers=None):
+    if newspapers is not None:
+        cube = cube[cube["newspaper"].isin(newspapers)]
+    period = pd.to_datetime(cube["date"]).dt.to_period(freq).dt.start_time
+    result = cube.assign(date=period).groupby(["newspaper", "date"], as_index=False)[VALUE_COLUMNS].sum()
+    result["mean"] = result["sum"] / result["count"]
+    variance = result["sumsq"] / result["count"] - result["mean"] ** 2
+    result["std"] = np.sqrt(variance.clip(lower=0))
+    return result[["newspaper", "date", "count", "mean", "std"] + HIST_COLUMNS]
+
+
+if __name__ == "__main__":
+    cube = update_cube()
+    monthly = query_cube(cube, "M")
+    print(monthly.pivot(index="date", columns="newspaper", values="mean").round(3).tail(12).to_string())
@@ -0,0 +1,68 @@
+import re
+import hashlib
+import unicodedata
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+### article_ids.py ###
+# Ce module attribue à chaque article un identifiant stable, calculé dès le scraping et conservé à toutes les étapes
+# (labellisation, caches, index, graphiques). L'identifiant est le hash de l'URL canonique de l'article
+# (schéma https, hôte en minuscules sans "www.", sans paramètres de suivi ni ancre, sans "/" final, autres paramètres
+# triés) ; sans URL, c'est le hash du titre et du contenu normalisés (Unicode NFKC, minuscules, espaces réduits).
+# Deux scrapings du même article donnent le même identifiant : dédoublonner ou réordonner un fichier ne casse plus
+# la correspondance entre articles et labels, qui se fait par jointure sur la colonne "article_id".
+
+ID_LENGTH = 16  # Nombre de caractères hexadécimaux de l'identifiant
+TRACKING_PREFIXES = ("utm_",)  # Paramètres de suivi retirés de l'URL (par préfixe)
+# Paramètres de suivi retirés de l'URL (par nom) : publicité, réseaux sociaux, newsletters, statistiques des journaux
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid", "_ga", "xtor", "ito",
+                   "ns_mchannel", "ns_source", "ns_campaign", "smid", "smtyp"}
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+# URL canonique : même article, même URL, quels que soient les paramètres de suivi ou la forme de l'hôte
+# Les autres paramètres (pagination, identifiant d'article...) sont gardés, triés pour ne pas dépendre de leur ordre.
+def canonical_url(url):
+    parts = urlsplit(str(url).strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = re.sub(r"/+", "/", parts.path).rstrip("/")
+    params = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                    if not is_tracking_param(name))
+    return f"https://{host}{path}" + (f"?{urlencode(params)}" if params else "")
+
+# Texte normalisé : insensible à la casse, aux espaces et aux variantes Unicode d'un même caractère
+def normalize_text(text):
+    text = unicodedata.normalize("NFKC", "" if text is None else str(text))
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def _digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:ID_LENGTH]
+
+# Identifiant d'un article : hash de l'URL canonique, ou du titre et du contenu normalisés sans URL
+def article_id(url=None, title="", content=""):
+    if isinstance(url, str) and url.strip():
+        return _digest(canonical_url(url))
+    return _digest(normalize_text(title) + "\n" + normalize_text(content))
+
+# Ajoute (ou complète) la colonne "article_id" d'un DataFrame d'articles
+# Les fichiers scrapés avant l'ajout des identifiants n'ont ni "url" ni "article_id" : l'identifiant est alors
+# calculé à partir du contenu.
+def add_article_ids(df):
+    df = df.copy()
+    urls = df["url"] if "url" in df else [None] * len(df)
+    computed = [article_id(url, title, content) for url, title, content in zip(urls, df["title"], df["content"])]
+    if "article_id" in df:
+        df["article_id"] = df["article_id"].where(df["article_id"].notna() & (df["article_id"] != ""), computed)
+    else:
+        df["article_id"] = computed
+    return df
+
+# Reporte sur des articles les colonnes d'un autre fichier (labels, scores...) par jointure sur "article_id"
+# Les articles absents de "other" ont des valeurs manquantes ; en cas de doublons dans "other", la dernière
+# ligne est conservée.
+def join_on_id(articles, other, columns):
+    other = other.drop_duplicates("article_id", keep="last").set_index("article_id")[columns]
+    return articles.drop(columns=[c for c in columns if c in articles]).join(other, on="article_id")
@@ -0,0 +1,192 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+from datetime import date, timedelta
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Racine du projet
+from bench_extractors import EXTRACTORS, load_scraper
+from standin_server import PAPERS, HOST, PORT
+from crawl_metrics import merge_snapshots
+
+### bench_crawl.py ###
+# Ce script mesure le débit de bout en bout des scrapers (articles par minute) contre le serveur local
+# standin_server.py : chaque journal est scrapé sur DAYS jours d'archives avec ses propres fonctions (fetch_archives_*,
+# extraction, écriture du CSV), par PROCESSES processus qui se partagent les jours, comme le multiprocessing
+# de lemonde_scraper.py. Deux moteurs de récupération sont comparables :
+# - "requests" : simple client HTTP exposant les méthodes du driver Selenium utilisées par les scrapers,
+# - "firefox" : vrai navigateur Firefox headless (geckodriver requis).
+# Utilisation (serveur lancé à part) :
+#   python bench/standin_server.py --latency 0.3 &
+#   python bench/bench_crawl.py --paper lemonde --days 20 --processes 4 --backend requests --no-sleep
+# Les fichiers écrits par les scrapers (CSV, progression, mesures de crawl_metrics.py) vont dans un dossier
+# temporaire ; la durée moyenne de chaque étape (get, page_source, parse, csv) est ajoutée au résultat.
+
+STAGES = ["get", "page_source", "parse", "csv"]  # Étapes mesurées par crawl_metrics.py
+DAYS = 10  # Nombre de jours d'archives scrapés par journal
+START_DATE = date(2020, 1, 2)  # Premier jour scrapé
+PROCESSES = 2  # Nombre de processus (chacun avec son driver)
+BACKEND = "requests"  # "requests" ou "firefox"
+
+# Client HTTP avec l'interface du driver Selenium utilisée par les scrapers (get, page_source, current_url...)
+class RequestsDriver:
+    def __init__(self):
+        self.session = requests.Session()
+        self.page_source, self.current_url, self.status_code = "", "", None
+        self.timeout = 30
+
+    def get(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        self.page_source, self.current_url, self.status_code = response.text, response.url, response.status_code
+
+    def set_page_load_timeout(self, seconds):
+        self.timeout = seconds
+
+    def add_cookie(self, cookie):
+        self.session.cookies.set(cookie["name"], cookie["value"])
+
+    def refresh(self):
+        self.get(self.current_url)
+
+    def find_element(self, by, value):
+        raise NotImplementedError("RequestsDriver n'exécute pas de JavaScript : utiliser --backend firefox")
+
+    def quit(self):
+        self.session.close()
+
+def make_driver(backend):
+    if backend == "requests":
+        return RequestsDriver()
+    from selenium import webdriver
+    from selenium.webdriver.firefox.options import Options
+    options = Options()
+    options.add_argument("--headless")
+    return webdriver.Firefox(options=options)
+
+# Scrape un jour d'archives avec les fonctions du scraper (les scrapers 20 Minutes et Daily Mail utilisent
+# un driver global, Les Echos pagine par mois : le n-ième jour devient la page n du mois de départ)
+def scrape_day(paper, scraper, driver, day, n):
+    if paper == "lemonde":
+        scraper.fetch_archives_monde(driver, day.strftime("%d-%m-%Y"))
+    elif paper == "20minutes":
+        scraper.driver = driver
+        scraper.fetch_archives_20minutes(day.year, day.month, day.day)
+    elif paper == "dailymail":
+        scraper.driver, scraper.fetched = driver, 0
+        scraper.fetch_archives_daily(day.year, day.month, day.day)
+    elif paper == "nyt":
+        scraper.articles_fetched, scraper.to_fetch = 0, 10
+        scraper.fetch_archives_nyt(driver, day.strftime("%Y-%m-%d"))
+    elif paper == "lesechos":
+        scraper.process_archive_page(driver, START_DATE.year, START_DATE.month, n + 1)
+
+# Processus de travail : un driver, puis les jours de la file jusqu'à épuisement
+# Les print des scrapers sont masqués sauf avec --verbose ; les erreurs restent affichées.
+def worker(paper, backend, no_sleep, verbose, metrics_dir, days, errors):
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    if no_sleep:
+        time.sleep = lambda seconds: None  # Supprime les pauses des scrapers (mesure du seul temps de traitement)
+    scraper = load_scraper(EXTRACTORS[paper][0])
+    scraper.metrics.metrics_dir = metrics_dir
+    driver = make_driver(backend)
+    try:
+        while True:
+            try:
+                n, day = days.get_nowait()
+            except Exception:
+                break
+            try:
+                scrape_day(paper, scraper, driver, day, n)
+            except Exception as error:
+                print(f"[{paper} {day}] {type(error).__name__}: {error}", file=sys.stderr)
+                errors.put(type(error).__name__)
+    finally:
+        driver.quit()
+        scraper.metrics.flush()
+
+def count_rows(directory):
+    rows = 0
+    for name in os.listdir(directory):
+        if name.endswith(".csv") and not name.startswith("daily_article_counts"):
+            with open(os.path.join(directory, name), "r", encoding="utf-8", newline="") as file:
+                rows += sum(1 for _ in csv.reader(file))
+    return rows
+
+def fetch_stats(origin):
+    return requests.get(f"{origin}/_stats", timeout=10).json()
+
+def bench_paper(paper, origin, days=DAYS, processes=PROCESSES, backend=BACKEND, no_sleep=False, verbose=False):
+    os.environ[PAPERS[paper][0]] = f"{origin}/{paper}"  # Lu par le scraper à son chargement dans les processus
+    queue, errors = multiprocessing.Queue(), multiprocessing.Queue()
+    for n in range(days):
+        queue.put((n, START_DATE + timedelta(days=n)))
+    before = fetch_stats(origin)
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)  # Les scrapers écrivent leurs CSV et fichiers de progression dans le dossier courant
+        metrics_dir = os.path.join(directory, "crawl_metrics")
+        try:
+            start = time.perf_counter()
+            workers = [multiprocessing.Process(target=worker, args=(paper, backend, no_sleep, verbose, metrics_dir, queue, errors))
+                       for _ in range(processes)]
+            for process in workers:
+                process.start()
+            for process in workers:
+                process.join()
+            elapsed = time.perf_counter() - start
+            saved = count_rows(directory)
+            stages = merge_snapshots(metrics_dir)["stages"]
+        finally:
+            os.chdir(previous_dir)
+    after = fetch_stats(origin)
+    served = lambda kind: after.get(f"{paper}/{kind}", 0) - before.get(f"{paper}/{kind}", 0)
+    error_count = 0
+    while not errors.empty():
+        errors.get()
+        error_count += 1
+    return {"paper": paper, "backend": backend, "processes": processes, "days": days, "seconds": elapsed,
+            "articles_saved": saved, "article_pages": served("article"), "archive_pages": served("archive"),
+            "http_errors": served("error"), "day_errors": error_count,
+            "articles_per_min": saved / elapsed * 60, "pages_per_min": served("article") / elapsed * 60,
+            "mb": (after.get("bytes", 0) - before.get("bytes", 0)) / 1e6,
+            "stage_ms": {stage: 1000 * sum(h["sum"] for h in stages.get(stage, {}).values())
+                                / max(sum(h["count"] for h in stages.get(stage, {}).values()), 1)
+                         for stage in STAGES}}
+
+def print_rows(rows):
+    print(f"{'paper':<11}{'backend':<10}{'proc':>5}{'days':>6}{'saved':>7}{'pages':>7}{'503':>5}{'failed':>8}"
+          f"{'seconds':>9}{'articles/min':>14}{'pages/min':>11}" + "".join(f"{stage + ' ms':>15}" for stage in STAGES))
+    for row in rows:
+        print(f"{row['paper']:<11}{row['backend']:<10}{row['processes']:>5}{row['days']:>6}{row['articles_saved']:>7}"
+              f"{row['article_pages']:>7}{row['http_errors']:>5}{row['day_errors']:>8}{row['seconds']:>9.1f}"
+              f"{row['articles_per_min']:>14.0f}{row['pages_per_min']:>11.0f}"
+              + "".join(f"{row['stage_ms'][stage]:>15.2f}" for stage in STAGES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Débit de bout en bout des scrapers contre standin_server.py")
+    parser.add_argument("--paper", action="append", choices=list(PAPERS), help="Journal(aux) à scraper")
+    parser.add_argument("--origin", default=f"http://{HOST}:{PORT}", help="Adresse du serveur local")
+    parser.add_argument("--days", type=int, default=DAYS)
+    parser.add_argument("--processes", type=int, action="append", help="Nombre(s) de processus à comparer")
+    parser.add_argument("--backend", action="append", choices=["requests", "firefox"], help="Moteur(s) à comparer")
+    parser.add_argument("--no-sleep", action="store_true", help="Supprime les pauses (time.sleep) des scrapers")
+    parser.add_argument("--verbose", action="store_true", help="Affiche les messages des scrapers")
+    parser.add_argument("--json", help="Écrit les mesures dans ce fichier (pour comparer deux versions)")
+    args = parser.parse_args()
+
+    rows = [bench_paper(paper, args.origin, args.days, processes, backend, args.no_sleep, args.verbose)
+            for paper in args.paper or list(PAPERS)
+            for backend in args.backend or [BACKEND]
+            for processes in args.processes or [PROCESSES]]
+    print_rows(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(rows, file, indent=2)
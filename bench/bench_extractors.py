@@ -0,0 +1,119 @@
+import io
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import contextlib
+import tracemalloc
+import importlib.util
+from bs4 import BeautifulSoup
+
+### bench_extractors.py ###
+# Ce script mesure les extracteurs des scrapers sur un corpus de pages enregistrées (bench/fixtures), sans réseau
+# ni navigateur : pages d'archives (normales et vides) et pages d'articles (normaux, payants, pages de campagne,
+# captcha) pour chaque journal. Pour chaque page, il vérifie que la sortie de l'extracteur est exactement celle
+# attendue (fichier .json à côté de la page, y compris l'exception levée le cas échéant) et mesure le nombre de
+# pages traitées par seconde (analyse BeautifulSoup comprise) et la mémoire allouée par page (tracemalloc).
+# Utilisation :
+#   python bench/bench_extractors.py                  # vérifie et mesure toutes les pages
+#   python bench/bench_extractors.py --paper lemonde --repeat 50
+#   python bench/bench_extractors.py --update         # réécrit les sorties attendues (après vérification manuelle)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT, "bench", "fixtures")  # Une page HTML et sa sortie attendue (.json) par cas
+REPEAT = 20  # Nombre de passages sur chaque page pour la mesure du débit
+PARSER = "html.parser"  # Analyseur BeautifulSoup utilisé par les scrapers
+
+# Journal -> (fichier du scraper, extracteur des pages d'archives, extracteur des pages d'articles)
+# Les pages dont le nom commence par "archive" passent par le premier, les autres par le second.
+EXTRACTORS = {
+    "lemonde": ("lemonde_scraper.py", "extract_article_urls_monde", "get_article_content_monde"),
+    "20minutes": ("20minutes_scraper.py", "extract_article_urls_20min", "get_article_content_20min"),
+    "dailymail": ("dailymail_scraper.py", "extract_article_urls_daily", "get_article_content_daily"),
+    "nyt": ("nyt_scraper.py", "extract_search_results_nyt", "get_article_content_nyt"),
+    "lesechos": ("echos_scraper.py", "extract_article_urls_lesechos", "get_article_content_lesechos"),
+}
+
+# Charge un scraper par son chemin (certains noms de fichiers ne sont pas des noms de modules valides)
+def load_scraper(filename):
+    path = os.path.join(ROOT, "scrapers", filename)
+    spec = importlib.util.spec_from_file_location(filename[:-3].replace(" ", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# Applique un extracteur à une page et retourne un résultat comparable au JSON attendu
+# Une exception fait partie du comportement mesuré : elle est retournée sous la forme {"error": "NomDeLException"}.
+# Les print des scrapers sont masqués pour ne pas noyer le rapport.
+def run_extractor(extractor, html, parser=PARSER):
+    soup = BeautifulSoup(html, parser)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = extractor(soup)
+    except Exception as error:
+        return {"error": type(error).__name__}
+    return {"result": json.loads(json.dumps(result, ensure_ascii=False))}
+
+# Mesure une page : débit (pages/s) et mémoire allouée au plus haut pendant une analyse + extraction
+def measure(extractor, html, repeat=REPEAT, parser=PARSER):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run_extractor(extractor, html, parser)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    run_extractor(extractor, html, parser)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return repeat / elapsed, peak
+
+def bench(papers, repeat=REPEAT, update=False, parser=PARSER, fixtures_dir=FIXTURES_DIR):
+    rows = []
+    for paper in papers:
+        filename, archive_name, article_name = EXTRACTORS[paper]
+        scraper = load_scraper(filename)
+        for page_path in sorted(glob.glob(os.path.join(fixtures_dir, paper, "*.html"))):
+            name = os.path.basename(page_path)[:-len(".html")]
+            extractor = getattr(scraper, archive_name if name.startswith("archive") else article_name)
+            with open(page_path, "r", encoding="utf-8") as file:
+                html = file.read()
+            output = run_extractor(extractor, html, parser)
+            expected_path = page_path[:-len(".html")] + ".json"
+            if update:
+                with open(expected_path, "w", encoding="utf-8") as file:
+                    json.dump(output, file, indent=2, ensure_ascii=False)
+                    file.write("\n")
+            with open(expected_path, "r", encoding="utf-8") as file:
+                match = json.load(file) == output
+            pages_per_s, peak = measure(extractor, html, repeat, parser)
+            rows.append({"paper": paper, "page": name, "kb": len(html.encode("utf-8")) / 1024,
+                         "pages_per_s": pages_per_s, "peak_mb": peak / 1e6, "match": match})
+    return rows
+
+def print_rows(rows):
+    print(f"{'paper':<11}{'page':<21}{'size KB':>9}{'pages/s':>10}{'peak MB':>9}  output")
+    for row in rows:
+        print(f"{row['paper']:<11}{row['page']:<21}{row['kb']:>9.0f}{row['pages_per_s']:>10.1f}"
+              f"{row['peak_mb']:>9.2f}  {'ok' if row['match'] else 'DIFFERENT'}")
+    total_kb = sum(row["kb"] for row in rows)
+    total_s = sum(1 / row["pages_per_s"] for row in rows)
+    print(f"{len(rows)} pages, {len(rows) / total_s:.1f} pages/s overall ({total_kb / 1024 / total_s:.2f} MB/s), "
+          f"{sum(not row['match'] for row in rows)} different")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc d'essai hors ligne des extracteurs des scrapers")
+    parser.add_argument("--paper", action="append", choices=list(EXTRACTORS), help="Journal(aux) à mesurer")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Passages par page pour la mesure du débit")
+    parser.add_argument("--parser", default=PARSER, help="Analyseur BeautifulSoup (html.parser, lxml...)")
+    parser.add_argument("--update", action="store_true", help="Réécrit les sorties attendues")
+    parser.add_argument("--json", help="Écrit les mesures dans ce fichier (pour comparer deux versions)")
+    args = parser.parse_args()
+
+    rows = bench(args.paper or list(EXTRACTORS), args.repeat, args.update, args.parser)
+    print_rows(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(rows, file, indent=2)
+    sys.exit(0 if all(row["match"] for row in rows) else 1)
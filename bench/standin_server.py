@@ -0,0 +1,112 @@
+import os
+import re
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from aiohttp import web
+
+### standin_server.py ###
+# Ce script lance un serveur HTTP local qui imite les cinq journaux scrapés, pour tester les scrapers de bout en bout
+# (navigateur ou client HTTP, multiprocessing, écriture des CSV) sans solliciter les vrais sites.
+# Chaque journal est servi sous un préfixe (/lemonde, /20minutes, /dailymail, /nyt, /lesechos) avec les mêmes chemins
+# que le vrai site : /archives-du-monde/{jj-mm-aaaa}, /archives/{aaaa}/{mm-jj}/, /home/sitemaparchive/day_{aaaammjj}.html,
+# /search (NYT), /{aaaa}/{mm}/?page=N (Les Echos). Les pages d'archives et d'articles sont celles de bench/fixtures ;
+# les liens absolus vers le vrai site sont réécrits vers le serveur. Toute autre adresse reçoit une page d'article.
+# La latence, sa variation, le taux d'erreurs (503) et le poids des pages sont réglables.
+# Utilisation :
+#   python bench/standin_server.py --latency 0.3 --jitter 0.1 --error-rate 0.02
+#   LEMONDE_BASE_URL=http://localhost:8090/lemonde python scrapers/lemonde_scraper.py   (voir aussi bench_crawl.py)
+# /_stats renvoie le nombre de pages servies par journal et par type, et le volume envoyé.
+
+HOST = "localhost"
+PORT = 8090
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+LATENCY = 0.2  # Temps de réponse moyen (en secondes)
+JITTER = 0.1  # Variation maximale autour de la latence (tirage uniforme, en secondes)
+ERROR_RATE = 0.0  # Proportion de réponses 503
+PAGE_WEIGHT = 0  # Taille minimale des pages (en Ko) : les pages plus légères sont complétées ; 0 = taille des fixtures
+SEED = 42  # Graine des tirages (latence, erreurs)
+
+# Journal -> (variable d'environnement du scraper, origine du vrai site, motif des pages d'archives)
+PAPERS = {
+    "lemonde": ("LEMONDE_BASE_URL", "https://www.lemonde.fr", r"archives-du-monde/\d{2}-\d{2}-\d{4}/?"),
+    "20minutes": ("MINUTES20_BASE_URL", "https://www.20minutes.fr", r"archives/\d{4}/\d{2}-\d{2}/?"),
+    "dailymail": ("DAILYMAIL_BASE_URL", "https://www.dailymail.co.uk", r"home/sitemaparchive/day_\d{8}\.html"),
+    "nyt": ("NYT_BASE_URL", "https://www.nytimes.com", r"search/?"),
+    "lesechos": ("LESECHOS_BASE_URL", "https://www.lesechos.fr", r"\d{4}/\d{2}/?"),
+}
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    pages = {}
+    for paper in PAPERS:
+        for name in ("archive", "archive_empty", "article"):
+            with open(os.path.join(fixtures_dir, paper, f"{name}.html"), "r", encoding="utf-8") as file:
+                pages[paper, name] = file.read()
+    return pages
+
+# Type de page demandée : page d'accueil, archives ou article
+def page_kind(paper, path):
+    if not path:
+        return "home"
+    return "archive" if re.fullmatch(PAPERS[paper][2], path) else "article"
+
+# Complète une page avec un commentaire HTML pour atteindre le poids demandé (en Ko)
+def pad(html, weight_kb):
+    missing = weight_kb * 1024 - len(html.encode("utf-8"))
+    if missing <= 0:
+        return html
+    return html.replace("</body>", f"<!-- {'x' * missing} --></body>", 1)
+
+
+class StandinNewspapers:
+    def __init__(self, latency=LATENCY, jitter=JITTER, error_rate=ERROR_RATE, page_weight=PAGE_WEIGHT,
+                 seed=SEED, fixtures_dir=FIXTURES_DIR):
+        self.latency, self.jitter, self.error_rate, self.page_weight = latency, jitter, error_rate, page_weight
+        self.random = random.Random(seed)
+        self.pages = load_fixtures(fixtures_dir)
+        self.stats = defaultdict(int)  # "journal/type" -> nombre de pages servies, plus "bytes"
+
+    async def handle(self, request):
+        paper, path = request.match_info["paper"], request.match_info.get("path", "")
+        if paper not in PAPERS:
+            raise web.HTTPNotFound()
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if self.random.random() < self.error_rate:
+            self.stats[f"{paper}/error"] += 1
+            return web.Response(status=503, text="<html><body>Service Unavailable</body></html>",
+                                content_type="text/html")
+        kind = page_kind(paper, path)
+        html = self.pages[paper, "archive_empty" if kind == "home" else kind]
+        html = html.replace(PAPERS[paper][1], f"{request.url.origin()}/{paper}")  # Liens vers le serveur
+        body = pad(html, self.page_weight).encode("utf-8")
+        self.stats[f"{paper}/{kind}"] += 1
+        self.stats["bytes"] += len(body)
+        return web.Response(body=body, content_type="text/html", charset="utf-8")
+
+    async def get_stats(self, request):
+        return web.json_response(self.stats)
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get("/_stats", self.get_stats)
+        app.router.add_get("/{paper}", self.handle)
+        app.router.add_get("/{paper}/{path:.*}", self.handle)
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur local imitant les sites des journaux scrapés")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--latency", type=float, default=LATENCY, help="Temps de réponse moyen (s)")
+    parser.add_argument("--jitter", type=float, default=JITTER, help="Variation de la latence (s)")
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE, help="Proportion de réponses 503")
+    parser.add_argument("--page-weight", type=int, default=PAGE_WEIGHT, help="Taille minimale des pages (Ko)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    for paper, (variable, _, _) in PAPERS.items():
+        print(f"export {variable}=http://{args.host}:{args.port}/{paper}")
+    server = StandinNewspapers(args.latency, args.jitter, args.error_rate, args.page_weight, args.seed)
+    web.run_app(server.make_app(), host=args.host, port=args.port)
@@ -0,0 +1,232 @@
+import os
+import glob
+import sqlite3
+import argparse
+import pandas as pd
+from aggregate_cube import prefix_hash
+from validate_articles import parse_dates
+from article_ids import add_article_ids, article_id
+
+### corpus_index.py ###
+# Ce script construit un index SQLite du corpus scrapé pour éviter de parcourir des CSV de plusieurs Go :
+# - un index plein texte FTS5 sur le titre, la description et le contenu,
+# - des index B-tree sur le journal, la date, l'URL, l'identifiant stable de l'article (article_ids.py) et le label.
+# L'index se met à jour de façon incrémentale : pour chaque fichier, on garde le nombre d'octets déjà indexés
+# et leur hash ; un fichier qui a grandi (scraper en cours) n'est relu qu'à partir des nouvelles lignes.
+# Utilisation :
+#   python corpus_index.py build [fichiers...]
+#   python corpus_index.py search "réforme des retraites" --newspaper "Le Monde" --from 2019-01-01 --to 2020-01-01
+#   python corpus_index.py exists --url https://www.lemonde.fr/...   (ou --id ..., --title "...")
+#   python corpus_index.py sample -n 20 --label 2
+#   python corpus_index.py stats
+
+INDEX_FILE = "corpus_index.sqlite"  # Base SQLite de l'index
+INPUT_FILES = ["articles_*.csv", "*_with_bias*.csv"]  # Fichiers indexés par défaut (motifs glob)
+ARTICLE_COLUMNS = ["newspaper", "title", "date", "desc", "content", "url", "article_id"]  # Colonnes des CSV bruts des scrapers
+CSV_CHUNK_SIZE = 10_000  # Nombre de lignes lues et indexées à la fois
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    newspaper TEXT,
+    date TEXT,
+    title TEXT,
+    desc TEXT,
+    content TEXT,
+    url TEXT,
+    article_id TEXT,
+    bias_label REAL
+);
+CREATE INDEX IF NOT EXISTS idx_articles_newspaper_date ON articles (newspaper, date);
+CREATE INDEX IF NOT EXISTS idx_articles_date ON articles (date);
+CREATE INDEX IF NOT EXISTS idx_articles_url ON articles (url);
+CREATE INDEX IF NOT EXISTS idx_articles_article_id ON articles (article_id);
+CREATE INDEX IF NOT EXISTS idx_articles_title ON articles (title);
+CREATE INDEX IF NOT EXISTS idx_articles_label ON articles (bias_label);
+CREATE INDEX IF NOT EXISTS idx_articles_source ON articles (source);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5 (
+    title, desc, content, content='articles', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+"""
+
+def connect(index_file=INDEX_FILE):
+    conn = sqlite3.connect(index_file)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+# Les CSV bruts des scrapers n'ont pas de ligne d'en-tête, les fichiers nettoyés ou labellisés en ont une
+def has_header(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        return file.readline().startswith("newspaper,")
+
+# Lit un CSV d'articles par morceaux à partir d'une position (en octets)
+def read_chunks(path, start_byte=0):
+    header = has_header(path)
+    columns = pd.read_csv(path, nrows=0).columns.tolist() if header else ARTICLE_COLUMNS
+    file = open(path, "rb")
+    file.seek(start_byte)
+    first_chunk = header and start_byte == 0
+    try:
+        yield from pd.read_csv(file, chunksize=CSV_CHUNK_SIZE, dtype=str, keep_default_na=False,
+                               header=0 if first_chunk else None, names=None if first_chunk else columns)
+    finally:
+        file.close()
+
+# Insère un morceau d'articles dans la table et dans l'index plein texte
+# Les fichiers antérieurs aux identifiants stables n'ont pas de colonne article_id : il est calculé à l'indexation.
+def insert_chunk(conn, chunk, source):
+    chunk = add_article_ids(chunk.assign(title=chunk.get("title", ""), content=chunk.get("content", "")))
+    column = lambda name: chunk[name] if name in chunk else pd.Series("", index=chunk.index)
+    rows = pd.DataFrame({
+        "source": source,
+        "newspaper": column("newspaper"),
+        "date": parse_dates(column("date")).dt.strftime("%Y-%m-%d"),
+        "title": column("title"),
+        "desc": column("desc"),
+        "content": column("content"),
+        "url": column("url").replace("", None),
+        "article_id": column("article_id"),
+        "bias_label": pd.to_numeric(column("bias_label"), errors="coerce"),
+    })
+    rows = rows.astype(object).where(rows.notna(), None)
+    first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM articles").fetchone()[0]
+    ids = range(first_id, first_id + len(rows))
+    conn.executemany(
+        "INSERT INTO articles (id, source, newspaper, date, title, desc, content, url, article_id, bias_label) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        zip(ids, *(rows[name] for name in rows.columns)),
+    )
+    conn.executemany("INSERT INTO articles_fts (rowid, title, desc, content) VALUES (?, ?, ?, ?)",
+                     zip(ids, rows["title"], rows["desc"], rows["content"]))
+    return len(rows)
+
+# Supprime d'un index tous les articles provenant d'un fichier (fichier réécrit)
+def remove_source(conn, source):
+    conn.execute(
+        "INSERT INTO articles_fts (articles_fts, rowid, title, desc, content) "
+        "SELECT 'delete', id, title, desc, content FROM articles WHERE source = ?", (source,)
+    )
+    conn.execute("DELETE FROM articles WHERE source = ?", (source,))
+
+# Indexe les fichiers nouveaux, agrandis ou réécrits depuis la dernière construction
+def build_index(paths, index_file=INDEX_FILE):
+    conn = connect(index_file)
+    for path in paths:
+        source = os.path.abspath(path)
+        size = os.path.getsize(path)
+        state = conn.execute("SELECT bytes, hash FROM sources WHERE path = ?", (source,)).fetchone()
+        if state and state["bytes"] == size and state["hash"] == prefix_hash(path, size):
+            continue  # Fichier inchangé
+        with conn:
+            if state and state["bytes"] < size and state["hash"] == prefix_hash(path, state["bytes"]):
+                start = state["bytes"]  # Le fichier a seulement grandi : on indexe les nouvelles lignes
+            else:
+                start = 0
+                remove_source(conn, source)
+            added = sum(insert_chunk(conn, chunk, source) for chunk in read_chunks(path, start))
+            conn.execute("INSERT OR REPLACE INTO sources (path, bytes, hash) VALUES (?, ?, ?)",
+                         (source, size, prefix_hash(path, size)))
+        print(f"{path}: {added} articles indexed")
+    total = conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+    print(f"Index: {total} articles")
+    conn.close()
+
+# Conditions SQL communes aux requêtes (journal, période, label)
+def filters(args, prefix="a."):
+    clauses, params = [], []
+    if args.newspaper:
+        clauses.append(f"{prefix}newspaper = ?")
+        params.append(args.newspaper)
+    if args.date_from:
+        clauses.append(f"{prefix}date >= ?")
+        params.append(args.date_from)
+    if args.date_to:
+        clauses.append(f"{prefix}date <= ?")
+        params.append(args.date_to)
+    if getattr(args, "label", None) is not None:
+        clauses.append(f"ROUND({prefix}bias_label) = ?")
+        params.append(args.label)
+    return clauses, params
+
+def print_rows(rows):
+    for row in rows:
+        label = "" if row["bias_label"] is None else f" [{row['bias_label']:g}]"
+        print(f"{row['date']} | {row['newspaper']} | {row['title']}{label}")
+        if "snippet" in row.keys():
+            print(f"    {row['snippet']}".replace("\n", " "))
+        elif row["url"]:
+            print(f"    {row['url']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index plein texte et métadonnées du corpus scrapé")
+    parser.add_argument("--index", default=INDEX_FILE, help="Fichier SQLite de l'index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Construit ou met à jour l'index")
+    build.add_argument("files", nargs="*", help="Fichiers CSV à indexer (par défaut : INPUT_FILES)")
+
+    for name, help_text in [("search", "Recherche plein texte"), ("sample", "Échantillon aléatoire d'articles")]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--newspaper")
+        command.add_argument("--from", dest="date_from", help="Date de début (YYYY-MM-DD)")
+        command.add_argument("--to", dest="date_to", help="Date de fin (YYYY-MM-DD)")
+        command.add_argument("--label", type=int, help="Label de biais arrondi (-3 à 3)")
+        command.add_argument("-n", "--limit", type=int, default=20)
+    commands.choices["search"].add_argument("query", help="Requête FTS5 (mots, \"expression exacte\", OR, NOT...)")
+
+    exists = commands.add_parser("exists", help="Vérifie si un article est déjà dans le corpus")
+    exists.add_argument("--url")
+    exists.add_argument("--id", dest="article_id", help="Identifiant stable de l'article (article_ids.py)")
+    exists.add_argument("--title")
+
+    commands.add_parser("stats", help="Nombre d'articles par journal")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        paths = args.files or sorted({path for pattern in INPUT_FILES for path in glob.glob(pattern)})
+        build_index(paths, args.index)
+    else:
+        conn = connect(args.index)
+        if args.command == "search":
+            clauses, params = filters(args)
+            where = "".join(f" AND {clause}" for clause in clauses)
+            rows = conn.execute(
+                "SELECT a.newspaper, a.date, a.title, a.url, a.bias_label, "
+                "snippet(articles_fts, 2, '[', ']', '…', 12) AS snippet "
+                "FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid "
+                f"WHERE articles_fts MATCH ?{where} ORDER BY bm25(articles_fts) LIMIT ?",
+                [args.query] + params + [args.limit],
+            ).fetchall()
+            print_rows(rows)
+        elif args.command == "sample":
+            clauses, params = filters(args)
+            where = " WHERE " + " AND ".join(clauses) if clauses else ""
+            rows = conn.execute(
+                f"SELECT a.newspaper, a.date, a.title, a.url, a.bias_label FROM articles a{where} "
+                "ORDER BY RANDOM() LIMIT ?", params + [args.limit]
+            ).fetchall()
+            print_rows(rows)
+        elif args.command == "exists":
+            # Une URL est recherchée par son identifiant : les variantes (paramètres de suivi, "www.") sont trouvées
+            if args.url:
+                args.article_id = article_id(args.url)
+            column, value = ("article_id", args.article_id) if args.article_id else ("title", args.title)
+            if value is None:
+                parser.error("exists : --url, --id ou --title est requis")
+            rows = conn.execute(f"SELECT a.newspaper, a.date, a.title, a.url, a.bias_label FROM articles a "
+                                f"WHERE a.{column} = ? LIMIT 5", (value,)).fetchall()
+            print("yes" if rows else "no")
+            print_rows(rows)
+        elif args.command == "stats":
+            for row in conn.execute("SELECT newspaper, COUNT(*) AS n, MIN(date) AS first, MAX(date) AS last "
+                                    "FROM articles GROUP BY newspaper ORDER BY n DESC"):
+                print(f"{row['newspaper']}: {row['n']} articles ({row['first']} → {row['last']})")
+        conn.close()
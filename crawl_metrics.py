@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import glob
+import time
+import atexit
+import bisect
+import argparse
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+### crawl_metrics.py ###
+# Ce module instrumente les scrapers : durée de chaque étape (driver.get, sérialisation page_source, analyse
+# BeautifulSoup, écriture CSV) sous forme d'histogrammes, issue des chargements par domaine (statut HTTP ou "ok",
+# nom de l'exception), volume des pages récupérées, articles sauvegardés et articles par minute.
+# Chaque processus de scraping garde ses compteurs en mémoire (quelques microsecondes par mesure) et les écrit
+# toutes les SNAPSHOT_INTERVAL secondes dans un fichier JSON de METRICS_DIR (un fichier par processus, ce qui
+# fonctionne avec le multiprocessing de lemonde_scraper.py).
+# Lecture des mesures :
+#   python crawl_metrics.py                 # résumé de tous les fichiers (médiane et p95 par étape, par domaine)
+#   python crawl_metrics.py --serve 9100    # point d'accès /metrics au format texte Prometheus
+# Supprimer METRICS_DIR remet les compteurs à zéro.
+
+METRICS_DIR = os.environ.get("CRAWL_METRICS_DIR", "crawl_metrics")  # Dossier des fichiers JSON (un par processus)
+SNAPSHOT_INTERVAL = 10  # Intervalle (en secondes) entre deux écritures du fichier JSON
+BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]  # Bornes des histogrammes (s)
+PORT = 9100  # Port du point d'accès Prometheus
+
+def domain_of(url):
+    return urlsplit(url).netloc or "unknown"
+
+
+# Compteurs d'un processus de scraping
+class CrawlMetrics:
+    def __init__(self, name=None, metrics_dir=METRICS_DIR, interval=SNAPSHOT_INTERVAL):
+        self.name = name or os.path.splitext(os.path.basename(sys.argv[0]))[0] or "scraper"
+        self.metrics_dir, self.interval = os.path.abspath(metrics_dir), interval
+        self.lock = threading.Lock()
+        self.pid = None
+
+    # Remet les compteurs à zéro dans un nouveau processus (multiprocessing) et lance l'écriture périodique
+    def _start(self):
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.stages = {}  # (étape, domaine) -> [effectifs par intervalle, somme des durées, nombre]
+        self.status = {}  # (domaine, statut) -> nombre
+        self.bytes = {}  # domaine -> octets
+        self.articles = {}  # domaine -> articles sauvegardés
+        self.last_snapshot = (self.started, 0)
+        thread = threading.Thread(target=self._snapshot_loop, daemon=True)
+        thread.start()
+        atexit.register(self.flush)
+
+    def _check_process(self):
+        if self.pid != os.getpid():
+            self._start()
+
+    def observe(self, stage, url, seconds):
+        self._check_process()
+        key = (stage, domain_of(url))
+        with self.lock:
+            histogram = self.stages.get(key)
+            if histogram is None:
+                histogram = self.stages[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def count_status(self, url, status):
+        self._check_process()
+        key = (domain_of(url), str(status))
+        with self.lock:
+            self.status[key] = self.status.get(key, 0) + 1
+
+    # Mesure la durée d'une étape ; une exception est comptée comme statut du domaine puis relancée
+    @contextmanager
+    def stage(self, stage, url):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as error:
+            self.count_status(url, type(error).__name__)
+            raise
+        finally:
+            self.observe(stage, url, time.perf_counter() - start)
+
+    # Charge une page avec un driver Selenium (ou compatible) et retourne son HTML
+    # Selenium ne donne pas le statut HTTP : il est compté "ok", sauf si le driver a un attribut status_code.
+    def get_page(self, driver, url):
+        with self.stage("get", url):
+            driver.get(url)
+        with self.stage("page_source", url):
+            html = driver.page_source
+        self.page(url, html, getattr(driver, "status_code", "ok"))
+        return html
+
+    # Compte une page récupérée (statut et taille)
+    def page(self, url, html, status="ok"):
+        self.count_status(url, status)
+        domain = domain_of(url)
+        with self.lock:
+            self.bytes[domain] = self.bytes.get(domain, 0) + len(html.encode("utf-8"))
+
+    def article_saved(self, url):
+        self._check_process()
+        domain = domain_of(url)
+        with self.lock:
+            self.articles[domain] = self.articles.get(domain, 0) + 1
+
+    def snapshot(self):
+        self._check_process()
+        now = time.time()
+        with self.lock:
+            stages = {}
+            for (stage, domain), (counts, total, count) in self.stages.items():
+                stages.setdefault(stage, {})[domain] = {"buckets": list(counts), "sum": total, "count": count}
+            domains = {}
+            for (domain, status), count in self.status.items():
+                domains.setdefault(domain, {"status": {}})["status"][status] = count
+            for domain in set(self.bytes) | set(self.articles):
+                entry = domains.setdefault(domain, {"status": {}})
+                entry["bytes"] = self.bytes.get(domain, 0)
+                entry["articles"] = self.articles.get(domain, 0)
+            articles = sum(self.articles.values())
+        last_time, last_articles = self.last_snapshot
+        self.last_snapshot = (now, articles)
+        return {
+            "scraper": self.name,
+            "pid": self.pid,
+            "started": self.started,
+            "updated": now,
+            "articles": articles,
+            "articles_per_min": articles / max(now - self.started, 1e-9) * 60,
+            "recent_articles_per_min": (articles - last_articles) / max(now - last_time, 1e-9) * 60,
+            "buckets": BUCKETS,
+            "stages": stages,
+            "domains": domains,
+        }
+
+    # Écrit le fichier JSON du processus (écriture atomique : le lecteur ne voit jamais un fichier à moitié écrit)
+    def flush(self):
+        if self.pid != os.getpid():
+            return  # Rien mesuré dans ce processus
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        path = os.path.join(self.metrics_dir, f"{self.name}_{self.pid}.json")
+        with open(path + ".tmp", "w") as file:
+            json.dump(self.snapshot(), file)
+        os.replace(path + ".tmp", path)
+
+    def _snapshot_loop(self):
+        pid, wakeup = self.pid, threading.Event()
+        while pid == os.getpid():
+            wakeup.wait(self.interval)  # Pas time.sleep, que bench_crawl.py --no-sleep remplace
+            try:
+                self.flush()
+            except OSError as error:
+                print(f"crawl_metrics: {error}", file=sys.stderr)
+
+
+# Instance partagée par les scrapers
+metrics = CrawlMetrics()
+
+
+### Lecture des fichiers JSON ###
+
+# Additionne les fichiers de tous les processus
+def merge_snapshots(metrics_dir=METRICS_DIR):
+    merged = {"stages": {}, "domains": {}, "articles": 0, "processes": 0, "started": None, "updated": None}
+    for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        with open(path, "r") as file:
+            snapshot = json.load(file)
+        merged["processes"] += 1
+        merged["articles"] += snapshot["articles"]
+        merged["started"] = min(merged["started"] or snapshot["started"], snapshot["started"])
+        merged["updated"] = max(merged["updated"] or snapshot["updated"], snapshot["updated"])
+        for stage, per_domain in snapshot["stages"].items():
+            for domain, histogram in per_domain.items():
+                target = merged["stages"].setdefault(stage, {}).setdefault(
+                    domain, {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0})
+                target["buckets"] = [a + b for a, b in zip(target["buckets"], histogram["buckets"])]
+                target["sum"] += histogram["sum"]
+                target["count"] += histogram["count"]
+        for domain, entry in snapshot["domains"].items():
+            target = merged["domains"].setdefault(domain, {"status": {}, "bytes": 0, "articles": 0})
+            for status, count in entry["status"].items():
+                target["status"][status] = target["status"].get(status, 0) + count
+            target["bytes"] += entry.get("bytes", 0)
+            target["articles"] += entry.get("articles", 0)
+    if merged["processes"]:
+        merged["articles_per_min"] = merged["articles"] / max(merged["updated"] - merged["started"], 1e-9) * 60
+    return merged
+
+# Quantile estimé à partir d'un histogramme (borne supérieure de l'intervalle qui le contient)
+def histogram_quantile(buckets, q):
+    total = sum(buckets)
+    rank, cumulated = q * total, 0
+    for bound, count in zip(BUCKETS + [float("inf")], buckets):
+        cumulated += count
+        if cumulated >= rank:
+            return bound
+    return float("inf")
+
+# Texte au format d'exposition Prometheus
+def prometheus_text(merged):
+    lines = ["# TYPE crawl_stage_seconds histogram"]
+    for stage, per_domain in sorted(merged["stages"].items()):
+        for domain, histogram in sorted(per_domain.items()):
+            labels = f'stage="{stage}",domain="{domain}"'
+            cumulated = 0
+            for bound, count in zip(BUCKETS + ["+Inf"], histogram["buckets"]):
+                cumulated += count
+                lines.append(f'crawl_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulated}')
+            lines.append(f"crawl_stage_seconds_sum{{{labels}}} {histogram['sum']}")
+            lines.append(f"crawl_stage_seconds_count{{{labels}}} {histogram['count']}")
+    lines.append("# TYPE crawl_pages_total counter")
+    for domain, entry in sorted(merged["domains"].items()):
+        for status, count in sorted(entry["status"].items()):
+            lines.append(f'crawl_pages_total{{domain="{domain}",status="{status}"}} {count}')
+    lines.append("# TYPE crawl_bytes_total counter")
+    lines += [f'crawl_bytes_total{{domain="{d}"}} {e["bytes"]}' for d, e in sorted(merged["domains"].items())]
+    lines.append("# TYPE crawl_articles_total counter")
+    lines += [f'crawl_articles_total{{domain="{d}"}} {e["articles"]}' for d, e in sorted(merged["domains"].items())]
+    lines.append("# TYPE crawl_articles_per_minute gauge")
+    lines.append(f"crawl_articles_per_minute {merged.get('articles_per_min', 0)}")
+    return "\n".join(lines) + "\n"
+
+def print_summary(merged):
+    print(f"{merged['processes']} processes, {merged['articles']} articles, "
+          f"{merged.get('articles_per_min', 0):.1f} articles/min")
+    print(f"{'stage':<13}{'domain':<28}{'count':>8}{'mean ms':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    for stage, per_domain in sorted(merged["stages"].items()):
+        for domain, histogram in sorted(per_domain.items()):
+            mean = histogram["sum"] / histogram["count"] * 1000
+            p50, p95 = (histogram_quantile(histogram["buckets"], q) * 1000 for q in (0.5, 0.95))
+            print(f"{stage:<13}{domain:<28}{histogram['count']:>8}{mean:>10.1f}{p50:>9.0f}{p95:>9.0f}")
+    for domain, entry in sorted(merged["domains"].items()):
+        status = ", ".join(f"{status}: {count}" for status, count in sorted(entry["status"].items()))
+        print(f"{domain}: {entry['articles']} articles, {entry['bytes'] / 1e6:.1f} MB, {status}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesures des scrapers (fichiers JSON de chaque processus)")
+    parser.add_argument("--dir", default=METRICS_DIR, help="Dossier des fichiers JSON")
+    parser.add_argument("--serve", type=int, nargs="?", const=PORT, help="Sert /metrics au format Prometheus")
+    args = parser.parse_args()
+
+    if args.serve is None:
+        print_summary(merge_snapshots(args.dir))
+    else:
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = prometheus_text(merge_snapshots(args.dir)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        print(f"Serving http://localhost:{args.serve}/metrics")
+        ThreadingHTTPServer(("", args.serve), MetricsHandler).serve_forever()
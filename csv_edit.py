@@ -33,6 +33,8 @@ def get_last_saved_date(csv_file_path):
     return last_date,title,nb_articles
 
 # Supprime les doublons d'un fichier CSV et écrit le résultat dans un nouveau fichier.
+# Les lignes écrites par les scrapers récents se terminent par l'URL et l'identifiant stable de l'article
+# (voir article_ids.py) : deux lignes de même identifiant sont le même article, même si son texte a changé.
 def remove_duplicates_from_csv(input_file, output_file):
     seen = set()  # Pour suivre les lignes uniques
     with open(input_file, mode='r', encoding='utf-8') as infile, \
@@ -41,7 +43,7 @@ def remove_duplicates_from_csv(input_file, output_file):
         writer = csv.writer(outfile)
         
         for row in reader:
-            row_tuple = tuple(row)  # Convertit la ligne en tuple (hashable)
+            row_tuple = ("id", row[6]) if len(row) > 6 and row[6] else tuple(row)  # Clé hashable de la ligne
             if row_tuple not in seen:
                 seen.add(row_tuple)  # Ajoute à l'ensemble si pas déjà vu
                 writer.writerow(row)  # Écrit la ligne unique dans le fichier de sortie
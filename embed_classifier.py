@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import torch
+from transformers import AutoTokenizer, AutoModel
+from sklearn.linear_model import Ridge, LogisticRegression
+from fine_tune import load_labeled_articles, split_indices
+from local_label import make_length_batches, read_articles, write_articles, CLASS_SCORES
+from article_ids import add_article_ids
+
+### embed_classifier.py ###
+# Ce script est une alternative rapide au fine-tuning complet de fine_tune.py.
+# Chaque article est encodé une seule fois par un modèle d'embeddings de phrases multilingue ; les vecteurs sont
+# stockés dans une matrice en mémoire mappée indexée par l'identifiant de l'article, puis de petits modèles
+# linéaires (régression ridge sur le score continu de -3 à 3, régression logistique sur les 7 classes)
+# sont entraînés dessus en quelques secondes. Les articles déjà encodés ne le sont jamais deux fois :
+# on peut itérer sur les labels et les modèles plusieurs fois par heure, et labelliser de nouveaux articles
+# à la vitesse de l'encodeur.
+
+EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"  # Encodeur de phrases multilingue
+EMBEDDING_DIR = "./embeddings"  # Dossier du cache d'embeddings (un sous-dossier par modèle)
+CSV_FILE = "nyt_with_bias_mini.csv"  # Articles annotés pour entraîner les modèles linéaires
+INPUT_FILE = None  # Fichier (CSV, Parquet ou store compressé) d'articles à labelliser avec le meilleur modèle, ou None
+OUTPUT_FILE = "articles_with_bias_embed.csv"  # Fichier de sortie (même format que openai_label.py)
+HEAD_FILE = "embed_head.npz"  # Poids du modèle linéaire retenu
+
+MAX_LENGTH = 256  # Longueur maximale (en tokens) lue par l'encodeur
+MAX_BATCH_TOKENS = 16_384  # Budget de tokens (padding compris) d'un batch d'encodage
+MAX_BATCH_SIZE = 64  # Nombre maximal d'articles par batch d'encodage
+RIDGE_ALPHAS = [0.1, 1.0, 10.0, 100.0]  # Régularisations testées pour la régression ridge
+LOGISTIC_CS = [0.1, 1.0, 10.0]  # Régularisations (inverses) testées pour la régression logistique
+
+# Cache d'embeddings : matrice float32 (une ligne par article) ajoutée en fin de fichier et lue en mémoire mappée
+# Fichiers : vectors.f32 (matrice), keys.txt (identifiant de chaque ligne, dans l'ordre) et meta.json.
+class EmbeddingStore:
+    def __init__(self, model_name=EMBEDDING_MODEL, root=EMBEDDING_DIR):
+        self.path = os.path.join(root, model_name.replace("/", "__"))
+        os.makedirs(self.path, exist_ok=True)
+        self.model_name = model_name
+        self.dim = None
+        self.keys = []
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as file:
+                self.dim = json.load(file)["dim"]
+            with open(os.path.join(self.path, "keys.txt"), "r") as file:
+                self.keys = file.read().split()
+            # Une écriture interrompue peut laisser plus de clés que de lignes (ou l'inverse) : on garde le minimum
+            n_rows = os.path.getsize(os.path.join(self.path, "vectors.f32")) // (4 * self.dim)
+            self.keys = self.keys[:n_rows]
+        self.index = {key: row for row, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    # Ajoute des vecteurs (matrice n x dim) et leurs identifiants en fin de cache
+    def append(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(os.path.join(self.path, "meta.json"), "w") as file:
+                json.dump({"model": self.model_name, "dim": self.dim}, file, indent=2)
+        with open(os.path.join(self.path, "vectors.f32"), "ab") as file:
+            vectors.tofile(file)
+        with open(os.path.join(self.path, "keys.txt"), "a") as file:
+            file.write("".join(f"{key}\n" for key in keys))
+        for key in keys:
+            self.index[key] = len(self.keys)
+            self.keys.append(key)
+
+    # Matrice des embeddings en mémoire mappée (lecture seule)
+    def matrix(self):
+        if not self.keys:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(os.path.join(self.path, "vectors.f32"), dtype=np.float32, mode="r",
+                         shape=(len(self.keys), self.dim))
+
+    # Embeddings des articles demandés, dans l'ordre des identifiants
+    def lookup(self, keys):
+        return np.asarray(self.matrix()[[self.index[key] for key in keys]])
+
+
+# Charge l'encodeur de phrases en mode évaluation
+def load_encoder(model_name=EMBEDDING_MODEL):
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+    return tokenizer, model
+
+# Encode des textes : moyenne des états cachés sur les tokens réels, puis normalisation L2
+# Les textes sont triés par longueur et regroupés en batchs dynamiques comme dans local_label.py.
+def encode_texts(tokenizer, model, texts, max_length=MAX_LENGTH):
+    texts = [str(text) for text in texts]
+    encodings = tokenizer(texts, truncation=True, max_length=max_length)
+    lengths = [len(ids) for ids in encodings["input_ids"]]
+    vectors = np.zeros((len(texts), model.config.hidden_size), dtype=np.float32)
+    for batch in make_length_batches(lengths, MAX_BATCH_TOKENS, MAX_BATCH_SIZE):
+        features = [{key: encodings[key][i] for key in encodings.keys()} for i in batch]
+        inputs = tokenizer.pad(features, return_tensors="pt")
+        with torch.inference_mode():
+            hidden = model(**inputs).last_hidden_state.float()
+        mask = inputs["attention_mask"].unsqueeze(-1).float()
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        vectors[batch] = torch.nn.functional.normalize(pooled, dim=-1).numpy()
+    return vectors
+
+# Retourne les embeddings d'un DataFrame d'articles (colonnes title et content)
+# Le cache est indexé par l'identifiant stable des articles (colonne article_id, voir article_ids.py).
+# Seuls les articles absents du cache sont encodés ; l'encodeur n'est chargé que s'il y en a.
+def embed_articles(df, store, encoder=None):
+    keys = add_article_ids(df)["article_id"].tolist()
+    missing = {}
+    for key, content in zip(keys, df["content"]):
+        if key not in store and key not in missing:
+            missing[key] = "" if pd.isna(content) else content
+    if missing:
+        tokenizer, model = encoder or load_encoder(store.model_name)
+        start = time.time()
+        store.append(list(missing.keys()), encode_texts(tokenizer, model, list(missing.values())))
+        elapsed = time.time() - start
+        print(f"Embedded {len(missing)} new articles in {elapsed:.1f}s ({len(missing) / elapsed * 60:.0f} articles/min)")
+    print(f"Embedding cache: {len(store)} articles ({len(df) - len(missing)} reused)")
+    return store.lookup(keys)
+
+
+# Métriques de régression sur les scores de -3 à 3, calculées pour plusieurs modèles à la fois
+# predictions : matrice (n_modèles x n_articles) ; retourne un DataFrame (une ligne par modèle).
+def evaluate_scores(predictions, targets, names):
+    predictions = np.atleast_2d(predictions)
+    targets = np.asarray(targets, dtype=np.float64)
+    errors = predictions - targets
+    centered_pred = predictions - predictions.mean(axis=1, keepdims=True)
+    centered_true = targets - targets.mean()
+    denominator = np.sqrt((centered_pred ** 2).sum(axis=1) * (centered_true ** 2).sum())
+    rounded = np.clip(np.rint(predictions), -3, 3)
+    return pd.DataFrame({
+        "model": names,
+        "mae": np.abs(errors).mean(axis=1),
+        "rmse": np.sqrt((errors ** 2).mean(axis=1)),
+        "pearson": np.divide((centered_pred * centered_true).sum(axis=1), denominator,
+                             out=np.zeros(len(names)), where=denominator > 0),
+        "accuracy": (rounded == targets).mean(axis=1),
+        "within_1": (np.abs(rounded - targets) <= 1).mean(axis=1),
+    })
+
+# Entraîne les modèles linéaires (ridge et logistique, plusieurs régularisations)
+# La ridge est régressée sur le score continu, la logistique sur les classes entières (0 à 6).
+# Retourne la liste des (nom, poids, biais, type) ; le type indique comment convertir la sortie en score.
+def train_heads(x_train, scores_train, classes_train):
+    heads = []
+    for alpha in RIDGE_ALPHAS:
+        ridge = Ridge(alpha=alpha).fit(x_train, scores_train)
+        heads.append((f"ridge(alpha={alpha})", ridge.coef_[None, :], np.atleast_1d(ridge.intercept_), "ridge"))
+    for c in LOGISTIC_CS:
+        logistic = LogisticRegression(C=c, max_iter=1000).fit(x_train, classes_train)
+        # Remet les coefficients sur les 7 classes (une classe absente de l'entraînement n'est jamais prédite)
+        coef = np.zeros((len(CLASS_SCORES), x_train.shape[1]))
+        intercept = np.full(len(CLASS_SCORES), -1e9)
+        coef[logistic.classes_] = logistic.coef_ if len(logistic.classes_) > 2 else \
+            np.vstack([-logistic.coef_, logistic.coef_]) / 2
+        intercept[logistic.classes_] = logistic.intercept_ if len(logistic.classes_) > 2 else \
+            np.concatenate([-logistic.intercept_, logistic.intercept_]) / 2
+        heads.append((f"logistic(C={c})", coef, intercept, "logistic"))
+    return heads
+
+# Applique un modèle linéaire à une matrice d'embeddings et retourne les scores de -3 à 3
+# (espérance des classes pour la régression logistique)
+def predict_scores(embeddings, coef, intercept, kind):
+    logits = embeddings @ coef.T + intercept
+    if kind == "ridge":
+        return np.clip(logits[:, 0], -3, 3)
+    logits -= logits.max(axis=1, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=1, keepdims=True)
+    return probs @ CLASS_SCORES
+
+
+if __name__ == "__main__":
+    store = EmbeddingStore()
+
+    # Embeddings des articles annotés (calculés une seule fois, puis relus dans le cache)
+    df = load_labeled_articles(CSV_FILE)
+    embeddings = embed_articles(df, store)
+    scores = df["bias_score"].to_numpy(dtype=np.float64)  # Score continu, non arrondi
+    classes = df["class_label"].to_numpy()
+
+    # Même découpage entraînement/validation que fine_tune.py
+    train_indices, val_indices = split_indices(classes)
+    start = time.time()
+    heads = train_heads(embeddings[train_indices], scores[train_indices], classes[train_indices])
+    predictions = np.stack([predict_scores(embeddings[val_indices], coef, intercept, kind)
+                            for _, coef, intercept, kind in heads])
+    report = evaluate_scores(predictions, scores[val_indices], [name for name, _, _, _ in heads])
+    print(f"Trained and evaluated {len(heads)} heads in {time.time() - start:.1f}s\n")
+    print(report.round(3).to_string(index=False))
+
+    # Garde le modèle avec la plus petite erreur absolue moyenne
+    best = int(report["mae"].idxmin())
+    name, coef, intercept, kind = heads[best]
+    np.savez(HEAD_FILE, coef=coef, intercept=intercept, kind=kind, model=store.model_name)
+    print(f"\nBest head: {name} (saved to {HEAD_FILE})")
+
+    if INPUT_FILE:
+        articles = read_articles(INPUT_FILE)
+        articles["bias_label"] = np.round(predict_scores(embed_articles(articles, store), coef, intercept, kind), 3)
+        write_articles(articles, OUTPUT_FILE)
+        print(f"{len(articles)} articles labelled -> {OUTPUT_FILE}")
+        print(f"\n🧭 Mean bias score: {articles['bias_label'].mean():.3f}")
@@ -0,0 +1,144 @@
+import os
+import time
+import numpy as np
+import torch
+import onnxruntime as ort
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from fine_tune import load_labeled_articles, merge_feedback, split_dataset
+from local_label import make_length_batches, expected_scores
+
+### export_onnx.py ###
+# Ce script exporte le modèle fine-tuné (./fine_tuned_model) au format ONNX avec des axes dynamiques
+# (taille de batch et longueur de séquence), puis le quantifie dynamiquement en int8 pour l'inférence sur CPU.
+# Il vérifie ensuite que le modèle quantifié ne perd pas en précision par rapport au modèle fp32
+# sur l'ensemble de validation de fine_tune.py, et mesure la latence et le débit des trois variantes.
+
+MODEL_DIR = "./fine_tuned_model"  # Dossier du modèle sauvegardé par fine_tune.py
+ONNX_DIR = "./onnx_model"  # Dossier de sortie des modèles ONNX
+ONNX_FP32 = os.path.join(ONNX_DIR, "model_fp32.onnx")
+ONNX_INT8 = os.path.join(ONNX_DIR, "model_int8.onnx")
+OPSET = 17  # Version de l'opset ONNX
+
+MAX_LENGTH = 512
+MAX_ACCURACY_DROP = 0.01  # Perte de précision maximale tolérée pour le modèle int8 (1 point)
+MAX_SCORE_DIFF = 0.1  # Écart moyen maximal toléré entre les scores fp32 et int8
+NUM_THREADS = os.cpu_count() or 4
+BENCHMARK_SAMPLES = 256  # Nombre d'articles de validation utilisés pour le benchmark
+
+# Exporte le modèle PyTorch au format ONNX (axes dynamiques pour le batch et la séquence)
+def export_onnx(model, tokenizer, path=ONNX_FP32):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    dummy = tokenizer(["Exemple d'article", "Example article"], return_tensors="pt", padding=True)
+    torch.onnx.export(
+        model,
+        (dummy["input_ids"], dummy["attention_mask"]),
+        path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=OPSET,
+        dynamo=False,
+    )
+    print(f"Exported {path} ({os.path.getsize(path) / 1e6:.0f} MB)")
+
+# Quantifie dynamiquement les poids du modèle ONNX en int8
+def quantize_onnx(path_in=ONNX_FP32, path_out=ONNX_INT8):
+    quantize_dynamic(path_in, path_out, weight_type=QuantType.QInt8)
+    print(f"Quantized {path_out} ({os.path.getsize(path_out) / 1e6:.0f} MB)")
+
+# Crée une session ONNX Runtime sur CPU avec toutes les optimisations de graphe
+def make_session(path, num_threads=NUM_THREADS):
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = num_threads
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+# Calcule les logits d'une liste de textes avec des batchs dynamiques triés par longueur
+# "runner" est soit un modèle PyTorch, soit une session ONNX Runtime.
+# Retourne les logits (dans l'ordre des textes) et la latence de chaque batch.
+def predict_logits(runner, tokenizer, texts, max_length=MAX_LENGTH):
+    encodings = tokenizer(texts, truncation=True, max_length=max_length)
+    lengths = [len(ids) for ids in encodings["input_ids"]]
+    logits = None
+    latencies = []
+    for batch in make_length_batches(lengths):
+        features = [{"input_ids": encodings["input_ids"][i], "attention_mask": encodings["attention_mask"][i]}
+                    for i in batch]
+        start = time.perf_counter()
+        if isinstance(runner, ort.InferenceSession):
+            inputs = tokenizer.pad(features, return_tensors="np")
+            batch_logits = runner.run(["logits"], {
+                "input_ids": inputs["input_ids"].astype(np.int64),
+                "attention_mask": inputs["attention_mask"].astype(np.int64),
+            })[0]
+        else:
+            inputs = tokenizer.pad(features, return_tensors="pt")
+            with torch.inference_mode():
+                batch_logits = runner(**inputs).logits.numpy()
+        latencies.append(time.perf_counter() - start)
+        if logits is None:
+            logits = np.zeros((len(texts), batch_logits.shape[1]), dtype=np.float32)
+        logits[batch] = batch_logits
+    return logits, latencies
+
+def softmax(logits):
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+# Vérifie que le modèle quantifié reste aussi précis que le modèle fp32 sur l'ensemble de validation
+# Lève une erreur si la perte de précision ou l'écart de score dépasse les seuils.
+def check_accuracy(model, session, tokenizer, texts, labels):
+    labels = np.asarray(labels)
+    fp32_logits, _ = predict_logits(model, tokenizer, texts)
+    int8_logits, _ = predict_logits(session, tokenizer, texts)
+    fp32_accuracy = (fp32_logits.argmax(axis=1) == labels).mean()
+    int8_accuracy = (int8_logits.argmax(axis=1) == labels).mean()
+    agreement = (fp32_logits.argmax(axis=1) == int8_logits.argmax(axis=1)).mean()
+    score_diff = np.abs(expected_scores(softmax(fp32_logits)) - expected_scores(softmax(int8_logits))).mean()
+    print(f"Accuracy fp32: {fp32_accuracy:.3f} | int8: {int8_accuracy:.3f} | "
+          f"agreement: {agreement:.3f} | mean score diff: {score_diff:.3f}")
+    if fp32_accuracy - int8_accuracy > MAX_ACCURACY_DROP or score_diff > MAX_SCORE_DIFF:
+        raise ValueError("Le modèle int8 perd trop de précision par rapport au modèle fp32")
+    return {"fp32_accuracy": fp32_accuracy, "int8_accuracy": int8_accuracy,
+            "agreement": agreement, "score_diff": score_diff}
+
+
+# Mesure la latence (p50/p95 par batch) et le débit (articles par seconde) d'un modèle
+def benchmark(name, runner, tokenizer, texts):
+    predict_logits(runner, tokenizer, texts[:8])  # Échauffement
+    start = time.perf_counter()
+    _, latencies = predict_logits(runner, tokenizer, texts)
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{name:>12} : p50 {np.percentile(latencies_ms, 50):7.1f} ms/batch | "
+          f"p95 {np.percentile(latencies_ms, 95):7.1f} ms/batch | {len(texts) / elapsed:7.1f} articles/s")
+    return {"p50_ms": np.percentile(latencies_ms, 50), "p95_ms": np.percentile(latencies_ms, 95),
+            "articles_per_s": len(texts) / elapsed}
+
+
+if __name__ == "__main__":
+    torch.set_num_threads(NUM_THREADS)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_DIR, use_fast=True)
+    model = AutoModelForSequenceClassification.from_pretrained(MODEL_DIR)
+    model.eval()
+
+    export_onnx(model, tokenizer)
+    quantize_onnx()
+    session_fp32 = make_session(ONNX_FP32)
+    session_int8 = make_session(ONNX_INT8)
+
+    # Même ensemble de validation que fine_tune.py (même graine)
+    _, val_texts, _, val_labels = split_dataset(load_labeled_articles(merge_feedback()))
+    check_accuracy(model, session_int8, tokenizer, val_texts, val_labels)
+
+    bench_texts = val_texts[:BENCHMARK_SAMPLES]
+    benchmark("torch fp32", model, tokenizer, bench_texts)
+    benchmark("onnx fp32", session_fp32, tokenizer, bench_texts)
+    benchmark("onnx int8", session_int8, tokenizer, bench_texts)
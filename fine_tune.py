@@ -1,94 +1,306 @@
+import os
 import pandas as pd
+import numpy as np
 from sklearn.model_selection import train_test_split
+from text_store import read_articles
+from article_ids import add_article_ids
 
 ### fine_tune.py ###
 # Ce script fine-tune un modèle de classification de texte sur un dataset d'articles annotés avec des labels de biais.
 # Il utilise la bibliothèque HuggingFace Transformers pour le modèle et le tokenizer.
 # Il utilise le modèle XLM-Roberta, qui est adapté pour la classification de texte multilingue.
+# Il fonctionne sur GPU comme sur CPU seul : sur CPU, il utilise le bf16 si le processeur le supporte,
+# l'accumulation de gradient pour atteindre la taille de batch effective voulue, et peut geler les couches basses
+# de l'encodeur ou utiliser un modèle distillé plus petit.
 
 # Chemin du fichier CSV contenant les articles et les labels de biais
 CSV_FILE = "nyt_with_bias_mini.csv"
+FEEDBACK_FILE = "feedback_labels.csv"  # Articles relabellisés par l'API (hybrid_label.py), ajoutés s'il existe
+MERGED_FILE = "training_articles.csv"  # CSV_FILE complété par FEEDBACK_FILE : fichier réellement utilisé
+MODEL_NAME = "xlm-roberta-base"  # Modèle de base à fine-tuner
+DISTILLED_MODEL_NAME = "distilbert-base-multilingual-cased"  # Modèle multilingue distillé (6 couches), plus rapide
+USE_DISTILLED_MODEL = False  # Remplace MODEL_NAME par DISTILLED_MODEL_NAME
+SEED = 42  # Graine du découpage entraînement/validation (réutilisée par export_onnx.py pour la validation)
 
-# Lecture du fichier CSV dans un DataFrame pandas
-df = pd.read_csv(CSV_FILE)
-# Suppression des lignes où 'bias_label' ou 'content' est manquant
-df = df.dropna(subset=["bias_label", "content"])
+DEVICE = "auto"  # "auto" (GPU s'il y en a un), "cuda" ou "cpu"
+PER_DEVICE_BATCH_SIZE = 4  # Taille de batch par passe du modèle
+TARGET_EFFECTIVE_BATCH = 16  # Taille de batch effective visée (atteinte par accumulation de gradient)
+FREEZE_LAYERS = 0  # Nombre de couches basses de l'encodeur gelées (les embeddings sont gelés dès que > 0)
+CPU_THREADS = os.cpu_count() or 4  # Nombre de threads utilisés sur CPU
 
-# Garde uniquement les lignes où 'bias_label' n'est pas vide
-df = df[df['bias_label'].notna() & (df['bias_label'] != "")]
+# Nettoie les lignes d'un DataFrame d'articles et prépare les labels de classification
+# (appliqué au fichier entier ou morceau par morceau lors de la construction du cache de tokens)
+def prepare_labels(df):
+    # Suppression des lignes où 'bias_label' ou 'content' est manquant
+    df = df.dropna(subset=["bias_label", "content"])
 
-# Convertit la colonne 'bias_label' en entier (supposé déjà entre -3 et 3)
-df["bias_label"] = df["bias_label"].astype(int)
+    # Garde uniquement les lignes où 'bias_label' n'est pas vide
+    df = df[df['bias_label'].notna() & (df['bias_label'] != "")].copy()
 
-# Remappe les valeurs de -3 à 3 en 0 à 6 pour la classification
-df["class_label"] = df["bias_label"] + 3
+    # Score continu d'origine (ex. -1.3), gardé pour les régressions (embed_classifier.py)
+    df["bias_score"] = pd.to_numeric(df["bias_label"], errors="coerce")
+
+    # Convertit la colonne 'bias_label' en entier (supposé déjà entre -3 et 3)
+    df["bias_label"] = df["bias_label"].astype(int)
+
+    # Remappe les valeurs de -3 à 3 en 0 à 6 pour la classification
+    df["class_label"] = df["bias_label"] + 3
+    return df
+
+# Charge le fichier CSV (ou Parquet, ou store compressé) et prépare les labels de classification
+def load_labeled_articles(csv_file=CSV_FILE):
+    # Lecture du fichier dans un DataFrame pandas
+    return prepare_labels(read_articles(csv_file))
+
+# Ajoute aux articles annotés ceux relabellisés par l'API (hybrid_label.py) et retourne le fichier d'entraînement
+# Pour un même article_id, le label de l'API remplace l'ancien. Sans fichier de retours, CSV_FILE est utilisé tel quel.
+def merge_feedback(csv_file=CSV_FILE, feedback_file=FEEDBACK_FILE, merged_file=MERGED_FILE):
+    if not os.path.exists(feedback_file):
+        return csv_file
+    articles = add_article_ids(read_articles(csv_file))
+    feedback = add_article_ids(pd.read_csv(feedback_file))
+    merged = pd.concat([articles, feedback], ignore_index=True).drop_duplicates("article_id", keep="last")
+    merged.to_csv(merged_file, index=False)
+    print(f"{len(merged) - len(articles)} new articles from {feedback_file} ({len(merged)} in {merged_file})")
+    return merged_file
 
 # Sépare les données en ensembles d'entraînement et de validation (stratifié par classe)
-train_texts, val_texts, train_labels, val_labels = train_test_split(
-    df["content"].tolist(),
-    df["class_label"].tolist(),
-    test_size=0.2, # 20% pour la validation
-    stratify=df["class_label"]
-)
-
-from transformers import AutoTokenizer
+def split_dataset(df, seed=SEED):
+    return train_test_split(
+        df["content"].tolist(),
+        df["class_label"].tolist(),
+        test_size=0.2, # 20% pour la validation
+        stratify=df["class_label"],
+        random_state=seed
+    )
+
+# Sépare les indices des articles en ensembles d'entraînement et de validation
+# Même découpage que split_dataset (même graine, même stratification), sans avoir besoin des textes.
+def split_indices(labels, seed=SEED):
+    return train_test_split(
+        np.arange(len(labels)),
+        test_size=0.2,
+        stratify=labels,
+        random_state=seed
+    )
+
+from transformers import AutoTokenizer, DataCollatorWithPadding
 from torch.utils.data import Dataset
+from token_cache import get_token_cache
+from long_document import WindowDataset, pool_windows, max_content_tokens
 
-# Charge le tokenizer XLM-Roberta
-tokenizer = AutoTokenizer.from_pretrained("xlm-roberta-base", use_fast=True)
+MAX_LENGTH = 512  # Longueur maximale (en tokens) d'un article
+TOKENIZE_CHUNK_SIZE = 1000  # Nombre de textes tokenisés à la fois
+USE_TOKEN_CACHE = True  # Lit les tokens depuis le cache pré-tokenisé en mémoire mappée (voir token_cache.py)
+CHUNKED = False  # Entraîne sur des fenêtres couvrant tout l'article au lieu de le tronquer (voir long_document.py)
 
 # Dataset personnalisé pour les articles
+# Les textes sont tokenisés sans padding (le padding est fait batch par batch par le collator)
+# et les tokens de tous les articles sont stockés dans un seul tableau numpy avec les positions de début de chaque article,
+# plutôt que dans des listes Python.
 class ArticleDataset(Dataset):
-    def __init__(self, texts, labels):
-        # Tokenisation des textes avec padding et troncature
-        self.encodings = tokenizer(texts, truncation=True, padding=True, max_length=512)
-        self.labels = labels
+    def __init__(self, texts, labels, tokenizer, max_length=MAX_LENGTH):
+        ids_chunks = []
+        lengths = []
+        for start in range(0, len(texts), TOKENIZE_CHUNK_SIZE):
+            # Tokenisation des textes avec troncature uniquement
+            encodings = tokenizer(texts[start:start + TOKENIZE_CHUNK_SIZE], truncation=True, max_length=max_length)
+            for ids in encodings["input_ids"]:
+                ids_chunks.append(np.asarray(ids, dtype=np.int32))
+                lengths.append(len(ids))
+        self.input_ids = np.concatenate(ids_chunks) if ids_chunks else np.zeros(0, dtype=np.int32)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+        self.labels = np.asarray(labels, dtype=np.int64)
 
     def __len__(self):
         # Retourne le nombre d'exemples
         return len(self.labels)
 
     def __getitem__(self, idx):
-        # Retourne un exemple sous forme de dictionnaire pour PyTorch
-        item = {key: val[idx] for key, val in self.encodings.items()}
-        item["labels"] = self.labels[idx]
-        return item
+        # Retourne un exemple sous forme de dictionnaire pour PyTorch (sans padding)
+        ids = self.input_ids[self.offsets[idx]:self.offsets[idx + 1]]
+        return {
+            "input_ids": ids.tolist(),
+            "attention_mask": [1] * len(ids),
+            "labels": int(self.labels[idx]),
+        }
 
-# Création des datasets d'entraînement et de validation
-train_dataset = ArticleDataset(train_texts, train_labels)
-val_dataset = ArticleDataset(val_texts, val_labels)
+# Dataset lisant les tokens dans le cache en mémoire mappée (voir token_cache.py)
+# Seuls les articles d'indices "indices" sont exposés (ensemble d'entraînement ou de validation) ;
+# les tokens d'un article ne sont lus sur le disque qu'au moment où il est demandé.
+class CachedArticleDataset(ArticleDataset):
+    def __init__(self, cache, indices):
+        self.input_ids = cache["input_ids"]
+        self.indices = np.asarray(indices)
+        self.starts = cache["offsets"][self.indices]
+        self.lengths = cache["lengths"][self.indices]
+        self.labels = cache["labels"][self.indices]
+        self.offsets = None
+
+    def __getitem__(self, idx):
+        start = self.starts[idx]
+        ids = np.asarray(self.input_ids[start:start + self.lengths[idx]])
+        return {
+            "input_ids": ids.tolist(),
+            "attention_mask": [1] * len(ids),
+            "labels": int(self.labels[idx]),
+        }
 
 from transformers import AutoModelForSequenceClassification, Trainer, TrainingArguments
+from transformers.trainer_pt_utils import LengthGroupedSampler
 import torch
 
-# Charge le modèle XLM-Roberta pour la classification de séquence avec 7 classes
-model = AutoModelForSequenceClassification.from_pretrained("xlm-roberta-base", num_labels=7)
-# Limite la mémoire GPU utilisée à 90% (optionnel, dépend du matériel)
-torch.cuda.set_per_process_memory_fraction(0.9, device=0)
-
-# Définition des arguments d'entraînement
-training_args = TrainingArguments(
-    output_dir="./results",            # Dossier de sortie pour les checkpoints
-    eval_strategy="epoch",             # Évaluation à chaque époque
-    save_strategy="epoch",             # Sauvegarde à chaque époque
-    per_device_train_batch_size=4,     # Taille de batch pour l'entraînement
-    per_device_eval_batch_size=4,      # Taille de batch pour l'évaluation
-    num_train_epochs=3,                # Nombre d'époques
-    learning_rate=2e-5,                # Taux d'apprentissage
-    weight_decay=0.01,                 # Décroissance du poids
-    logging_dir="./logs",              # Dossier pour les logs
-    report_to="none",                  # Désactive les rapports externes
-)
-
-# Création de l'objet Trainer de HuggingFace
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    train_dataset=train_dataset,
-    eval_dataset=val_dataset,
-)
-
-# Lance l'entraînement du modèle
-trainer.train()
-# Sauvegarde le modèle fine-tuné
-trainer.save_model("./fine_tuned_model")
\ No newline at end of file
+# Retourne "cuda" ou "cpu" selon DEVICE et le matériel disponible
+def resolve_device(device=DEVICE):
+    if device == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    return device
+
+# Indique si le CPU exécute efficacement le bf16 (AVX512-BF16 ou AMX)
+def cpu_supports_bf16():
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+# Processeurs logiques utilisables, un par cœur physique d'abord (les hyperthreads d'un même cœur ensuite)
+def cpus_by_core():
+    cpus = sorted(os.sched_getaffinity(0))
+    first, rest = [], []
+    for cpu in cpus:
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as file:
+                siblings = file.read().strip()
+        except OSError:
+            siblings = str(cpu)
+        # Premier processeur de la liste des frères ("0,32" ou "0-1") : représentant du cœur physique
+        (first if int(siblings.replace("-", ",").split(",")[0]) == cpu else rest).append(cpu)
+    return first + rest
+
+# Règle les threads de calcul pour l'entraînement sur CPU (appelé depuis le script, pas à l'import)
+# torch étant déjà chargé, OMP_PROC_BIND/OMP_PLACES ne seraient plus lus : le processus est fixé sur threads
+# processeurs logiques (un par cœur physique d'abord) avec sched_setaffinity, hérité par les threads créés ensuite.
+# Sans sched_setaffinity (macOS, Windows), seul le nombre de threads est réglé.
+def configure_cpu_threads(threads=CPU_THREADS):
+    if hasattr(os, "sched_setaffinity"):
+        cpus = cpus_by_core()[:threads]
+        os.sched_setaffinity(0, cpus)
+        threads = len(cpus)
+    torch.set_num_threads(threads)
+    return threads
+
+# Gèle les embeddings et les n_layers premières couches de l'encodeur
+# (les couches basses changent peu au fine-tuning ; les geler réduit le coût du backward)
+def freeze_lower_layers(model, n_layers=FREEZE_LAYERS):
+    if n_layers <= 0:
+        return
+    base = model.base_model
+    for param in base.embeddings.parameters():
+        param.requires_grad = False
+    # XLM-Roberta / BERT : base.encoder.layer, DistilBERT : base.transformer.layer
+    layers = base.encoder.layer if hasattr(base, "encoder") else base.transformer.layer
+    for layer in layers[:n_layers]:
+        for param in layer.parameters():
+            param.requires_grad = False
+    trainable = sum(p.numel() for p in model.parameters() if p.requires_grad)
+    total = sum(p.numel() for p in model.parameters())
+    print(f"Froze embeddings and {n_layers} layers: {trainable / 1e6:.1f}M / {total / 1e6:.1f}M trainable parameters")
+
+# Trainer dont l'échantillonneur regroupe les articles de longueurs proches dans les mêmes batchs
+# (les longueurs déjà calculées par ArticleDataset sont réutilisées au lieu de relire tout le dataset)
+class LengthGroupedTrainer(Trainer):
+    def _get_train_sampler(self, *args, **kwargs):
+        return LengthGroupedSampler(
+            self.args.train_batch_size * self.args.gradient_accumulation_steps,
+            lengths=self.train_dataset.lengths.tolist(),
+        )
+
+if __name__ == "__main__":
+    model_name = DISTILLED_MODEL_NAME if USE_DISTILLED_MODEL else MODEL_NAME
+    device = resolve_device()
+    print(f"Training {model_name} on {device}")
+
+    # Charge le tokenizer du modèle
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+    # Création des datasets d'entraînement et de validation (articles annotés et retours de l'API)
+    train_file = merge_feedback()
+    if CHUNKED:
+        # Tokens de contenu sans tokens spéciaux, jusqu'à MAX_WINDOWS fenêtres par article
+        cache = get_token_cache(train_file, tokenizer, prepare_labels, max_length=max_content_tokens(),
+                                tokenizer_kwargs={"add_special_tokens": False})
+        train_indices, val_indices = split_indices(cache["labels"])
+        train_dataset = WindowDataset(cache["input_ids"], cache["offsets"], cache["lengths"], cache["labels"],
+                                      train_indices, tokenizer)
+        val_dataset = WindowDataset(cache["input_ids"], cache["offsets"], cache["lengths"], cache["labels"],
+                                    val_indices, tokenizer)
+        print(f"{len(train_dataset)} training windows for {len(train_indices)} articles")
+    elif USE_TOKEN_CACHE:
+        # Tokens lus depuis le cache (construit au premier lancement, réutilisé ensuite)
+        cache = get_token_cache(train_file, tokenizer, prepare_labels, max_length=MAX_LENGTH)
+        train_indices, val_indices = split_indices(cache["labels"])
+        train_dataset = CachedArticleDataset(cache, train_indices)
+        val_dataset = CachedArticleDataset(cache, val_indices)
+    else:
+        df = load_labeled_articles(train_file)
+        train_texts, val_texts, train_labels, val_labels = split_dataset(df)
+        train_dataset = ArticleDataset(train_texts, train_labels, tokenizer)
+        val_dataset = ArticleDataset(val_texts, val_labels, tokenizer)
+
+    # Charge le modèle pour la classification de séquence avec 7 classes
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, num_labels=7)
+    freeze_lower_layers(model)
+
+    if device == "cuda":
+        # Limite la mémoire GPU utilisée à 90% (optionnel, dépend du matériel)
+        torch.cuda.set_per_process_memory_fraction(0.9, device=0)
+        use_bf16 = False
+    else:
+        threads = configure_cpu_threads()
+        use_bf16 = cpu_supports_bf16()
+        print(f"CPU training with {threads} threads, bf16 autocast: {use_bf16}")
+    gradient_accumulation_steps = max(1, TARGET_EFFECTIVE_BATCH // PER_DEVICE_BATCH_SIZE)
+
+    # Padding dynamique : chaque batch est paddé à la longueur de son plus long article
+    data_collator = DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8)
+
+    # Définition des arguments d'entraînement
+    training_args = TrainingArguments(
+        output_dir="./results",            # Dossier de sortie pour les checkpoints
+        eval_strategy="epoch",             # Évaluation à chaque époque
+        save_strategy="epoch",             # Sauvegarde à chaque époque
+        per_device_train_batch_size=PER_DEVICE_BATCH_SIZE,  # Taille de batch pour l'entraînement
+        per_device_eval_batch_size=PER_DEVICE_BATCH_SIZE,   # Taille de batch pour l'évaluation
+        gradient_accumulation_steps=gradient_accumulation_steps,  # Batch effectif = TARGET_EFFECTIVE_BATCH
+        use_cpu=(device == "cpu"),         # Force l'entraînement sur CPU
+        bf16=use_bf16,                     # Autocast bf16 sur CPU si supporté
+        num_train_epochs=3,                # Nombre d'époques
+        learning_rate=2e-5,                # Taux d'apprentissage
+        weight_decay=0.01,                 # Décroissance du poids
+        logging_dir="./logs",              # Dossier pour les logs
+        report_to="none",                  # Désactive les rapports externes
+    )
+
+    # Création de l'objet Trainer de HuggingFace
+    trainer = LengthGroupedTrainer(
+        model=model,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=val_dataset,
+        data_collator=data_collator,
+    )
+
+    # Lance l'entraînement du modèle
+    trainer.train()
+
+    if CHUNKED:
+        # Évaluation au niveau des articles : les prédictions des fenêtres sont agrégées par article
+        window_logits = trainer.predict(val_dataset).predictions
+        for pooling in ("mean", "attention", "max"):
+            probs = pool_windows(window_logits, val_dataset.window_article, len(val_dataset.indices), pooling)
+            accuracy = (probs.argmax(axis=1) == val_dataset.article_labels).mean()
+            print(f"Article-level accuracy ({pooling} pooling): {accuracy:.3f}")
+    # Sauvegarde le modèle fine-tuné et son tokenizer (utilisés par local_label.py)
+    trainer.save_model("./fine_tuned_model")
+    tokenizer.save_pretrained("./fine_tuned_model")
@@ -0,0 +1,137 @@
+import os
+import asyncio
+import numpy as np
+import pandas as pd
+from label_cache import LabelCache
+from article_ids import add_article_ids
+from local_label import label_texts, expected_scores, read_articles, write_articles, CLASS_SCORES
+from openai_label import prepare_articles, batch_classify, PRICE_INPUT_PER_M, PRICE_OUTPUT_PER_M, \
+    EXPECTED_OUTPUT_TOKENS
+
+### hybrid_label.py ###
+# Ce script labellise un dataset en combinant le modèle fine-tuné local et l'API OpenAI.
+# Tous les articles sont d'abord notés par le modèle local (gratuit) ; seuls les cas difficiles sont envoyés à l'API :
+# faible confiance du modèle (probabilité de la classe prédite trop basse), distribution étalée sur des classes
+# éloignées (écart-type du score élevé) ou, en option, désaccord avec le classifieur sur embeddings
+# (embed_classifier.py). Les articles à envoyer sont classés du plus incertain au moins incertain et
+# retenus dans la limite d'un budget en dollars et en nombre d'articles.
+# Les réponses de l'API sont ajoutées à un fichier d'entraînement pour améliorer le modèle local au prochain
+# fine-tuning (fine_tune.py). La colonne "label_source" indique l'origine de chaque label.
+
+INPUT_FILE = "articles_monde_formatted_cleaned.csv"  # Fichier CSV, Parquet ou store compressé contenant les articles à annoter
+OUTPUT_FILE = "monde_with_bias_hybrid.csv"  # Fichier de sortie (même format que openai_label.py)
+FEEDBACK_CSV = "feedback_labels.csv"  # Articles labellisés par l'API, ajoutés à l'entraînement par fine_tune.py
+# (nom hors du motif "*_with_bias*.csv" : ces articles ne sont pas comptés une seconde fois dans les graphiques)
+# Colonnes gardées dans FEEDBACK_CSV ("newspaper" et "desc" peuvent manquer dans le fichier d'entrée)
+FEEDBACK_COLUMNS = ["newspaper", "title", "date", "desc", "content", "article_id", "bias_label"]
+USE_CACHE = True  # Utilise le cache persistant des réponses de l'API (voir label_cache.py)
+
+MIN_CONFIDENCE = 0.6  # En dessous de cette probabilité pour la classe prédite, l'article est envoyé à l'API
+MAX_SCORE_STD = 1.0  # Au-dessus de cet écart-type du score (distribution étalée), l'article est envoyé à l'API
+MAX_DISAGREEMENT = 1.0  # Écart maximal toléré entre le modèle local et le classifieur sur embeddings
+SECOND_OPINION = False  # Compare le modèle local au classifieur sur embeddings (embed_classifier.py)
+API_BUDGET_USD = 5.0  # Budget maximal (en dollars) dépensé dans l'API pour ce run
+API_MAX_ARTICLES = None  # Nombre maximal d'articles envoyés à l'API (None pour aucune limite)
+
+# Mesures d'incertitude à partir des probabilités des 7 classes
+# Retourne la probabilité de la classe prédite et l'écart-type du score sous la distribution du modèle.
+def uncertainty(probs):
+    scores = expected_scores(probs)
+    variance = probs @ (CLASS_SCORES ** 2) - scores ** 2
+    return probs.max(axis=1), np.sqrt(np.maximum(variance, 0))
+
+# Score du classifieur sur embeddings (modèle linéaire sauvegardé par embed_classifier.py), ou None s'il n'existe pas
+def second_opinion_scores(df):
+    from embed_classifier import EmbeddingStore, embed_articles, predict_scores, HEAD_FILE
+    if not os.path.exists(HEAD_FILE):
+        print(f"⚠️ {HEAD_FILE} not found, no second opinion")
+        return None
+    head = np.load(HEAD_FILE)
+    store = EmbeddingStore(str(head["model"]))
+    return predict_scores(embed_articles(df, store), head["coef"], head["intercept"], str(head["kind"]))
+
+# Choisit les articles envoyés à l'API
+# Les candidats (au moins un critère d'incertitude dépassé) sont triés par priorité décroissante puis retenus tant
+# que le coût estimé (tokens du prompt et de la réponse) reste dans le budget.
+# Retourne les indices (positions) des articles retenus, dans l'ordre du dataset, et ces articles déjà préparés
+# par prepare_articles (contenu tronqué, colonne "prompt_tokens"), envoyés tels quels à l'API.
+def route_articles(df, confidence, score_std, disagreement=None, budget_usd=API_BUDGET_USD,
+                   max_articles=API_MAX_ARTICLES):
+    priority = (MIN_CONFIDENCE - confidence) / MIN_CONFIDENCE + (score_std - MAX_SCORE_STD) / MAX_SCORE_STD
+    candidate = (confidence < MIN_CONFIDENCE) | (score_std > MAX_SCORE_STD)
+    if disagreement is not None:
+        priority += (disagreement - MAX_DISAGREEMENT) / MAX_DISAGREEMENT
+        candidate |= disagreement > MAX_DISAGREEMENT
+    candidates = np.flatnonzero(candidate)
+    print(f"{len(candidates)} / {len(df)} articles above the uncertainty thresholds")
+    if len(candidates) == 0:
+        return candidates, df.iloc[candidates]
+
+    # Coût de chaque candidat (compte de tokens et troncature identiques au mode online de openai_label.py)
+    prepared = prepare_articles(df.iloc[candidates])
+    cost = (prepared["prompt_tokens"].to_numpy() * PRICE_INPUT_PER_M
+            + EXPECTED_OUTPUT_TOKENS * PRICE_OUTPUT_PER_M) / 1e6
+    order = np.argsort(-priority[candidates], kind="stable")
+    within_budget = np.cumsum(cost[order]) <= budget_usd
+    selected = order[within_budget]
+    if max_articles is not None:
+        selected = selected[:max_articles]
+    print(f"Routing {len(selected)} articles to the API (estimated cost ${cost[selected].sum():.3f}, "
+          f"budget ${budget_usd:.3f})")
+    selected = np.sort(selected)
+    return candidates[selected], prepared.iloc[selected]
+
+# Ajoute les articles labellisés par l'API au fichier d'entraînement (sans doublons, d'après l'identifiant stable)
+# Les scores sont arrondis à l'entier le plus proche comme les labels attendus par fine_tune.py.
+def append_feedback(df, feedback_csv=FEEDBACK_CSV):
+    feedback = df[[column for column in FEEDBACK_COLUMNS if column in df]].copy()
+    feedback["bias_label"] = np.clip(np.rint(feedback["bias_label"].astype(float)), -3, 3).astype(int)
+    if os.path.exists(feedback_csv):
+        feedback = pd.concat([add_article_ids(pd.read_csv(feedback_csv)), feedback], ignore_index=True)
+    before = len(feedback)
+    feedback = feedback.drop_duplicates(subset="article_id", keep="last")
+    feedback.to_csv(feedback_csv, index=False)
+    print(f"{len(df) - (before - len(feedback))} new articles added to {feedback_csv} ({len(feedback)} in total)")
+
+
+if __name__ == "__main__":
+    df = add_article_ids(read_articles(INPUT_FILE)).reset_index(drop=True)
+    df["content"] = df["content"].fillna("").astype(str)
+
+    # 1. Modèle local sur tous les articles
+    probs = label_texts(df["content"].tolist())
+    confidence, score_std = uncertainty(probs)
+    df["local_score"] = np.round(expected_scores(probs), 3)
+    df["local_confidence"] = np.round(confidence, 3)
+    disagreement = None
+    if SECOND_OPINION:
+        embed_scores = second_opinion_scores(df)
+        if embed_scores is not None:
+            disagreement = np.abs(expected_scores(probs) - embed_scores)
+
+    # 2. API pour les articles les plus incertains, dans la limite du budget
+    routed, api_rows = route_articles(df, confidence, score_std, disagreement)
+    df["bias_label"] = df["local_score"].astype(float)
+    df["label_source"] = "local"
+    if len(routed):
+        cache = LabelCache() if USE_CACHE else None
+        api_labels = pd.to_numeric(pd.Series(asyncio.run(batch_classify(api_rows, batch_size=10, cache=cache))),
+                                   errors="coerce").to_numpy()
+        if cache is not None:
+            cache.close()
+        # Les réponses sont reportées par identifiant d'article ; un article sans réponse exploitable garde
+        # le score du modèle local
+        api_scores = pd.Series(api_labels, index=api_rows["article_id"]).dropna()
+        api_scores = api_scores[~api_scores.index.duplicated(keep="last")]
+        answered = df.index[df["article_id"].isin(api_scores.index)]
+        df.loc[answered, "bias_label"] = df.loc[answered, "article_id"].map(api_scores)
+        df.loc[answered, "label_source"] = "api"
+        print(f"{len(answered)} / {len(routed)} routed articles labelled by the API")
+
+        # 3. Les réponses de l'API deviennent des données d'entraînement pour le modèle local
+        if len(answered):
+            append_feedback(df.loc[answered])
+
+    write_articles(df, OUTPUT_FILE)
+    print(df["label_source"].value_counts().to_string())
+    print(f"\n🧭 Mean bias score: {pd.to_numeric(df['bias_label']).mean():.3f}")
@@ -0,0 +1,138 @@
+import sqlite3
+import hashlib
+import json
+import time
+
+### label_cache.py ###
+# Ce module fournit un cache persistant (SQLite) pour les réponses de l'API de classification.
+# Chaque entrée est identifiée par un hash du modèle, du prompt système, du prompt utilisateur et de la température,
+# et conserve la réponse brute, l'usage en tokens et le label extrait.
+# Un article déjà classifié avec les mêmes paramètres n'est donc jamais renvoyé à l'API (et ne coûte rien sur le quota).
+
+CACHE_FILE = "label_cache.sqlite"  # Fichier SQLite du cache
+MAX_ENTRIES = 500_000  # Nombre maximal d'entrées conservées (None pour ne jamais évincer)
+MAX_AGE_DAYS = None  # Âge maximal d'une entrée en jours (None pour ne jamais expirer)
+ACCESS_FLUSH_EVERY = 1000  # Nombre de lectures réussies dont les dates d'accès sont écrites en une transaction
+
+# Calcule la clé de cache à partir du payload envoyé à l'API.
+# Le payload contient le modèle, les messages (prompt système + prompt utilisateur), la température
+# et les éventuels paramètres de sortie : deux requêtes identiques donnent donc la même clé.
+def make_cache_key(payload):
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# Cache des réponses de classification stocké dans une base SQLite
+class LabelCache:
+    def __init__(self, path=CACHE_FILE, max_entries=MAX_ENTRIES, max_age_days=MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.pending_access = {}  # Clé -> (dernier accès, nombre de lectures) pas encore écrits dans la base
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # Lectures concurrentes pendant les écritures
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                usage TEXT,
+                label TEXT,
+                created_at REAL,
+                last_access REAL,
+                hit_count INTEGER DEFAULT 0
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self.conn.commit()
+
+    # Retourne l'entrée associée à la clé (dict) ou None si absente ou expirée
+    def get(self, key):
+        row = self.conn.execute(
+            "SELECT response, usage, label, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and self.max_age_days is not None:
+            if time.time() - row[3] > self.max_age_days * 86400:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # L'accès est noté en mémoire et écrit par paquets (flush_access) : pas de commit à chaque lecture
+        _, count = self.pending_access.get(key, (None, 0))
+        self.pending_access[key] = (time.time(), count + 1)
+        if len(self.pending_access) >= ACCESS_FLUSH_EVERY:
+            self.flush_access()
+        return {
+            "response": json.loads(row[0]),
+            "usage": json.loads(row[1]) if row[1] else None,
+            "label": row[2],
+        }
+
+    # Enregistre une réponse (brute), son usage et le label extrait
+    def put(self, key, model, response, usage, label):
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, usage, label, created_at, last_access, hit_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            (key, model, json.dumps(response, ensure_ascii=False), json.dumps(usage) if usage else None, label, now, now)
+        )
+        self.conn.commit()
+        self.writes += 1
+        # Vérifie la taille du cache de temps en temps plutôt qu'à chaque écriture
+        if self.writes % 1000 == 0:
+            self.evict()
+
+    # Écrit les dates d'accès et nombres de lectures en attente, en une seule transaction
+    def flush_access(self):
+        if not self.pending_access:
+            return
+        self.conn.executemany(
+            "UPDATE responses SET last_access = MAX(last_access, ?), hit_count = hit_count + ? WHERE key = ?",
+            [(last_access, count, key) for key, (last_access, count) in self.pending_access.items()]
+        )
+        self.conn.commit()
+        self.pending_access = {}
+
+    # Applique la politique d'éviction : supprime les entrées expirées puis les moins récemment utilisées (LRU)
+    def evict(self):
+        self.flush_access()  # L'ordre LRU tient compte des lectures en attente
+        removed = 0
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            removed += self.conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,)).rowcount
+        if self.max_entries is not None:
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                removed += self.conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (excess,)
+                ).rowcount
+        self.conn.commit()
+        return removed
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    # Statistiques du cache pour la session courante (taux de succès, taille sur disque...)
+    def stats(self):
+        lookups = self.hits + self.misses
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size_bytes": page_count * page_size,
+        }
+
+    def close(self):
+        self.evict()
+        self.conn.close()
@@ -0,0 +1,133 @@
+import os
+import time
+import multiprocessing
+import numpy as np
+import pandas as pd
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from text_store import read_articles, write_articles
+
+### local_label.py ###
+# Ce script labellise un dataset d'articles avec le modèle XLM-Roberta fine-tuné par fine_tune.py, sur CPU,
+# sans passer par l'API OpenAI. Il produit le même fichier de sortie que openai_label.py (colonne "bias_label").
+# Pour aller vite sur CPU :
+# - les articles sont triés par longueur et regroupés en batchs dynamiques (budget de tokens par batch),
+#   ce qui évite de padder un article court à la longueur d'un article de 512 tokens,
+# - l'inférence se fait sous torch.inference_mode avec un nombre de threads intra-op réglé,
+# - un mode multi-processus répartit le dataset entre plusieurs processus (chacun avec une partie des cœurs).
+
+MODEL_DIR = "./fine_tuned_model"  # Dossier du modèle sauvegardé par fine_tune.py
+INPUT_FILE = "articles_monde_formatted_cleaned.csv"  # Fichier CSV, Parquet ou store compressé (text_store.py) à annoter
+OUTPUT_FILE = "monde_with_bias_local.csv"  # Fichier de sortie avec les labels (CSV, Parquet ou store compressé)
+
+MAX_LENGTH = 512  # Longueur maximale (en tokens) d'un article, comme à l'entraînement
+MAX_BATCH_TOKENS = 16_384  # Budget de tokens (padding compris) d'un batch
+MAX_BATCH_SIZE = 64  # Nombre maximal d'articles par batch
+CHUNK_SIZE = 4096  # Nombre d'articles tokenisés et triés à la fois (limite la mémoire sur les gros datasets)
+NUM_THREADS = os.cpu_count() or 4  # Nombre total de threads CPU utilisés
+NUM_PROCESSES = 1  # Nombre de processus (chaque processus utilise NUM_THREADS // NUM_PROCESSES threads)
+CHUNKED = False  # Découpe les articles longs en fenêtres et agrège leurs prédictions (voir long_document.py)
+
+# Valeurs de biais associées aux 7 classes du modèle (class_label = bias_label + 3 dans fine_tune.py)
+CLASS_SCORES = np.arange(-3, 4, dtype=np.float32)
+
+# Charge le tokenizer et le modèle fine-tuné en mode évaluation sur CPU
+def load_model(model_dir=MODEL_DIR, num_threads=NUM_THREADS):
+    torch.set_num_threads(num_threads)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, use_fast=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+    return tokenizer, model
+
+
+# Regroupe des séquences en batchs dynamiques
+# Les séquences sont triées par longueur décroissante, puis ajoutées au batch courant tant que
+# (nombre de séquences x longueur de la plus longue) reste dans le budget de tokens.
+# Retourne une liste de listes d'indices.
+def make_length_batches(lengths, max_batch_tokens=MAX_BATCH_TOKENS, max_batch_size=MAX_BATCH_SIZE):
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    batches = []
+    current = []
+    current_max = 0
+    for idx in order:
+        longest = max(current_max, lengths[idx])
+        if current and (len(current) + 1 > max_batch_size or (len(current) + 1) * longest > max_batch_tokens):
+            batches.append(current)
+            current, longest = [], lengths[idx]
+        current.append(int(idx))
+        current_max = longest
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Calcule les probabilités des 7 classes pour une liste de textes (dans l'ordre des textes)
+def predict_proba(tokenizer, model, texts, max_length=MAX_LENGTH):
+    probs = np.zeros((len(texts), model.config.num_labels), dtype=np.float32)
+    for start in range(0, len(texts), CHUNK_SIZE):
+        chunk = [str(text) for text in texts[start:start + CHUNK_SIZE]]
+        if CHUNKED:
+            # Import local : long_document.py dépend lui-même de ce module
+            from long_document import predict_proba_windows
+            probs[start:start + len(chunk)] = predict_proba_windows(tokenizer, model, chunk)
+            continue
+        # Tokenisation sans padding : le padding est fait batch par batch
+        encodings = tokenizer(chunk, truncation=True, max_length=max_length)
+        lengths = [len(ids) for ids in encodings["input_ids"]]
+        for batch in make_length_batches(lengths):
+            features = [{key: encodings[key][i] for key in encodings.keys()} for i in batch]
+            inputs = tokenizer.pad(features, return_tensors="pt")
+            with torch.inference_mode():
+                logits = model(**inputs).logits
+            probs[[start + i for i in batch]] = torch.softmax(logits.float(), dim=-1).numpy()
+    return probs
+
+
+# Convertit les probabilités des classes en score de biais continu entre -3 et 3 (espérance)
+def expected_scores(probs):
+    return probs @ CLASS_SCORES
+
+
+# Variables du processus de travail (mode multi-processus)
+worker_tokenizer = None
+worker_model = None
+
+def init_worker(model_dir, num_threads):
+    global worker_tokenizer, worker_model
+    worker_tokenizer, worker_model = load_model(model_dir, num_threads)
+
+def predict_proba_worker(texts):
+    return predict_proba(worker_tokenizer, worker_model, texts)
+
+
+# Labellise une liste de textes, éventuellement en répartissant le travail entre plusieurs processus
+# Retourne la matrice des probabilités des classes (une ligne par texte).
+def label_texts(texts, model_dir=MODEL_DIR, num_processes=NUM_PROCESSES, num_threads=NUM_THREADS):
+    texts = list(texts)
+    if num_processes <= 1:
+        tokenizer, model = load_model(model_dir, num_threads)
+        return predict_proba(tokenizer, model, texts)
+    # Découpe en morceaux plus petits que le nombre de processus pour équilibrer la charge
+    n_parts = num_processes * 4
+    bounds = np.linspace(0, len(texts), n_parts + 1, dtype=int)
+    parts = [texts[bounds[k]:bounds[k + 1]] for k in range(n_parts)]
+    threads_per_process = max(1, num_threads // num_processes)
+    with multiprocessing.get_context("spawn").Pool(
+        num_processes, initializer=init_worker, initargs=(model_dir, threads_per_process)
+    ) as pool:
+        results = pool.map(predict_proba_worker, parts)
+    return np.concatenate(results, axis=0)
+
+
+if __name__ == "__main__":
+    df = read_articles(INPUT_FILE)
+    start = time.time()
+    probs = label_texts(df["content"].fillna("").tolist())
+    elapsed = time.time() - start
+
+    # Même format de sortie que openai_label.py : le DataFrame d'origine avec la colonne "bias_label"
+    df["bias_label"] = np.round(expected_scores(probs), 3)
+    write_articles(df, OUTPUT_FILE)
+
+    print(f"{len(df)} articles labelled in {elapsed:.1f}s ({len(df) / elapsed * 60:.0f} articles/min)")
+    print(f"\n🧭 Mean bias score: {df['bias_label'].mean():.3f}")
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import math
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from local_label import load_model, predict_proba, expected_scores, MODEL_DIR, NUM_THREADS
+
+### local_server.py ###
+# Ce script lance un serveur HTTP local compatible avec la route /v1/chat/completions de l'API OpenAI,
+# qui répond aux requêtes de classification de openai_label.py avec le modèle XLM-Roberta fine-tuné.
+# Il suffit de lancer le serveur puis openai_label.py avec OPENAI_API_BASE=http://localhost:8000/v1
+# pour labelliser gratuitement avec la même machinerie asynchrone.
+# Les requêtes concurrentes sont regroupées pendant quelques millisecondes (micro-batching) pour ne faire
+# qu'une passe du modèle par groupe, et la file d'attente est bornée : au-delà, le serveur répond 429.
+
+HOST = "localhost"
+PORT = 8000
+MAX_BATCH_SIZE = 32  # Nombre maximal d'articles par passe du modèle
+MAX_WAIT_MS = 5  # Temps d'attente maximal (en ms) pour compléter un batch
+MAX_QUEUE_SIZE = 1024  # Nombre maximal d'articles en attente avant de refuser les requêtes
+
+# Extrait le contenu d'un article du prompt utilisateur construit par openai_label.py (USER_PROMPT_TEMPLATE)
+# Le modèle a été entraîné sur le contenu seul ; si le prompt n'a pas ce format, il est utilisé tel quel.
+def extract_content(article_prompt):
+    match = re.search(r"Content: (.*)", article_prompt, re.DOTALL)
+    return match.group(1).strip() if match else article_prompt.strip()
+
+# Découpe le prompt utilisateur en articles (plusieurs articles en mode "packed" de openai_label.py)
+def split_articles(user_prompt):
+    articles = re.split(r"### Article \d+ ###\n", user_prompt)
+    if len(articles) > 1:
+        return [extract_content(article) for article in articles[1:]]
+    return [extract_content(user_prompt)]
+
+
+# Regroupe les articles en attente et les envoie au modèle par batchs
+class MicroBatcher:
+    def __init__(self, tokenizer, model, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                 max_queue_size=MAX_QUEUE_SIZE):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        # Un seul thread pour le modèle : les passes sont sérialisées, PyTorch parallélise à l'intérieur
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batches = 0
+        self.articles = 0
+
+    # Ajoute des articles à la file et attend leurs probabilités
+    # Lève asyncio.QueueFull si la file n'a pas la place pour tous les articles de la requête.
+    async def submit(self, texts):
+        if self.queue.maxsize - self.queue.qsize() < len(texts):
+            raise asyncio.QueueFull()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self.queue.put_nowait((text, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    # Boucle principale : attend un premier article puis complète le batch pendant max_wait au plus
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            texts = [text for text, _ in items]
+            try:
+                probs = await loop.run_in_executor(self.executor, predict_proba, self.tokenizer, self.model, texts)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.articles += len(items)
+            for (_, future), row in zip(items, probs):
+                if not future.done():
+                    future.set_result(row)
+
+
+# Construit le contenu de la réponse selon le format demandé par openai_label.py (SCORE_FORMAT)
+# Retourne le texte de la réponse et, en mode logprobs, les log-probabilités des 7 chiffres candidats.
+def format_answer(body, probs):
+    scores = [float(score) for score in expected_scores(probs)]
+    response_format = (body.get("response_format") or {}).get("type")
+    if len(scores) > 1:
+        return json.dumps({"scores": [round(score, 3) for score in scores]}), None
+    if body.get("logprobs"):
+        # Chiffre de 0 à 6 (classe du modèle) avec la distribution du modèle comme log-probabilités
+        row = probs[0]
+        top = sorted(range(len(row)), key=lambda k: row[k], reverse=True)[:body.get("top_logprobs") or 1]
+        logprobs = {"content": [{
+            "token": str(top[0]),
+            "logprob": math.log(max(float(row[top[0]]), 1e-12)),
+            "top_logprobs": [{"token": str(k), "logprob": math.log(max(float(row[k]), 1e-12))} for k in top],
+        }]}
+        return str(top[0]), logprobs
+    if response_format in ("json_schema", "json_object"):
+        return json.dumps({"score": round(scores[0], 3)}), None
+    return str(round(scores[0], 3)), None
+
+
+async def chat_completions(request):
+    body = await request.json()
+    user_prompt = "".join(m.get("content", "") for m in body.get("messages", []) if m.get("role") == "user")
+    texts = split_articles(user_prompt)
+    try:
+        probs = await request.app["batcher"].submit(texts)
+    except asyncio.QueueFull:
+        return web.json_response(
+            {"error": {"message": "Server overloaded, retry later", "type": "rate_limit_exceeded"}},
+            status=429, headers={"Retry-After": "1"}
+        )
+    content, logprobs = format_answer(body, probs)
+    choice = {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+    if logprobs is not None:
+        choice["logprobs"] = logprobs
+    return web.json_response({
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fine_tuned_model"),
+        "choices": [choice],
+        # Aucun coût : on ne compte pas les tokens
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    })
+
+async def list_models(request):
+    return web.json_response({"object": "list", "data": [{"id": "fine_tuned_model", "object": "model"}]})
+
+# Statistiques du micro-batching (taille moyenne des batchs, file d'attente)
+async def stats(request):
+    batcher = request.app["batcher"]
+    return web.json_response({
+        "batches": batcher.batches,
+        "articles": batcher.articles,
+        "mean_batch_size": batcher.articles / batcher.batches if batcher.batches else 0.0,
+        "queue_size": batcher.queue.qsize(),
+    })
+
+async def start_batcher(app):
+    app["batcher_task"] = asyncio.get_running_loop().create_task(app["batcher"].run())
+
+async def stop_batcher(app):
+    app["batcher_task"].cancel()
+    app["batcher"].executor.shutdown(wait=False)
+
+def make_app(model_dir=MODEL_DIR, num_threads=NUM_THREADS):
+    tokenizer, model = load_model(model_dir, num_threads)
+    app = web.Application()
+    app["batcher"] = MicroBatcher(tokenizer, model)
+    app.on_startup.append(start_batcher)
+    app.on_cleanup.append(stop_batcher)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/v1/models", list_models)
+    app.router.add_get("/stats", stats)
+    return app
+
+if __name__ == "__main__":
+    web.run_app(make_app(), host=HOST, port=PORT)
@@ -0,0 +1,128 @@
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from local_label import make_length_batches
+
+### long_document.py ###
+# Ce module permet d'utiliser tout le texte des articles longs (NYT, Le Monde...) au lieu de les tronquer à 512 tokens.
+# Chaque article est découpé en fenêtres de tokens qui se chevauchent ; les fenêtres de tous les articles
+# sont regroupées dans les mêmes batchs, puis les prédictions des fenêtres d'un même article sont agrégées
+# (moyenne, moyenne pondérée par la confiance de chaque fenêtre, ou maximum) en une prédiction par article.
+# Le nombre de fenêtres par article est plafonné pour garder un coût de calcul prévisible.
+
+WINDOW_LENGTH = 512  # Longueur d'une fenêtre en tokens (tokens spéciaux compris)
+WINDOW_STRIDE = 384  # Décalage entre deux fenêtres (chevauchement = WINDOW_LENGTH - 2 - WINDOW_STRIDE)
+MAX_WINDOWS = 8  # Nombre maximal de fenêtres par article
+POOLING = "mean"  # Agrégation des fenêtres : "mean", "attention" ou "max"
+
+# Nombre de tokens de contenu d'une fenêtre (sans <s> et </s>)
+def window_body(window_length=WINDOW_LENGTH):
+    return window_length - 2
+
+# Nombre maximal de tokens de contenu lus par article (au-delà, le texte n'entre dans aucune fenêtre)
+def max_content_tokens(window_length=WINDOW_LENGTH, stride=WINDOW_STRIDE, max_windows=MAX_WINDOWS):
+    return window_body(window_length) + stride * (max_windows - 1)
+
+
+# Calcule la table des fenêtres à partir de la longueur (en tokens de contenu) de chaque article
+# Retourne trois tableaux : article de chaque fenêtre, position de début et longueur de la fenêtre.
+def make_windows(lengths, window_length=WINDOW_LENGTH, stride=WINDOW_STRIDE, max_windows=MAX_WINDOWS):
+    lengths = np.asarray(lengths, dtype=np.int64)
+    body = window_body(window_length)
+    n_windows = 1 + np.ceil(np.maximum(lengths - body, 0) / stride).astype(np.int64)
+    n_windows = np.minimum(n_windows, max_windows)
+    window_article = np.repeat(np.arange(len(lengths)), n_windows)
+    # Rang de chaque fenêtre dans son article (0, 1, 2... pour chaque article)
+    first_window = np.concatenate([[0], np.cumsum(n_windows)[:-1]])
+    rank = np.arange(len(window_article)) - np.repeat(first_window, n_windows)
+    window_start = rank * stride
+    window_length_tokens = np.minimum(lengths[window_article] - window_start, body)
+    return window_article, window_start, np.maximum(window_length_tokens, 0)
+
+
+# Dataset de fenêtres construit sur des tokens de contenu stockés à plat (sans tokens spéciaux)
+# input_ids/offsets/lengths/labels ont le même format que le cache de token_cache.py ;
+# indices sélectionne les articles utilisés (ensemble d'entraînement ou de validation).
+# Chaque fenêtre reçoit le label de son article.
+class WindowDataset(Dataset):
+    def __init__(self, input_ids, offsets, lengths, labels, indices, tokenizer,
+                 window_length=WINDOW_LENGTH, stride=WINDOW_STRIDE, max_windows=MAX_WINDOWS):
+        self.input_ids = input_ids
+        self.indices = np.asarray(indices)
+        self.starts = np.asarray(offsets)[self.indices]
+        self.article_labels = np.asarray(labels)[self.indices]
+        self.window_article, self.window_start, self.window_tokens = make_windows(
+            np.asarray(lengths)[self.indices], window_length, stride, max_windows
+        )
+        self.lengths = self.window_tokens + 2  # Longueur réelle de chaque fenêtre (pour le regroupement par longueur)
+        self.labels = self.article_labels[self.window_article]
+        self.cls_id = tokenizer.cls_token_id
+        self.sep_id = tokenizer.sep_token_id
+
+    def __len__(self):
+        return len(self.window_article)
+
+    def __getitem__(self, idx):
+        start = self.starts[self.window_article[idx]] + self.window_start[idx]
+        body = np.asarray(self.input_ids[start:start + self.window_tokens[idx]]).tolist()
+        ids = [self.cls_id] + body + [self.sep_id]
+        return {"input_ids": ids, "attention_mask": [1] * len(ids), "labels": int(self.labels[idx])}
+
+
+# Agrège les logits des fenêtres en probabilités par article
+# "mean" : moyenne des probabilités des fenêtres,
+# "attention" : moyenne pondérée par la confiance de chaque fenêtre (softmax de l'opposé de l'entropie),
+# "max" : maximum des logits de chaque classe sur les fenêtres, puis softmax.
+def pool_windows(window_logits, window_article, n_articles, pooling=POOLING):
+    window_logits = np.asarray(window_logits, dtype=np.float64)
+    n_classes = window_logits.shape[1]
+    if pooling == "max":
+        pooled = np.full((n_articles, n_classes), -np.inf)
+        np.maximum.at(pooled, window_article, window_logits)
+        pooled -= pooled.max(axis=1, keepdims=True)
+        probs = np.exp(pooled)
+        return (probs / probs.sum(axis=1, keepdims=True)).astype(np.float32)
+
+    shifted = window_logits - window_logits.max(axis=1, keepdims=True)
+    window_probs = np.exp(shifted)
+    window_probs /= window_probs.sum(axis=1, keepdims=True)
+    if pooling == "attention":
+        entropy = -(window_probs * np.log(window_probs + 1e-12)).sum(axis=1)
+        # Softmax de -entropie au sein de chaque article (on retire le max par article pour la stabilité)
+        article_max = np.full(n_articles, -np.inf)
+        np.maximum.at(article_max, window_article, -entropy)
+        weights = np.exp(-entropy - article_max[window_article])
+    elif pooling == "mean":
+        weights = np.ones(len(window_article))
+    else:
+        raise ValueError(f"Pooling inconnu : {pooling}")
+    pooled = np.zeros((n_articles, n_classes))
+    np.add.at(pooled, window_article, window_probs * weights[:, None])
+    totals = np.zeros(n_articles)
+    np.add.at(totals, window_article, weights)
+    return (pooled / totals[:, None]).astype(np.float32)
+
+
+# Calcule les probabilités des classes par article en découpant chaque texte en fenêtres
+# Les fenêtres de tous les textes sont triées par longueur et regroupées en batchs dynamiques.
+def predict_proba_windows(tokenizer, model, texts, pooling=POOLING, window_length=WINDOW_LENGTH,
+                          stride=WINDOW_STRIDE, max_windows=MAX_WINDOWS):
+    texts = [str(text) for text in texts]
+    encodings = tokenizer(texts, add_special_tokens=False, truncation=True,
+                          max_length=max_content_tokens(window_length, stride, max_windows))
+    content_ids = encodings["input_ids"]
+    lengths = np.array([len(ids) for ids in content_ids])
+    window_article, window_start, window_tokens = make_windows(lengths, window_length, stride, max_windows)
+
+    window_logits = np.zeros((len(window_article), model.config.num_labels), dtype=np.float32)
+    for batch in make_length_batches((window_tokens + 2).tolist()):
+        features = []
+        for w in batch:
+            start = window_start[w]
+            ids = [tokenizer.cls_token_id] + content_ids[window_article[w]][start:start + window_tokens[w]] \
+                + [tokenizer.sep_token_id]
+            features.append({"input_ids": ids, "attention_mask": [1] * len(ids)})
+        inputs = tokenizer.pad(features, return_tensors="pt")
+        with torch.inference_mode():
+            window_logits[batch] = model(**inputs).logits.float().numpy()
+    return pool_windows(window_logits, window_article, len(texts), pooling)
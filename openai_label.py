@@ -5,26 +5,69 @@ from tqdm import tqdm
 import nest_asyncio
 import tiktoken
 import time
+import os
+import json
+import hashlib
+import re
+import math
+from label_cache import LabelCache, make_cache_key
+from token_budget import count_tokens, truncate_to_budget, forecast_run
+from validate_articles import validate_articles, print_report
+from article_ids import add_article_ids, join_on_id
+from text_store import read_articles, write_articles
 
 ### openai_label.py ###
 # Ce script utilise l'API OpenAI pour classifier des articles de presse en fonction de leur biais politique.
 # Il charge un fichier CSV contenant des articles, envoie des requêtes à l'API OpenAI pour chaque article,
 # et enregistre les résultats dans un nouveau fichier CSV.
 # Il utilise asyncio pour gérer les requêtes asynchrones et respecter les limites de tokens par minute (TPM).
+# Pour les gros volumes, le mode "batch" compile le dataset en fichiers JSONL soumis à l'API Batch d'OpenAI
+# (moins cher et sans limite TPM interactive), puis réintègre les résultats dans le dataset annoté.
+# Les articles sont identifiés par leur identifiant stable (colonne article_id, voir article_ids.py) : relancer le
+# script sur un fichier complété ne relabellise que les articles absents du fichier de sortie.
 
 # Autorise les boucles d'événements imbriquées (utile pour les notebooks ou exécutions répétées)
 nest_asyncio.apply()
 
 # Constantes pour l'API OpenAI
 OPENAI_API_KEY = ""
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+# Base de l'API (peut pointer vers un serveur local, voir openai_standin_server.py)
+OPENAI_API_BASE = os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1")
+OPENAI_API_URL = f"{OPENAI_API_BASE}/chat/completions"
 MODEL = "gpt-4.1-mini"  # Ou gpt-3.5-turbo pour un modèle plus rapide/économique
 
-# Charge le fichier CSV contenant les articles à annoter
-df = pd.read_csv("articles_monde_formatted_cleaned.csv")
-df.head(10000)
+INPUT_CSV = "articles_monde_formatted_cleaned.csv"  # Fichier CSV contenant les articles à annoter (ou Parquet, store compressé)
+OUTPUT_CSV = "monde_with_bias_mini.csv"  # Fichier CSV de sortie avec les labels
+USE_CACHE = True  # Utilise le cache persistant des réponses (voir label_cache.py)
+VALIDATE_ARTICLES = True  # Écarte les articles vides ou invalides avant la labellisation (voir validate_articles.py)
+QUARANTINE_CSV = "articles_quarantine.csv"  # Articles écartés, avec les raisons du rejet
+SKIP_LABELED = True  # Reprend les labels des articles déjà présents (même article_id) dans OUTPUT_CSV
+MODE = "online"  # "online" : requêtes interactives, "batch" : API Batch (fichiers JSONL)
+PACK_SIZE = 1  # Nombre d'articles envoyés par requête en mode online (1 = un article par requête)
+# Format de la réponse attendue pour un article :
+# "text" : nombre en texte libre, "json_schema" : objet JSON {"score": x} imposé par un schéma strict,
+# "logprobs" : un seul chiffre de 0 à 6 dont on calcule l'espérance à partir des probabilités des tokens candidats
+SCORE_FORMAT = "json_schema"
+MAX_OUTPUT_TOKENS = 12  # Nombre maximal de tokens générés par réponse ("json_schema" et "text")
+SCORE_RETRIES = 1  # Nombre de nouvelles tentatives si la réponse ne contient pas de score exploitable
+SCORE_RETRY_DELAY = 2  # Attente (en secondes) avant une nouvelle tentative, doublée à chaque tentative
+SCORE_RETRY_TEMPERATURE = 0.3  # Température des nouvelles tentatives (à 0, la même réponse inutilisable revient)
+PACKED_TOKENS_PER_ARTICLE = 5  # Tokens générés par article en mode "packed" (un score et son séparateur)
+PACKED_OVERHEAD_TOKENS = 8  # Tokens de l'enveloppe JSON d'une réponse "packed" ({"scores": [...]})
+
+# Paramètres du mode batch
+BATCH_DIR = "batch_jobs"  # Dossier des fichiers de requêtes/résultats et de l'état des jobs
+BATCH_SHARD_SIZE = 50_000  # Nombre maximal de requêtes par fichier JSONL (limite de l'API Batch)
+BATCH_POLL_INTERVAL = 60  # Intervalle (en secondes) entre deux vérifications de l'état d'un job
+BATCH_MAX_RESUBMITS = 2  # Nombre maximal de nouvelles soumissions d'un shard dont le job a échoué sans résultat
+BATCH_FAILED_STATUSES = ("failed", "expired", "cancelled")  # États finaux d'un job autres que "completed"
 
 TPM_LIMIT = 100_000  # Limite de tokens par minute pour l'API (à ajuster selon votre quota)
+RPM_LIMIT = 500  # Limite de requêtes par minute pour l'API (à ajuster selon votre quota)
+TOKEN_BUDGET = 3000  # Nombre maximal de tokens du contenu envoyé par article (None pour ne jamais tronquer)
+PRICE_INPUT_PER_M = 0.40  # Prix en dollars par million de tokens en entrée (gpt-4.1-mini)
+PRICE_OUTPUT_PER_M = 1.60  # Prix en dollars par million de tokens en sortie (gpt-4.1-mini)
+EXPECTED_OUTPUT_TOKENS = 5  # Nombre moyen de tokens d'une réponse (un score)
 encoding = tiktoken.encoding_for_model("gpt-4o") # Chargement de l'encodeur de tokens pour le modèle GPT-4o
 
 # Définition du prompt système pour guider le modèle OpenAI
@@ -42,6 +85,54 @@ You may return **decimal numbers**, e.g., -1.3 or 2.7 or 0.1. It can be every nu
 Consider tone, framing, language, implications, and underlying perspective.
 """
 )
+# Prompt système du mode "packed" : plusieurs articles numérotés par requête, réponse en JSON
+PACKED_SYSTEM_PROMPT = SYSTEM_PROMPT + (
+    """
+You will receive several articles, each introduced by a delimiter line "### Article <n> ###".
+Score every article independently and answer only with a JSON object of the form
+{"scores": [-1.3, 0.4, ...]}
+with exactly one score per article, in the same order as the articles.
+"""
+)
+# Prompt système du mode "logprobs" : réponse en un seul chiffre pour lire la distribution sur les 7 valeurs
+LOGPROBS_SYSTEM_PROMPT = (
+    """You are a political ideology classifier. Given a news article (title, description, and full content), rate the ideological stance of the article on a 7-point scale and answer with a single digit:
+
+0: Strongly left-leaning
+1: Left-leaning
+2: Slightly left-leaning
+3: Neutral or balanced
+4: Slightly right-leaning
+5: Right-leaning
+6: Strongly right-leaning
+
+Answer with the digit only. Consider tone, framing, language, implications, and underlying perspective.
+"""
+)
+# Schéma JSON strict de la réponse en mode "json_schema"
+SCORE_SCHEMA = {
+    "name": "bias_score",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {"score": {"type": "number", "minimum": -3, "maximum": 3}},
+        "required": ["score"],
+        "additionalProperties": False
+    }
+}
+# Schéma JSON strict de la réponse "packed" quand SCORE_FORMAT vaut "json_schema"
+PACKED_SCORE_SCHEMA = {
+    "name": "bias_scores",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {"scores": {"type": "array", "items": {"type": "number", "minimum": -3, "maximum": 3}}},
+        "required": ["scores"],
+        "additionalProperties": False
+    }
+}
+# Délimiteur placé avant chaque article d'une requête "packed"
+PACKED_DELIMITER = "### Article {n} ###"
 # Modèle de prompt utilisateur pour chaque article
 USER_PROMPT_TEMPLATE = (
     "Title: {title}\n"
@@ -54,46 +145,285 @@ def estimate_tokens(text: str) -> int:
     return len(encoding.encode(text))
 
 
-# Fonction asynchrone pour appeler l'API OpenAI et classifier un article
-async def classify_article(session, title, desc, content):
+# Prépare le dataset avant la labellisation : compte les tokens de tous les articles en une fois (multi-thread),
+# tronque les articles au budget de tokens et affiche une prévision du coût et de la durée du run.
+# Ajoute la colonne "prompt_tokens" (prompt système + prompt utilisateur) utilisée pour respecter la limite TPM.
+def prepare_articles(df, token_budget=TOKEN_BUDGET, pack_size=PACK_SIZE):
+    df = df.copy()
+    df["content"] = df["content"].fillna("").astype(str)
+    if token_budget is not None:
+        content_tokens = count_tokens(encoding, df["content"])
+        df["content"] = truncate_to_budget(encoding, df["content"], content_tokens, token_budget)
+    prompts = [build_payload(row.title, row.desc, row.content)[0] for row in df.itertuples()]
+    system_tokens = estimate_tokens(system_prompt_for())
+    prompt_tokens = count_tokens(encoding, prompts)
+    df["prompt_tokens"] = [n + system_tokens for n in prompt_tokens]
+    pack_size = effective_pack_size(pack_size)
+    if pack_size > 1:
+        # En mode "packed", le prompt système n'est envoyé qu'une fois par groupe d'articles
+        packed_system_tokens = estimate_tokens(PACKED_SYSTEM_PROMPT)
+        request_tokens = [
+            sum(prompt_tokens[i:i + pack_size]) + packed_system_tokens
+            for i in range(0, len(prompt_tokens), pack_size)
+        ]
+        output_tokens = PACKED_TOKENS_PER_ARTICLE * pack_size + PACKED_OVERHEAD_TOKENS
+    else:
+        request_tokens = df["prompt_tokens"]
+        output_tokens = EXPECTED_OUTPUT_TOKENS
+    forecast_run(request_tokens, output_tokens, PRICE_INPUT_PER_M, PRICE_OUTPUT_PER_M, TPM_LIMIT, RPM_LIMIT)
+    return df
+
+
+# Nombre d'articles par requête compatible avec le format de réponse
+# (le format "logprobs" lit la distribution d'un seul token : un article par requête)
+def effective_pack_size(pack_size=PACK_SIZE, score_format=SCORE_FORMAT):
+    return 1 if score_format == "logprobs" else pack_size
+
+
+# Retourne le prompt système correspondant au format de réponse
+def system_prompt_for(score_format=SCORE_FORMAT):
+    return LOGPROBS_SYSTEM_PROMPT if score_format == "logprobs" else SYSTEM_PROMPT
+
+
+# Construit le prompt utilisateur et le payload de la requête pour un article
+def build_payload(title, desc, content, score_format=SCORE_FORMAT):
     prompt = USER_PROMPT_TEMPLATE.format(
         title=str(title or ""),
         desc=str(desc or ""),
         content=str(content or "")
     )
+    json_payload = {
+        "model": MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt_for(score_format)},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0
+    }
+    if score_format == "json_schema":
+        json_payload["response_format"] = {"type": "json_schema", "json_schema": SCORE_SCHEMA}
+        json_payload["max_tokens"] = MAX_OUTPUT_TOKENS
+    elif score_format == "logprobs":
+        json_payload["max_tokens"] = 1
+        json_payload["logprobs"] = True
+        json_payload["top_logprobs"] = 10
+    else:
+        json_payload["max_tokens"] = MAX_OUTPUT_TOKENS
+    return prompt, json_payload
+
+
+# Retourne le texte de la réponse de l'API (chaîne vide si la réponse ne contient pas de choix)
+def response_content(result):
+    return (result.get("choices", [{}])[0].get("message", {}).get("content") or "").strip()
+
+
+# Calcule l'espérance du score à partir des probabilités du premier token généré
+# Seuls les tokens candidats (chiffres de 0 à 6) sont gardés, leurs probabilités sont renormalisées,
+# et le résultat est ramené sur l'échelle de -3 à 3. Retourne None si aucun candidat n'est présent.
+def expected_score(choice):
+    content = (choice.get("logprobs") or {}).get("content") or []
+    if not content:
+        return None
+    weights = {}
+    for candidate in content[0].get("top_logprobs", []):
+        token = candidate.get("token", "").strip()
+        if token in ("0", "1", "2", "3", "4", "5", "6") and token not in weights:
+            weights[token] = math.exp(candidate["logprob"])
+    total = sum(weights.values())
+    if total == 0:
+        return None
+    return sum(int(token) * weight for token, weight in weights.items()) / total - 3
+
+
+# Extrait le score de la réponse de l'API selon le format demandé
+# Retourne le score sous forme de chaîne, ou une chaîne vide si la réponse est inutilisable
+# (erreur de l'API, JSON invalide, valeur non numérique ou hors de l'échelle).
+def parse_label(result, score_format=SCORE_FORMAT):
+    try:
+        if score_format == "logprobs":
+            score = expected_score(result["choices"][0])
+            if score is None:
+                return ""
+            return f"{score:.3f}"
+        content = response_content(result)
+        if score_format == "json_schema":
+            score = float(json.loads(content)["score"])
+        else:
+            score = float(content)
+    except (ValueError, KeyError, IndexError, TypeError):
+        return ""
+    if not -3 <= score <= 3:
+        return ""
+    return str(score)
+
+
+# Fonction asynchrone pour appeler l'API OpenAI et classifier un article
+# Si un cache est fourni, une réponse déjà obtenue pour le même payload est réutilisée sans appel à l'API
+# (elle compte alors 0 token pour la limite TPM).
+# prompt_tokens peut être fourni s'il a déjà été calculé (voir prepare_articles) pour éviter de réencoder le prompt.
+async def classify_article(session, title, desc, content, cache=None, prompt_tokens=None):
+    prompt, json_payload = build_payload(title, desc, content)
+    key = None
+    if cache is not None:
+        key = make_cache_key(json_payload)
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"Bias (cache): {cached['label']}")
+            return cached["label"], 0
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json"
     }
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(prompt)
+    tokens_used = 0
+    # Une réponse sans score exploitable est redemandée (SCORE_RETRIES fois au plus), après une attente croissante
+    # (erreur de quota ou de serveur) et à une température plus haute pour ne pas obtenir la même réponse
+    for attempt in range(SCORE_RETRIES + 1):
+        if attempt > 0:
+            await asyncio.sleep(SCORE_RETRY_DELAY * 2 ** (attempt - 1))
+            json_payload = {**json_payload, "temperature": SCORE_RETRY_TEMPERATURE}
+        async with session.post(OPENAI_API_URL, headers=headers, json=json_payload) as resp:
+            result = await resp.json()
+        tokens_used += prompt_tokens
+        label = parse_label(result)
+        if label:
+            print(f"Bias: {label}")
+            # On ne met en cache que les réponses valides (pas les erreurs de quota ou de serveur)
+            if cache is not None:
+                cache.put(key, MODEL, result, result.get("usage"), label)
+            return label, tokens_used
+        print(f"Unusable response (attempt {attempt + 1}): {result}")
+    return label, tokens_used
+
+
+### Mode "packed" (plusieurs articles par requête) ###
+
+# Construit le prompt et le payload d'une requête regroupant plusieurs articles
+# La réponse est limitée à PACKED_TOKENS_PER_ARTICLE tokens par article ; avec SCORE_FORMAT = "json_schema",
+# le tableau de scores est imposé par un schéma strict.
+def build_packed_payload(rows, score_format=SCORE_FORMAT):
+    parts = []
+    for n, (_, row) in enumerate(rows.iterrows(), start=1):
+        article_prompt, _ = build_payload(row["title"], row["desc"], row["content"])
+        parts.append(PACKED_DELIMITER.format(n=n) + "\n" + article_prompt)
+    prompt = "\n\n".join(parts)
     json_payload = {
         "model": MODEL,
         "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": PACKED_SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ],
-        "temperature": 0
+        "temperature": 0,
+        "max_tokens": PACKED_TOKENS_PER_ARTICLE * len(rows) + PACKED_OVERHEAD_TOKENS
+    }
+    if score_format == "json_schema":
+        json_payload["response_format"] = {"type": "json_schema", "json_schema": PACKED_SCORE_SCHEMA}
+    else:
+        json_payload["response_format"] = {"type": "json_object"}
+    return prompt, json_payload
+
+
+# Extrait les scores d'une réponse "packed" ({"scores": [-1.3, 0.4]}, ou la forme numérotée
+# {"scores": [{"article": 1, "score": -1.3}, ...]})
+# Retourne la liste des labels dans l'ordre des articles, ou None si la réponse est mal formée
+# (JSON invalide, mauvais nombre d'articles, ordre différent ou score hors de l'échelle).
+def parse_packed_labels(result, n_articles):
+    content = response_content(result)
+    content = re.sub(r"^```(?:json)?|```$", "", content).strip()  # Retire un éventuel bloc de code markdown
+    try:
+        scores = json.loads(content)["scores"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(scores, list) or len(scores) != n_articles:
+        return None
+    labels = []
+    for n, entry in enumerate(scores, start=1):
+        try:
+            if isinstance(entry, dict):
+                if int(entry["article"]) != n:
+                    return None
+                entry = entry["score"]
+            score = float(entry)
+        except (ValueError, KeyError, TypeError):
+            return None
+        if not -3 <= score <= 3:
+            return None
+        labels.append(str(score))
+    return labels
+
+
+# Classifie un groupe d'articles en une seule requête
+# Si la réponse est mal formée, chaque article du groupe est reclassifié individuellement avec classify_article.
+# Retourne la liste des (label, tokens utilisés) de chaque article.
+async def classify_packed(session, rows, cache=None):
+    if len(rows) == 1:
+        _, row = next(rows.iterrows())
+        return [await classify_article(session, row["title"], row["desc"], row["content"], cache=cache,
+                                       prompt_tokens=row.get("prompt_tokens"))]
+    prompt, json_payload = build_packed_payload(rows)
+    packed_system_tokens = estimate_tokens(PACKED_SYSTEM_PROMPT)
+    if "prompt_tokens" in rows:
+        # prompt_tokens compte le prompt système d'un article seul : il est remplacé par PACKED_SYSTEM_PROMPT,
+        # envoyé une seule fois pour tout le groupe
+        system_tokens = estimate_tokens(system_prompt_for())
+        tokens_used = int(rows["prompt_tokens"].sum()) - len(rows) * system_tokens + packed_system_tokens
+    else:
+        tokens_used = estimate_tokens(prompt) + packed_system_tokens
+    key = make_cache_key(json_payload) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            labels = parse_packed_labels(cached["response"], len(rows))
+            if labels is not None:
+                return [(label, 0) for label in labels]
+
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json"
     }
     async with session.post(OPENAI_API_URL, headers=headers, json=json_payload) as resp:
         result = await resp.json()
-        print(f"Response: {result}")
-        label = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-        print(f"Bias: {label}")
-        return label, estimate_tokens(prompt)
+    labels = parse_packed_labels(result, len(rows))
+    if labels is not None:
+        print(f"Bias (packed x{len(rows)}): {labels}")
+        if cache is not None:
+            cache.put(key, MODEL, result, result.get("usage"), json.dumps(labels))
+        # Le coût de la requête est réparti entre les articles du groupe
+        return [(label, tokens_used // len(rows)) for label in labels]
+
+    print(f"Malformed packed response, falling back to single requests: {result}")
+    fallback = await asyncio.gather(*[
+        classify_article(session, row["title"], row["desc"], row["content"], cache=cache,
+                         prompt_tokens=row.get("prompt_tokens"))
+        for _, row in rows.iterrows()
+    ])
+    # La requête "packed" échouée a tout de même consommé des tokens
+    return [(label, tokens + tokens_used // len(rows)) for label, tokens in fallback]
 
 
 # Fonction asynchrone pour traiter les articles par batch et respecter la limite de tokens par minute
-async def batch_classify(rows, batch_size=10):
+# En mode "packed" (pack_size > 1), chaque requête du batch regroupe pack_size articles.
+async def batch_classify(rows, batch_size=10, cache=None, pack_size=PACK_SIZE):
     results = []
     token_accumulator = 0
     window_start = time.time()
+    pack_size = effective_pack_size(pack_size)
+    step = batch_size * pack_size
 
     async with aiohttp.ClientSession() as session:
-        for i in tqdm(range(0, len(rows), batch_size)):
-            batch = rows[i:i + batch_size]
-            tasks = []
-            for _, row in batch.iterrows():
-                tasks.append(classify_article(session, row["title"], row["desc"], row["content"]))
-            batch_results = await asyncio.gather(*tasks)
+        for i in tqdm(range(0, len(rows), step)):
+            batch = rows[i:i + step]
+            if pack_size > 1:
+                tasks = [classify_packed(session, batch[k:k + pack_size], cache=cache)
+                         for k in range(0, len(batch), pack_size)]
+                batch_results = [result for pack in await asyncio.gather(*tasks) for result in pack]
+            else:
+                tasks = []
+                for _, row in batch.iterrows():
+                    tasks.append(classify_article(session, row["title"], row["desc"], row["content"], cache=cache,
+                                                  prompt_tokens=row.get("prompt_tokens")))
+                batch_results = await asyncio.gather(*tasks)
 
             for j, (label, tokens_used) in enumerate(batch_results):
                 results.append(label)
@@ -112,15 +442,253 @@ async def batch_classify(rows, batch_size=10):
 
     return results
 
-# Lance la classification des articles et ajoute les labels au DataFrame
-bias_labels = asyncio.run(batch_classify(df, batch_size=10))
-df["bias_label"] = bias_labels
+### Mode batch (API Batch d'OpenAI) ###
+
+# Identifiant stable d'une requête : position de l'article et identifiant stable de l'article
+# (un même fichier recompilé donne les mêmes identifiants, ce qui permet de reprendre un job interrompu)
+def make_custom_id(index, article_id):
+    return f"art-{index}-{article_id}"
+
+
+# Compile le dataset en fichiers JSONL de requêtes batch (un fichier par shard)
+# Les articles déjà présents dans le cache ne sont pas soumis.
+# Retourne la liste des fichiers écrits et les labels déjà connus (custom_id -> label).
+def compile_batch_files(rows, cache=None, shard_size=BATCH_SHARD_SIZE, batch_dir=BATCH_DIR):
+    os.makedirs(batch_dir, exist_ok=True)
+    shard_paths = []
+    known_labels = {}
+    shard_file = None
+    in_shard = 0
+    for position, (_, row) in enumerate(rows.iterrows()):
+        custom_id = make_custom_id(position, row["article_id"])
+        _, json_payload = build_payload(row["title"], row["desc"], row["content"])
+        if cache is not None:
+            cached = cache.get(make_cache_key(json_payload))
+            if cached is not None:
+                known_labels[custom_id] = cached["label"]
+                continue
+        if shard_file is None or in_shard >= shard_size:
+            if shard_file is not None:
+                shard_file.close()
+            path = os.path.join(batch_dir, f"requests_{len(shard_paths):04d}.jsonl")
+            shard_paths.append(path)
+            shard_file = open(path, "w", encoding="utf-8")
+            in_shard = 0
+        request = {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": json_payload}
+        shard_file.write(json.dumps(request, ensure_ascii=False) + "\n")
+        in_shard += 1
+    if shard_file is not None:
+        shard_file.close()
+    print(f"{len(shard_paths)} shard(s) compiled, {len(known_labels)} articles already in cache")
+    return shard_paths, known_labels
+
+
+# Charge / sauvegarde l'état des jobs batch (identifiants de fichiers et de batchs par shard)
+def load_batch_state(batch_dir=BATCH_DIR):
+    path = os.path.join(batch_dir, "batch_state.json")
+    if os.path.exists(path):
+        with open(path, "r") as file:
+            return json.load(file)
+    return {}
+
+def save_batch_state(state, batch_dir=BATCH_DIR):
+    with open(os.path.join(batch_dir, "batch_state.json"), "w") as file:
+        json.dump(state, file, indent=2)
+
+
+# Envoie un fichier JSONL de requêtes à l'API et retourne son identifiant
+async def upload_batch_file(session, path):
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
+    form = aiohttp.FormData()
+    form.add_field("purpose", "batch")
+    with open(path, "rb") as file:
+        form.add_field("file", file, filename=os.path.basename(path), content_type="application/jsonl")
+        async with session.post(f"{OPENAI_API_BASE}/files", headers=headers, data=form) as resp:
+            result = await resp.json()
+    return result["id"]
+
+
+# Crée un job batch à partir d'un fichier déjà envoyé et retourne l'identifiant du job
+async def create_batch(session, input_file_id):
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
+    json_payload = {
+        "input_file_id": input_file_id,
+        "endpoint": "/v1/chat/completions",
+        "completion_window": "24h"
+    }
+    async with session.post(f"{OPENAI_API_BASE}/batches", headers=headers, json=json_payload) as resp:
+        result = await resp.json()
+    return result["id"]
+
+
+# Attend la fin d'un job batch en interrogeant régulièrement son état
+async def poll_batch(session, batch_id, poll_interval=BATCH_POLL_INTERVAL):
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
+    while True:
+        async with session.get(f"{OPENAI_API_BASE}/batches/{batch_id}", headers=headers) as resp:
+            batch = await resp.json()
+        status = batch.get("status")
+        counts = batch.get("request_counts", {})
+        print(f"[{batch_id}] {status} : {counts.get('completed', 0)}/{counts.get('total', 0)} done, "
+              f"{counts.get('failed', 0)} failed")
+        if status == "completed" or status in BATCH_FAILED_STATUSES:
+            return batch
+        await asyncio.sleep(poll_interval)
+
+
+# Télécharge le contenu d'un fichier (résultats ou erreurs d'un job batch)
+async def download_file(session, file_id, path):
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
+    async with session.get(f"{OPENAI_API_BASE}/files/{file_id}/content", headers=headers) as resp:
+        content = await resp.read()
+    with open(path, "wb") as file:
+        file.write(content)
+
+
+# Lit les fichiers de résultats et retourne les labels par custom_id
+# Les réponses valides sont ajoutées au cache (clé reconstruite à partir du fichier de requêtes).
+def ingest_batch_results(shard_paths, result_paths, cache=None):
+    labels = {}
+    payloads = {}
+    if cache is not None:
+        for path in shard_paths:
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    request = json.loads(line)
+                    payloads[request["custom_id"]] = request["body"]
+    for path in result_paths:
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    print(f"[{record.get('custom_id')}] Error: {record.get('error') or response}")
+                    continue
+                result = response["body"]
+                label = parse_label(result)
+                labels[record["custom_id"]] = label
+                if label and cache is not None and record["custom_id"] in payloads:
+                    cache.put(make_cache_key(payloads[record["custom_id"]]), MODEL, result, result.get("usage"), label)
+    return labels
+
+
+# Envoie un shard et crée son job batch (l'état est sauvegardé aussitôt)
+async def submit_shard(session, path, shard, state, batch_dir=BATCH_DIR):
+    shard["file_id"] = await upload_batch_file(session, path)
+    shard["batch_id"] = await create_batch(session, shard["file_id"])
+    shard.pop("status", None)
+    save_batch_state(state, batch_dir)
+    print(f"Submitted {path} as batch {shard['batch_id']}")
+
+
+# Indique si le job d'un shard a échoué sans résultat et peut être resoumis (BATCH_MAX_RESUBMITS fois au plus)
+def should_resubmit(shard, result_path, max_resubmits=BATCH_MAX_RESUBMITS):
+    return (shard.get("status") in BATCH_FAILED_STATUSES and not os.path.exists(result_path)
+            and shard.get("resubmits", 0) < max_resubmits)
+
+
+# Exécute le mode batch de bout en bout : compilation, envoi, attente et récupération des résultats
+# L'état est sauvegardé après chaque étape : relancer le script reprend les jobs déjà soumis.
+# Un job terminé en échec (failed, expired, cancelled) sans fichier de résultats est resoumis, y compris lors
+# d'une relance du script, BATCH_MAX_RESUBMITS fois au plus par shard.
+# Retourne la liste des labels dans l'ordre des lignes (chaîne vide si pas de résultat).
+async def run_batch_job(rows, cache=None, batch_dir=BATCH_DIR, poll_interval=BATCH_POLL_INTERVAL):
+    rows = add_article_ids(rows)
+    shard_paths, labels = compile_batch_files(rows, cache=cache, batch_dir=batch_dir)
+    state = load_batch_state(batch_dir)
+    result_paths = []
+
+    async with aiohttp.ClientSession() as session:
+        for path in shard_paths:
+            with open(path, "rb") as file:
+                shard_hash = hashlib.sha1(file.read()).hexdigest()
+            shard = state.get(path, {})
+            # Un shard dont le contenu a changé (autre dataset dans le même dossier) est resoumis
+            if shard.get("sha1") != shard_hash:
+                shard = state[path] = {"sha1": shard_hash}
+                result_path = path.replace("requests_", "results_")
+                if os.path.exists(result_path):
+                    os.remove(result_path)
+            if should_resubmit(shard, path.replace("requests_", "results_")):
+                print(f"Batch {shard['batch_id']} of {path} ended as {shard['status']} without results, resubmitting")
+                shard["resubmits"] = shard.get("resubmits", 0) + 1
+                del shard["batch_id"]
+            if "batch_id" not in shard:
+                await submit_shard(session, path, shard, state, batch_dir)
+
+        for path in shard_paths:
+            shard = state[path]
+            result_path = path.replace("requests_", "results_")
+            while not os.path.exists(result_path):
+                batch = await poll_batch(session, shard["batch_id"], poll_interval)
+                if batch.get("output_file_id"):
+                    await download_file(session, batch["output_file_id"], result_path)
+                if batch.get("error_file_id"):
+                    await download_file(session, batch["error_file_id"], path.replace("requests_", "errors_"))
+                shard["status"] = batch.get("status")
+                save_batch_state(state, batch_dir)
+                if not should_resubmit(shard, result_path):
+                    break
+                print(f"Batch {shard['batch_id']} of {path} ended as {shard['status']} without results, resubmitting")
+                shard["resubmits"] = shard.get("resubmits", 0) + 1
+                await submit_shard(session, path, shard, state, batch_dir)
+            if os.path.exists(result_path):
+                result_paths.append(result_path)
+
+    labels.update(ingest_batch_results(shard_paths, result_paths, cache=cache))
+    return [
+        labels.get(make_custom_id(position, row["article_id"]), "")
+        for position, (_, row) in enumerate(rows.iterrows())
+    ]
+
+if __name__ == "__main__":
+    # Charge le fichier CSV contenant les articles à annoter
+    df = add_article_ids(read_articles(INPUT_CSV))
+    if VALIDATE_ARTICLES:
+        # Les articles rejetés ne sont pas envoyés à l'API
+        all_articles = df
+        df, quarantine = validate_articles(all_articles)
+        quarantine.to_csv(QUARANTINE_CSV, index=False)
+        print_report(all_articles, quarantine)
+    labeled = None
+    if SKIP_LABELED and os.path.exists(OUTPUT_CSV):
+        # Articles déjà labellisés lors d'un run précédent : leurs labels sont repris par jointure sur article_id
+        labeled = add_article_ids(read_articles(OUTPUT_CSV))
+        labeled = labeled[pd.to_numeric(labeled["bias_label"], errors="coerce").notna()]
+        done = df["article_id"].isin(labeled["article_id"])
+        labeled = join_on_id(df[done], labeled, ["bias_label"])
+        df = df[~done]
+        print(f"{len(labeled)} articles already labeled in {OUTPUT_CSV}, {len(df)} to label")
+    # Compte les tokens, tronque les articles trop longs et affiche la prévision du run
+    df = prepare_articles(df)
+
+    cache = LabelCache() if USE_CACHE else None
+
+    # Lance la classification des articles et ajoute les labels au DataFrame
+    if MODE == "batch":
+        bias_labels = asyncio.run(run_batch_job(df, cache=cache))
+    else:
+        bias_labels = asyncio.run(batch_classify(df, batch_size=10, cache=cache))
+    df["bias_label"] = bias_labels
+    df = df.drop(columns="prompt_tokens")  # Colonne interne (limite TPM), absente du fichier de sortie
+    if labeled is not None:
+        df = pd.concat([labeled, df], ignore_index=True)
+
+    # Sauvegarde le DataFrame annoté dans un nouveau fichier CSV (ou un store compressé, voir text_store.py)
+    write_articles(df, OUTPUT_CSV)
 
-# Sauvegarde le DataFrame annoté dans un nouveau fichier CSV
-df.to_csv("monde_with_bias_mini.csv", index=False)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Cache: {stats['hits']} hits / {stats['misses']} misses "
+              f"({stats['hit_rate']:.1%}), {stats['entries']} entries, {stats['size_bytes'] / 1e6:.1f} MB")
+        cache.close()
 
-# Calcule et affiche le biais moyen des articles annotés
-df["bias_score"] = pd.to_numeric(df["bias_label"], errors="coerce")
-valid_scores = df["bias_score"].dropna()
-mean_bias = valid_scores.mean()
-print(f"\n🧭 Mean bias score: {mean_bias:.3f}")
+    # Calcule et affiche le biais moyen des articles annotés
+    df["bias_score"] = pd.to_numeric(df["bias_label"], errors="coerce")
+    valid_scores = df["bias_score"].dropna()
+    if len(valid_scores) < len(df):
+        print(f"⚠️ {len(df) - len(valid_scores)} articles without a usable label")
+    mean_bias = valid_scores.mean()
+    print(f"\n🧭 Mean bias score: {mean_bias:.3f}")
@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+import uuid
+from aiohttp import web
+
+### openai_standin_server.py ###
+# Ce script lance un serveur HTTP local qui imite les routes de l'API OpenAI utilisées par openai_label.py :
+# /v1/chat/completions (mode online), /v1/files et /v1/batches (mode batch).
+# Il permet de tester la pipeline de labellisation de bout en bout sans clé API et sans rien dépenser.
+# Les "labels" renvoyés sont des scores pseudo-aléatoires mais déterministes (hash du prompt utilisateur).
+# Utilisation : python openai_standin_server.py, puis OPENAI_API_BASE=http://localhost:8080/v1 python openai_label.py
+
+HOST = "localhost"
+PORT = 8080
+BATCH_DELAY = 2  # Temps (en secondes) avant qu'un job batch soit traité, pour exercer la boucle d'attente
+
+files = {}  # file_id -> contenu (bytes)
+batches = {}  # batch_id -> objet batch
+
+# Score déterministe entre -3 et 3 calculé à partir du prompt utilisateur
+def fake_score(messages):
+    user_prompt = "".join(m.get("content", "") for m in messages if m.get("role") == "user")
+    digest = int(hashlib.sha1(user_prompt.encode("utf-8")).hexdigest()[:8], 16)
+    return round((digest % 61) / 10 - 3, 1)
+
+# Construit une réponse au format chat.completion
+# Une requête regroupant plusieurs articles ("### Article n ###") reçoit un objet JSON avec un score par article.
+def fake_completion(body):
+    messages = body.get("messages", [])
+    user_prompt = "".join(m.get("content", "") for m in messages if m.get("role") == "user")
+    articles = re.split(r"### Article \d+ ###\n", user_prompt)[1:]
+    if articles:
+        content = json.dumps({"scores": [fake_score([{"role": "user", "content": article.strip()}])
+                                         for article in articles]})
+    elif body.get("logprobs"):
+        # Réponse en un chiffre (0 à 6) avec une distribution centrée sur le score
+        center = fake_score(messages) + 3
+        logprobs = [-abs(digit - center) for digit in range(7)]
+        top = sorted(range(7), key=lambda digit: logprobs[digit], reverse=True)[:body.get("top_logprobs", 5)]
+        content = str(top[0])
+        choice_logprobs = {"content": [{
+            "token": content,
+            "logprob": logprobs[top[0]],
+            "top_logprobs": [{"token": str(digit), "logprob": logprobs[digit]} for digit in top],
+        }]}
+    elif (body.get("response_format") or {}).get("type") == "json_schema":
+        content = json.dumps({"score": fake_score(messages)})
+    else:
+        content = str(fake_score(messages))
+    prompt_tokens = sum(len(m.get("content", "")) // 4 for m in body.get("messages", []))
+    choice = {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+    if body.get("logprobs"):
+        choice["logprobs"] = choice_logprobs
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", ""),
+        "choices": [choice],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 2, "total_tokens": prompt_tokens + 2},
+    }
+
+async def chat_completions(request):
+    body = await request.json()
+    return web.json_response(fake_completion(body))
+
+async def upload_file(request):
+    reader = await request.multipart()
+    content = b""
+    purpose = ""
+    async for part in reader:
+        if part.name == "file":
+            content = await part.read()
+        elif part.name == "purpose":
+            purpose = (await part.read()).decode()
+    file_id = f"file-{uuid.uuid4().hex[:12]}"
+    files[file_id] = content
+    return web.json_response({"id": file_id, "object": "file", "bytes": len(content), "purpose": purpose})
+
+async def file_content(request):
+    file_id = request.match_info["file_id"]
+    if file_id not in files:
+        return web.json_response({"error": {"message": "No such file"}}, status=404)
+    return web.Response(body=files[file_id], content_type="application/jsonl")
+
+# Traite un job batch : chaque ligne du fichier d'entrée reçoit une réponse dans le fichier de sortie
+async def process_batch(batch_id):
+    await asyncio.sleep(BATCH_DELAY)
+    batch = batches[batch_id]
+    batch["status"] = "in_progress"
+    lines = files[batch["input_file_id"]].decode("utf-8").splitlines()
+    output = []
+    for line in lines:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        output.append(json.dumps({
+            "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": fake_completion(request["body"])},
+            "error": None,
+        }))
+    output_file_id = f"file-{uuid.uuid4().hex[:12]}"
+    files[output_file_id] = ("\n".join(output) + "\n").encode("utf-8")
+    batch["output_file_id"] = output_file_id
+    batch["request_counts"] = {"total": len(output), "completed": len(output), "failed": 0}
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+
+async def create_batch(request):
+    body = await request.json()
+    if body.get("input_file_id") not in files:
+        return web.json_response({"error": {"message": "No such file"}}, status=400)
+    batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+    batches[batch_id] = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": body.get("endpoint"),
+        "input_file_id": body["input_file_id"],
+        "completion_window": body.get("completion_window"),
+        "status": "validating",
+        "output_file_id": None,
+        "error_file_id": None,
+        "created_at": int(time.time()),
+        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+    }
+    asyncio.get_running_loop().create_task(process_batch(batch_id))
+    return web.json_response(batches[batch_id])
+
+async def get_batch(request):
+    batch_id = request.match_info["batch_id"]
+    if batch_id not in batches:
+        return web.json_response({"error": {"message": "No such batch"}}, status=404)
+    return web.json_response(batches[batch_id])
+
+def make_app():
+    app = web.Application(client_max_size=200 * 1024 ** 2)  # Les fichiers batch peuvent faire jusqu'à 200 Mo
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/v1/files", upload_file)
+    app.router.add_get("/v1/files/{file_id}/content", file_content)
+    app.router.add_post("/v1/batches", create_batch)
+    app.router.add_get("/v1/batches/{batch_id}", get_batch)
+    return app
+
+if __name__ == "__main__":
+    web.run_app(make_app(), host=HOST, port=PORT)
@@ -1,52 +1,187 @@
+import glob
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from scipy.signal import savgol_filter
+from aggregate_cube import update_cube, LABELED_FILES
+from validate_articles import parse_dates
 
 ##### plot.py #####
 # Ce Programme est conçu pour visualiser les biais politiques des journaux au fil du temps.
-# Il charge les données étiquetées depuis deux fichiers CSV, calcule la moyenne mobile des scores de biais,
-# et affiche un graphique comparatif des biais politiques par journal.
+# Il charge tous les fichiers labellisés (motif LABELED_FILES) via la table agrégée de aggregate_cube.py,
+# place les sommes et nombres d'articles de chaque journal sur une grille régulière de jours (jours x journaux),
+# calcule la moyenne mobile sur WINDOW_DAYS jours calendaires et la lisse avec un filtre de Savitzky-Golay,
+# pour tous les journaux à la fois (opérations sur un tableau 2-D). Le temps de calcul dépend donc du nombre
+# de jours et de journaux, pas du nombre d'articles. Les jours sans article ne comptent pas dans la moyenne ;
+# les trous plus longs que MAX_GAP_DAYS ne sont pas tracés.
+# Des bandes de confiance par bootstrap montrent l'incertitude des courbes (jours avec peu d'articles) :
+# bootstrap par blocs de jours voisins (par défaut), ou rééchantillonnage des articles au sein de chaque jour
+# (réservé aux séries denses : un jour avec un seul article ne varie jamais, la bande d'un journal peu couvert
+# est alors presque nulle).
+# Tous les réplicats d'un paquet sont tirés en une fois sous forme de matrice d'indices (pas de boucle Python).
 # Il utilise la bibliothèque Pandas pour la manipulation des données et Matplotlib pour la visualisation.
 
+WINDOW_DAYS = 60  # Taille de la fenêtre de la moyenne mobile (en jours calendaires)
+SAVGOL_WINDOW_DAYS = 201  # Fenêtre du filtre de Savitzky-Golay (en jours, impaire)
+SAVGOL_POLYORDER = 4  # Ordre du polynôme du filtre de Savitzky-Golay
+MAX_GAP_DAYS = 90  # Au-delà de ce nombre de jours consécutifs sans article, la courbe est interrompue
 
-# Charger les données étiquetées depuis deux fichiers CSV (un pour chaque journal)
-df = pd.read_csv("daily_with_bias_full_mini.csv")
-df2 = pd.read_csv("nyt_with_bias_mini.csv")
-
-window_size = 60  # Taille de la fenêtre pour la moyenne mobile
-plt.figure(figsize=(12, 6))  # Créer une figure pour le graphique
-
-# Boucle sur les deux DataFrames (un pour chaque journal)
-for dframe in [df, df2]:
-    # Vérifier que les colonnes nécessaires existent
-    if 'date' not in dframe.columns or 'bias_label' not in dframe.columns:
-        raise ValueError("Le DataFrame doit contenir les colonnes 'date' et 'bias_label'")
-    if 'newspaper' not in dframe.columns:
-        dframe['newspaper'] = 'Unknown'  # Ajouter une colonne 'newspaper' si elle n'existe pas
-    dframe['date'] = pd.to_datetime(dframe['date'], errors='coerce')  # Convertir les dates
-    dframe = dframe.dropna(subset=['date', 'bias_label'])  # Supprimer les lignes avec des valeurs manquantes
-    dframe['bias_label'] = pd.to_numeric(dframe['bias_label'], errors='coerce')  # Convertir les labels en numérique
-    dframe = dframe.dropna(subset=['bias_label'])  # Supprimer les lignes avec des labels manquants
-    dframe = dframe.sort_values('date')  # Trier par date
-
-    # Calculer la moyenne mobile par journal
-    dframe['bias_ma'] = dframe.groupby('newspaper')['bias_label'].transform(
-        lambda x: x.rolling(window=window_size, min_periods=1).mean()
-    )
-    # Lisser la courbe avec le filtre de Savitzky-Golay
-    dframe['bias_smooth'] = savgol_filter(dframe['bias_ma'], window_length=2000, polyorder=4)
-
-    # Récupérer le nom du journal pour la légende
-    newspaper = dframe['newspaper'].iloc[0] if not dframe.empty else 'Unknown'
-    # Tracer la courbe lissée
-    plt.plot(dframe['date'], dframe['bias_smooth'], label=newspaper)
-
-# Ajouter le titre et les labels du graphique
-plt.title(f'Moyenne mobile sur {window_size} jours du biais politique par journal')
-plt.xlabel('Date')
-plt.ylabel('Score de biais (-3 : Extrême gauche, 3 : Extrême droite)')
-plt.axhline(0, color='gray', linestyle='--', linewidth=2)  # Ligne de neutralité
-plt.legend()
-plt.grid(True)
-plt.tight_layout()
-plt.show()
+SHOW_BANDS = True  # Affiche les bandes de confiance en zones ombrées
+BOOTSTRAP_METHOD = "block"  # "block" : blocs de jours voisins, "articles" : articles tirés au sein de chaque jour
+# (séries denses seulement, plusieurs articles par jour et par journal)
+N_BOOTSTRAP = 1000  # Nombre de réplicats
+CONFIDENCE = 0.95  # Niveau de confiance des bandes
+BLOCK_DAYS = 7  # Longueur des blocs de jours (méthode "block")
+BLOCK_RADIUS_DAYS = 15  # Décalage maximal d'un bloc, en jours (méthode "block")
+REPLICATE_CHUNK = 100  # Nombre de réplicats tirés à la fois (limite la mémoire)
+SEED = 42  # Graine du générateur aléatoire
+
+# Construit la grille quotidienne à partir de la table agrégée
+# Retourne l'index des jours, la liste des journaux et deux tableaux (jours x journaux) : somme des scores et
+# nombre d'articles (0 pour les jours sans article).
+def daily_grid(cube):
+    grid = cube.groupby(["date", "newspaper"])[["sum", "count"]].sum().unstack("newspaper", fill_value=0)
+    days = pd.date_range(grid.index.min(), grid.index.max(), freq="D")
+    grid = grid.reindex(days, fill_value=0)
+    return days, grid["sum"].columns.tolist(), grid["sum"].to_numpy(float), grid["count"].to_numpy(float)
+
+# Moyenne mobile sur "window" jours calendaires (pondérée par le nombre d'articles de chaque jour)
+# Les sommes glissantes sont calculées par sommes cumulées sur l'axe des jours, pour tous les journaux à la fois.
+# NaN quand la fenêtre ne contient aucun article.
+# Les tableaux peuvent avoir des dimensions supplémentaires (réplicats du bootstrap) après celle des jours.
+def rolling_mean(sums, counts, window=WINDOW_DAYS):
+    zeros = np.zeros((1,) + sums.shape[1:])
+    cum_sums = np.concatenate([zeros, np.cumsum(sums, axis=0)])
+    cum_counts = np.concatenate([zeros, np.cumsum(counts, axis=0)])
+    starts = np.maximum(np.arange(1, len(sums) + 1) - window, 0)
+    window_sums = cum_sums[1:] - cum_sums[starts]
+    window_counts = cum_counts[1:] - cum_counts[starts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(window_counts > 0, window_sums / window_counts, np.nan)
+
+# Longueur du trou (nombre de jours consécutifs sans article) auquel appartient chaque jour, par journal
+# Calculée à partir du dernier jour avec articles avant et du premier jour avec articles après chaque jour.
+def gap_lengths(counts):
+    n_days = len(counts)
+    day = np.arange(n_days)[:, None]
+    has_articles = counts > 0
+    previous = np.maximum.accumulate(np.where(has_articles, day, -1), axis=0)
+    following = np.minimum.accumulate(np.where(has_articles, day, n_days)[::-1], axis=0)[::-1]
+    return np.where(has_articles, 0, following - previous - 1)
+
+# Lisse les moyennes mobiles avec un filtre de Savitzky-Golay appliqué à tout le tableau (axe des jours)
+# Les valeurs manquantes sont interpolées avant le filtrage puis remises à NaN en dehors de la période couverte
+# par chaque journal et dans les trous de plus de max_gap jours.
+def smooth(values, counts, window=SAVGOL_WINDOW_DAYS, polyorder=SAVGOL_POLYORDER, max_gap=MAX_GAP_DAYS):
+    frame = pd.DataFrame(values)
+    observed = frame.notna()
+    filled = frame.interpolate(limit_area="inside").ffill().bfill().fillna(0).to_numpy()
+    window = min(window, len(values) - (len(values) + 1) % 2)  # Fenêtre impaire, pas plus longue que la série
+    smoothed = savgol_filter(filled, window, polyorder, axis=0) if window > polyorder else filled
+    # Période couverte par chaque journal : du premier au dernier jour avec une moyenne mobile définie
+    covered = (observed.cummax() & observed[::-1].cummax()[::-1]).to_numpy()
+    return np.where(covered & (gap_lengths(counts) <= max_gap), smoothed, np.nan)
+
+# Charge les scores de chaque article (journal, date et label seulement) des fichiers labellisés
+# Retourne les scores et la case de la grille (jour x journal, aplatie) de chaque article.
+def load_article_scores(pattern, days, newspapers):
+    frames = [pd.read_csv(path, usecols=lambda column: column in ("newspaper", "date", "bias_label"))
+              for path in sorted(glob.glob(pattern))]
+    articles = pd.concat(frames, ignore_index=True)
+    if "newspaper" not in articles:
+        articles["newspaper"] = "Unknown"  # Fichiers sans colonne journal, comme dans aggregate_cube.py
+    scores = pd.to_numeric(articles["bias_label"], errors="coerce").to_numpy()
+    day = ((parse_dates(articles["date"]) - days[0]).dt.days).to_numpy()
+    paper = pd.Categorical(articles["newspaper"].fillna("Unknown"), categories=newspapers).codes
+    keep = ~np.isnan(scores) & (day >= 0) & (day < len(days)) & (paper >= 0)
+    return scores[keep], day[keep].astype(np.int64) * len(newspapers) + paper[keep]
+
+# Bandes de confiance par bootstrap des moyennes quotidiennes et des moyennes mobiles de chaque journal
+# "block" : bootstrap par blocs local, chaque bloc de block_days jours est remplacé par un bloc décalé d'au plus
+# radius jours (préserve la corrélation entre jours voisins et l'évolution lente du biais) ;
+# "articles" : dans chaque réplicat, les articles de chaque jour sont tirés avec remise parmi ceux du même jour.
+# Un jour avec un seul article ne varie pas : cette méthode sous-estime l'incertitude des journaux peu couverts.
+# Les réplicats sont tirés par paquets : une matrice d'indices (réplicats x articles ou réplicats x jours) par paquet.
+# Retourne un dict de tableaux (jours x journaux) : daily_low, daily_high, rolling_low, rolling_high.
+def bootstrap_bands(scores, cells, sums, counts, method=BOOTSTRAP_METHOD, n_boot=N_BOOTSTRAP,
+                    confidence=CONFIDENCE, window=WINDOW_DAYS, block_days=BLOCK_DAYS, radius=BLOCK_RADIUS_DAYS,
+                    chunk=REPLICATE_CHUNK, seed=SEED):
+    rng = np.random.default_rng(seed)
+    n_days, n_papers = counts.shape
+    with np.errstate(invalid="ignore", divide="ignore"):
+        daily_point = sums / counts
+    rolling_point = rolling_mean(sums, counts, window)
+    daily = np.empty((n_boot, n_days, n_papers), dtype=np.float32)
+    rolling = np.empty((n_boot, n_days, n_papers), dtype=np.float32)
+
+    if method == "articles":
+        # Articles triés par case (jour, journal) : les articles d'une case sont contigus
+        order = np.argsort(cells, kind="stable")
+        scores, cells = scores[order], cells[order]
+        cell_counts = np.bincount(cells, minlength=n_days * n_papers)
+        cell_starts = np.concatenate([[0], np.cumsum(cell_counts)[:-1]])
+        nonempty = np.flatnonzero(cell_counts)
+        article_start, article_count = cell_starts[cells], cell_counts[cells]
+    elif method == "block":
+        day = np.arange(n_days)
+        n_blocks = day[-1] // block_days + 1
+    else:
+        raise ValueError(f"Méthode de bootstrap inconnue : {method}")
+
+    for first in range(0, n_boot, chunk):
+        n = min(chunk, n_boot - first)
+        if method == "articles":
+            # Indice tiré pour chaque article : une position au hasard parmi les articles de sa case
+            index = article_start + (rng.random((n, len(scores))) * article_count).astype(np.int64)
+            replicate_sums = np.zeros((n, n_days * n_papers))
+            replicate_sums[:, nonempty] = np.add.reduceat(scores[index], cell_starts[nonempty], axis=1)
+            replicate_sums = replicate_sums.reshape(n, n_days, n_papers).transpose(1, 2, 0)
+            replicate_counts = np.broadcast_to(counts[:, :, None], replicate_sums.shape)
+        else:
+            # Indice tiré pour chaque jour : le même jour décalé du décalage aléatoire de son bloc
+            offsets = rng.integers(-radius, radius + 1, size=(n, n_blocks))
+            index = np.clip(day + offsets[:, day // block_days], 0, n_days - 1)
+            replicate_sums = sums[index].transpose(1, 2, 0)
+            replicate_counts = counts[index].transpose(1, 2, 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            daily[first:first + n] = (replicate_sums / replicate_counts).transpose(2, 0, 1)
+        rolling[first:first + n] = rolling_mean(replicate_sums, replicate_counts, window).transpose(2, 0, 1)
+
+    # Un réplicat sans article dans une case prend la valeur observée (la case reste NaN si elle n'en a pas)
+    daily = np.where(np.isnan(daily), daily_point, daily)
+    rolling = np.where(np.isnan(rolling), rolling_point, rolling)
+    tail = (1 - confidence) / 2 * 100
+    daily_low, daily_high = np.percentile(daily, [tail, 100 - tail], axis=0)
+    rolling_low, rolling_high = np.percentile(rolling, [tail, 100 - tail], axis=0)
+    return {"daily_low": daily_low, "daily_high": daily_high, "rolling_low": rolling_low, "rolling_high": rolling_high}
+
+
+if __name__ == "__main__":
+    # Table agrégée (mise à jour avec les nouveaux fichiers labellisés)
+    cube = update_cube(LABELED_FILES)
+    days, newspapers, sums, counts = daily_grid(cube)
+
+    bias_ma = rolling_mean(sums, counts)
+    bias_smooth = smooth(bias_ma, counts)
+
+    if SHOW_BANDS:
+        scores, cells = load_article_scores(LABELED_FILES, days, newspapers)
+        bands = bootstrap_bands(scores, cells, sums, counts)
+        # Les bornes sont lissées comme la courbe pour être tracées autour d'elle
+        low, high = smooth(bands["rolling_low"], counts), smooth(bands["rolling_high"], counts)
+
+    plt.figure(figsize=(12, 6))  # Créer une figure pour le graphique
+    for k, newspaper in enumerate(newspapers):
+        line, = plt.plot(days, bias_smooth[:, k], label=newspaper)
+        if SHOW_BANDS:
+            plt.fill_between(days, low[:, k], high[:, k], color=line.get_color(), alpha=0.2, linewidth=0)
+
+    # Ajouter le titre et les labels du graphique
+    plt.title(f'Moyenne mobile sur {WINDOW_DAYS} jours du biais politique par journal')
+    plt.xlabel('Date')
+    plt.ylabel('Score de biais (-3 : Extrême gauche, 3 : Extrême droite)')
+    plt.axhline(0, color='gray', linestyle='--', linewidth=2)  # Ligne de neutralité
+    plt.legend()
+    plt.grid(True)
+    plt.tight_layout()
+    plt.show()
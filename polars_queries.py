@@ -0,0 +1,146 @@
+import csv
+import glob
+import time
+import polars as pl
+
+### polars_queries.py ###
+# Ce module réécrit les traitements de csv_edit.py, le filtrage des labels de fine_tune.py et les agrégations
+# de plot.py sous forme de requêtes paresseuses (LazyFrame) Polars. Une requête n'est exécutée qu'au moment
+# du collect : Polars ne lit alors que les colonnes utiles (projection pushdown), applique les filtres pendant
+# la lecture (predicate pushdown), répartit le travail sur tous les cœurs et traite le fichier par morceaux
+# en mode streaming, sans charger tout le corpus en mémoire.
+# Le nombre de threads se règle avec la variable d'environnement POLARS_MAX_THREADS (par défaut tous les cœurs).
+
+INPUT_FILES = "articles_*.csv"  # Fichiers CSV d'articles (motif glob accepté)
+ARTICLE_COLUMNS = ["newspaper", "title", "date", "desc", "content", "url", "article_id"]  # Colonnes des CSV écrits par les scrapers
+
+FRENCH_MONTHS = {
+    "janvier": "01", "février": "02", "fevrier": "02", "mars": "03", "avril": "04", "mai": "05", "juin": "06",
+    "juillet": "07", "août": "08", "aout": "08", "septembre": "09", "octobre": "10", "novembre": "11",
+    "décembre": "12", "decembre": "12",
+}
+
+# Nombre de colonnes d'un CSV brut, lu sur sa première ligne : les CSV écrits avant l'ajout des identifiants
+# stables (article_ids.py) n'ont que les 5 premières colonnes de ARTICLE_COLUMNS
+def raw_width(path):
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        return len(next(csv.reader(file), ARTICLE_COLUMNS))
+
+# Ouvre un ou plusieurs CSV d'articles en mode paresseux (rien n'est lu à ce stade)
+# has_header=False pour les CSV bruts des scrapers, écrits sans ligne d'en-tête. Les fichiers d'un motif glob
+# peuvent avoir des colonnes différentes (colonnes ajoutées par un labelliseur, CSV bruts sans url ni article_id) :
+# les colonnes absentes sont nulles.
+def scan_articles(source=INPUT_FILES, has_header=True):
+    scans = [
+        pl.scan_csv(
+            path,
+            has_header=has_header,
+            new_columns=None if has_header else ARTICLE_COLUMNS[:raw_width(path)],
+            infer_schema=False,  # Toutes les colonnes en texte : aucune conversion implicite
+            truncate_ragged_lines=True,
+        )
+        for path in sorted(glob.glob(source))
+    ]
+    return pl.concat(scans, how="diagonal") if len(scans) > 1 else scans[0]
+
+# Expression convertissant une colonne de dates (ISO ou française, ex. "1 janvier 2015" / "1er janvier 2015") en Date
+def parse_date(column="date"):
+    text = pl.col(column).str.strip_chars()
+    parts = text.str.to_lowercase().str.extract_groups(r"^(\d{1,2})(?:er)?\s+(\S+)\s+(\d{4})$")
+    french = pl.concat_str([
+        parts.struct.field("3"),
+        parts.struct.field("2").replace_strict(FRENCH_MONTHS, default=None),
+        parts.struct.field("1").str.zfill(2),
+    ], separator="-")
+    return pl.coalesce(
+        text.str.slice(0, 10).str.to_date("%Y-%m-%d", strict=False),
+        french.str.to_date("%Y-%m-%d", strict=False),
+    ).alias(column)
+
+# Exécute une requête en mode streaming (API récente de Polars, ou ancienne option streaming=True)
+def collect(query):
+    try:
+        return query.collect(engine="streaming")
+    except TypeError:
+        return query.collect(streaming=True)
+
+
+### Équivalents de csv_edit.py ###
+
+# Supprime les lignes en double (comme remove_duplicates_from_csv) et écrit le résultat sans tout charger en mémoire
+def remove_duplicates(source, output_file, has_header=True):
+    scan_articles(source, has_header).unique(maintain_order=True).sink_csv(output_file)
+
+# Nombre d'articles par jour (comme generate_daily_article_counts)
+def daily_article_counts(articles):
+    return (
+        articles.select(parse_date())
+        .drop_nulls("date")
+        .group_by("date")
+        .agg(pl.len().alias("count"))
+        .sort("date")
+    )
+
+# Nombre d'articles par mois (comme group_by_month)
+def monthly_article_counts(articles):
+    return (
+        articles.select(parse_date())
+        .drop_nulls("date")
+        .group_by(pl.col("date").dt.truncate("1mo").alias("month"))
+        .agg(pl.len().alias("count"))
+        .sort("month")
+    )
+
+
+### Équivalent de prepare_labels (fine_tune.py) ###
+
+# Articles annotés utilisables pour l'entraînement : label et contenu présents, label entier de -3 à 3,
+# remappé en classe de 0 à 6. Seules les colonnes content et class_label sont lues.
+def labeled_articles(articles):
+    return (
+        articles.select("content", "bias_label")
+        .filter(pl.col("content").is_not_null() & (pl.col("bias_label").str.strip_chars() != ""))
+        .with_columns(pl.col("bias_label").cast(pl.Float64, strict=False).cast(pl.Int64, strict=False))
+        .drop_nulls("bias_label")
+        .select("content", (pl.col("bias_label") + 3).alias("class_label"))
+    )
+
+
+### Agrégations de plot.py ###
+
+# Nombre d'articles, somme et somme des carrés des scores par (journal, jour), comme la table de aggregate_cube.py
+def daily_bias(articles):
+    score = pl.col("bias_label").cast(pl.Float64, strict=False)
+    return (
+        articles.select("newspaper", parse_date(), score.alias("score"))
+        .drop_nulls(["date", "score"])
+        .group_by("newspaper", "date")
+        .agg(
+            pl.len().alias("count"),
+            pl.col("score").sum().alias("sum"),
+            (pl.col("score") ** 2).sum().alias("sumsq"),
+        )
+        .sort("newspaper", "date")
+    )
+
+# Biais moyen par journal et par période ("1d", "1w", "1mo"...)
+def bias_by_period(articles, every="1mo"):
+    return (
+        daily_bias(articles)
+        .group_by("newspaper", pl.col("date").dt.truncate(every))
+        .agg(pl.col("count").sum(), pl.col("sum").sum())
+        .with_columns((pl.col("sum") / pl.col("count")).alias("mean"))
+        .sort("newspaper", "date")
+    )
+
+
+if __name__ == "__main__":
+    articles = scan_articles(INPUT_FILES)
+    for name, query in [("daily counts", daily_article_counts(articles)),
+                        ("monthly counts", monthly_article_counts(articles))]:
+        start = time.time()
+        result = collect(query)
+        print(f"{name}: {len(result)} rows in {time.time() - start:.2f}s")
+        print(result.tail(5))
+    # Plan optimisé : montre les colonnes lues et les filtres poussés jusqu'à la lecture du CSV
+    print(monthly_article_counts(articles).explain())
@@ -7,6 +7,10 @@ from bs4 import BeautifulSoup
 import requests
 from fake_useragent import UserAgent
 from datetime import date, timedelta
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Racine du projet
+from article_ids import article_id
+from crawl_metrics import metrics
 
 ##### 20minutes_scraper.py #####
 # Ce Programme est conçu pour récupérer des articles du journal 20 Minutes à partir de ses archives.
@@ -27,6 +31,8 @@ PROGRESS_FILE = "progress_20min.txt"  # Fichier pour sauvegarder la progression
 
 START_DATE = date(2015, 1, 1)  # Date de départ pour les archives du Daily Mail
 END_DATE = date(2025, 1, 1)  # Date de fin pour les archives du Daily Mail
+# Racine du site (variable d'environnement MINUTES20_BASE_URL pour viser le serveur local de bench/standin_server.py)
+BASE_URL = os.environ.get("MINUTES20_BASE_URL", "https://www.20minutes.fr")
 
 # Listes des mots-clés inclus et exclus pour le filtrage des articles
 inclu=['international','politique','societe','economie','idees','afrique','planete','police-justice','monde','planete','faits_divers','sante','france','elections']
@@ -59,7 +65,7 @@ def get_article_content_20min(soup):
     raw_text = "\n".join(p.get_text(strip=False) for p in focus.find_all(["p"],recursive=False))
     return "20 Minutes",article_title, article_date, article_desc, raw_text
 
-def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text):
+def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text, article_url):
     """
     Enregistre les données d'un article dans un fichier CSV.
     
@@ -69,59 +75,60 @@ def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text):
         article_date (str): La date de l'article.
         article_desc (str): La description de l'article.
         raw_text (str): Le texte brut de l'article.
+        article_url (str): L'URL de l'article (sert à calculer son identifiant stable).
     """
     import csv
-    with open('articles_20min.csv', mode='a') as file:
+    with metrics.stage("csv", article_url), open('articles_20min.csv', mode='a') as file:
         writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        writer.writerow([journal_name,article_title, article_date, article_desc, raw_text])
+        writer.writerow([journal_name,article_title, article_date, article_desc, raw_text,
+                         article_url, article_id(article_url, article_title, raw_text)])
+    metrics.article_saved(article_url)
+
+def extract_article_urls_20min(soup):
+    """
+    Extrait de la page d'archives 20 Minutes les URLs des articles à récupérer.
+
+    Args:
+        soup (BeautifulSoup): La soupe BeautifulSoup de la page d'archives.
+
+    Returns:
+        list: Les URLs des articles, dans l'ordre de la page, filtrées selon les mots-clés inclus et exclus.
+    """
+    river = soup.find(class_="mb-xxl@md")
+    ul = river.find("ul")
+    # Selon la mise en page de l'archive, les liens sont dans une liste ou dans des blocs "flex@xs"
+    items = river.find_all("div", class_="flex@xs") if ul is None else ul.find_all("li")
+    urls = []
+    for item in items:
+        link = item.find("a")
+        if not link:
+            continue
+        article_url = link["href"]
+        # Filtrage des URLs d'articles selon les mots-clés inclus et exclus
+        if not any(word in article_url for word in inclu):
+            continue
+        if BASE_URL + '/' not in article_url:
+            continue
+        if any(word in article_url for word in exclu):
+            continue
+        urls.append(article_url)
+    return urls
 
 def getArticleURL20min(soup):
     """
     Récupère les URLs des articles à partir de la page d'archives 20 Minutes.
     """
     fetched=0
-    river = soup.find(class_="mb-xxl@md")
-    ul = river.find("ul")
-    if ul is None:
-        for div in river.find_all("div", class_="flex@xs"):
-            if fetched<10:
-                link = div.find("a")
-                if link:
-                    article_url = link["href"]
-                    # Filtre selon les mots-clés inclus/exclus
-                    if not any(word in article_url for word in inclu):
-                            continue
-                    if 'https://www.20minutes.fr/' not in article_url:
-                        continue
-                    if any(word in article_url for word in exclu):
-                        continue
-                    print("Fetching article from URL:", article_url)
-                    soup = fetch_article(article_url)
-                    journal_name,article_title, article_date, article_desc, raw_text = get_article_content_20min(soup)
-                    saveToCSV(journal_name,article_title, article_date, article_desc, raw_text)
-                    fetched+=1
-            else:
-                return
-    for li in ul.find_all("li"):
-        if fetched<10:
-            link = li.find("a")
-            if link:
-                article_url = link["href"]
-                print(article_url)
-                # Filtrage des URLs d'articles selon les mots-clés inclus et exclus
-                if not any(word in article_url for word in inclu):
-                    continue
-                if 'https://www.20minutes.fr/' not in article_url:
-                    continue
-                if any(word in article_url for word in exclu):
-                    continue
-                print("Fetching article from URL:", article_url)
-                soup = fetch_article(article_url)
-                journal_name,article_title, article_date, article_desc, raw_text = get_article_content_20min(soup)
-                saveToCSV(journal_name,article_title, article_date, article_desc, raw_text)
-                fetched+=1
-            else:
-                return
+    for article_url in extract_article_urls_20min(soup):
+        if fetched>=10:
+            return
+        print("Fetching article from URL:", article_url)
+        soup = fetch_article(article_url)
+        journal_name,article_title, article_date, article_desc, raw_text = get_article_content_20min(soup)
+        if not raw_text.strip():
+            continue  # Corps vide : non sauvegardé et non compté
+        saveToCSV(journal_name,article_title, article_date, article_desc, raw_text, article_url)
+        fetched+=1
             
 
 def fetch_article(url):
@@ -135,8 +142,9 @@ def fetch_article(url):
         BeautifulSoup: La soupe BeautifulSoup de la page de l'article.
     """
     try:
-        driver.get(url)
-        soup = BeautifulSoup(driver.page_source, "html.parser")
+        html = metrics.get_page(driver, url)
+        with metrics.stage("parse", url):
+            soup = BeautifulSoup(html, "html.parser")
     finally:
         return soup
 
@@ -149,7 +157,7 @@ def fetch_archives_20minutes(y,m,d):
         m (int): Le mois de la date.
         d (int): Le jour de la date.
     """
-    url = f"https://www.20minutes.fr/archives/{y}/{m:02d}-{d:02d}/"
+    url = f"{BASE_URL}/archives/{y}/{m:02d}-{d:02d}/"
     soup = fetch_article(url)
     getArticleURL20min(soup)
 
@@ -185,7 +193,7 @@ if __name__ == "__main__":
     start_date = load_progress()
     end_date = END_DATE
     driver = webdriver.Firefox(options=options)
-    driver.get('https://www.20minutes.fr')
+    driver.get(BASE_URL)
     current_date = start_date
     # Boucle à travers les dates, en récupérant les archives pour chaque date
     while current_date <= end_date:
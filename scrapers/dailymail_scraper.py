@@ -6,6 +6,10 @@ from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
 from datetime import date, timedelta
 import csv
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Racine du projet
+from article_ids import article_id
+from crawl_metrics import metrics
 
 ##### dailymail_scraper.py #####
 # Ce programme permet de récupérer des articles du journal Daily Mail à partir de ses archives.
@@ -23,6 +27,9 @@ options.binary_location = "/snap/bin/geckodriver"  # Chemin du binaire geckodriv
 START_DATE = date(2015, 1, 1)  # Date de départ pour les archives
 END_DATE = date(2025, 1, 1)    # Date de fin pour les archives
 
+# Racine du site (variable d'environnement DAILYMAIL_BASE_URL pour viser le serveur local de bench/standin_server.py)
+BASE_URL = os.environ.get("DAILYMAIL_BASE_URL", "https://www.dailymail.co.uk")
+
 PROGRESS_FILE = "progress_daily.txt"  # Fichier pour sauvegarder la progression
 
 inclu=['news']      # Mots-clés à inclure dans les URLs d'articles
@@ -52,7 +59,7 @@ def get_article_content_daily(soup):
     raw_text = "\n".join(p.get_text(strip=False) for p in focus.find_all(["p"],recursive=False))
     return "Daily Mail",article_title, article_date, article_desc, raw_text
 
-def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text):
+def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text, article_url):
     """
     Enregistre les données d'un article dans un fichier CSV.
 
@@ -62,13 +69,41 @@ def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text):
         article_date (str): La date de l'article.
         article_desc (str): La description de l'article.
         raw_text (str): Le texte brut de l'article.
+        article_url (str): L'URL de l'article (sert à calculer son identifiant stable).
     Returns:
         None
     """
     import csv
-    with open('articles_daily.csv', mode='a') as file:
+    with metrics.stage("csv", article_url), open('articles_daily.csv', mode='a') as file:
         writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        writer.writerow([journal_name,article_title, article_date, article_desc, raw_text])
+        writer.writerow([journal_name,article_title, article_date, article_desc, raw_text,
+                         article_url, article_id(article_url, article_title, raw_text)])
+    metrics.article_saved(article_url)
+
+def extract_article_urls_daily(soup):
+    """
+    Extrait de la page d'archives Daily Mail les URLs (absolues) des articles à récupérer.
+
+    Args:
+        soup (BeautifulSoup): La soupe BeautifulSoup de la page d'archives.
+
+    Returns:
+        list: Les URLs des articles, dans l'ordre de la page, filtrées selon les mots-clés inclus et exclus.
+    """
+    urls = []
+    ul = soup.find("ul", class_="archive-articles")
+    for li in ul.find_all("li")[10:]:
+        link = li.find("a")
+        if not link:
+            break  # Élément sans lien : fin de la liste des articles du jour
+        article_url = link["href"]
+        # Filtre selon les mots-clés inclus/exclus
+        if any(word in article_url for word in exclu):
+            continue
+        if not any(word in article_url for word in inclu):
+            continue
+        urls.append(BASE_URL+article_url)
+    return urls
 
 def getArticleURLdaily(soup):
     """
@@ -81,25 +116,16 @@ def getArticleURLdaily(soup):
         None
     """
     global fetched
-    ul = soup.find("ul", class_="archive-articles")
-    for li in ul.find_all("li")[10:]:
-        if fetched<10:
-            link = li.find("a")
-            if link:
-                article_url = link["href"]
-                print(article_url)
-                # Filtre selon les mots-clés inclus/exclus
-                if any(word in article_url for word in exclu):
-                    continue
-                if not any(word in article_url for word in inclu):
-                    continue
-                print("Fetching article from URL:", article_url)
-                soup = fetch_article('https://www.dailymail.co.uk'+article_url)
-                journal_name,article_title, article_date, article_desc, raw_text = get_article_content_daily(soup)
-                saveToCSV(journal_name,article_title, article_date, article_desc, raw_text)
-                fetched+=1
-            else:
-                return
+    for article_url in extract_article_urls_daily(soup):
+        if fetched>=10:
+            return
+        print("Fetching article from URL:", article_url)
+        soup = fetch_article(article_url)
+        journal_name,article_title, article_date, article_desc, raw_text = get_article_content_daily(soup)
+        if not raw_text.strip():
+            continue  # Corps vide : non sauvegardé et non compté dans les 10 articles du jour
+        saveToCSV(journal_name,article_title, article_date, article_desc, raw_text, article_url)
+        fetched+=1
 
 def get_fetched_count_for_date(year, month, day):
     """
@@ -138,8 +164,9 @@ def fetch_article(url):
         BeautifulSoup: La soupe BeautifulSoup de la page de l'article.
     """
     try:
-        driver.get(url)
-        soup = BeautifulSoup(driver.page_source, "html.parser")
+        html = metrics.get_page(driver, url)
+        with metrics.stage("parse", url):
+            soup = BeautifulSoup(html, "html.parser")
     finally:
         return soup
 
@@ -155,7 +182,7 @@ def fetch_archives_daily(y,m,d):
     Returns:
         None
     """
-    url = f"https://www.dailymail.co.uk/home/sitemaparchive/day_{y}{m:02d}{d:02d}.html"
+    url = f"{BASE_URL}/home/sitemaparchive/day_{y}{m:02d}{d:02d}.html"
     soup = fetch_article(url)
     getArticleURLdaily(soup)
 
@@ -197,7 +224,7 @@ if __name__ == "__main__":
     end_date = END_DATE
     driver = webdriver.Firefox(options=options,service=service)
 
-    driver.get('https://www.dailymail.co.uk/')
+    driver.get(BASE_URL+'/')
     current_date = start_date
     while current_date <= end_date:
         fetched = get_fetched_count_for_date(current_date.year, current_date.month, current_date.day)
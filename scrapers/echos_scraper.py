@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 import os, time, csv
-from datetime import datetime
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.firefox.options import Options
 from fake_useragent import UserAgent
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Racine du projet
+from article_ids import article_id
+from crawl_metrics import metrics
 
 # === Configuration du navigateur Firefox ===
 options = Options()
@@ -17,6 +20,8 @@ options.add_argument("/home/melvil/snap/firefox/common/.cache/mozilla/firefox/n3
 PROGRESS_FILE = "progress.txt"            # Fichier pour sauvegarder la progression
 ARTICLE_COUNT_FILE = "article_count.txt"  # Fichier pour compter les articles par date
 OUTPUT_CSV = "LesEchos_scraped.csv"       # Fichier de sortie CSV
+# Racine du site (variable d'environnement LESECHOS_BASE_URL pour viser le serveur local de bench/standin_server.py)
+BASE_URL = os.environ.get("LESECHOS_BASE_URL", "https://www.lesechos.fr")
 
 # === Initialisation du driver ===
 def init_driver():
@@ -26,7 +31,7 @@ def init_driver():
         driver (webdriver.Firefox) : Instance du navigateur Firefox.
     """
     driver = webdriver.Firefox(options=options)
-    driver.get("https://www.lesechos.fr")  # Charge la page d'accueil pour initialiser les cookies
+    driver.get(BASE_URL)  # Charge la page d'accueil pour initialiser les cookies
     return driver
 
 # === Sauvegarde de la progression ===
@@ -50,6 +55,21 @@ def load_progress():
     return 2015, 1, 1
 
 # === Gestion du compteur journalier ===
+FRENCH_MONTHS = {"janvier": 1, "février": 2, "mars": 3, "avril": 4, "mai": 5, "juin": 6, "juillet": 7,
+                 "août": 8, "septembre": 9, "octobre": 10, "novembre": 11, "décembre": 12}
+
+def french_date_key(article_date):
+    """
+    Convertit une date d'article au format 'jour mois année' (mois en français) en 'AAAA-MM-JJ',
+    sans dépendre de la locale de la machine.
+    Args:
+        article_date (str): Date de l'article, par ex. '2 janvier 2020' ou '1er janvier 2020'
+    Retourne :
+        str : Date au format 'AAAA-MM-JJ'
+    """
+    day, month, year = article_date.lower().split()
+    return f"{int(year):04d}-{FRENCH_MONTHS[month]:02d}-{int(day.removesuffix('er')):02d}"
+
 def update_article_count(article_date):
     """
     Met à jour le compteur d'articles pour une date donnée.
@@ -58,7 +78,7 @@ def update_article_count(article_date):
     Retourne :
         int : Nombre d'articles pour cette date après mise à jour
     """
-    date_str = datetime.strptime(article_date, "%d %B %Y").strftime("%Y-%m-%d")
+    date_str = french_date_key(article_date)
     counts = {}
     if os.path.exists(ARTICLE_COUNT_FILE):
         with open(ARTICLE_COUNT_FILE, 'r') as f:
@@ -80,7 +100,7 @@ def get_article_count(article_date):
     Retourne :
         int : Nombre d'articles pour cette date
     """
-    date_str = datetime.strptime(article_date, "%d %B %Y").strftime("%Y-%m-%d")
+    date_str = french_date_key(article_date)
     if os.path.exists(ARTICLE_COUNT_FILE):
         with open(ARTICLE_COUNT_FILE, 'r') as f:
             for line in f:
@@ -89,7 +109,7 @@ def get_article_count(article_date):
     return 0
 
 # === Sauvegarde CSV ===
-def save_to_csv(journal, title, date, desc, content):
+def save_to_csv(journal, title, date, desc, content, url):
     """
     Enregistre un article dans le fichier CSV de sortie.
     Args:
@@ -98,10 +118,12 @@ def save_to_csv(journal, title, date, desc, content):
         date (str): Date de l'article
         desc (str): Description de l'article
         content (str): Texte complet de l'article
+        url (str): URL de l'article (sert à calculer son identifiant stable)
     """
-    with open(OUTPUT_CSV, "a", newline='', encoding="utf-8") as f:
+    with metrics.stage("csv", url), open(OUTPUT_CSV, "a", newline='', encoding="utf-8") as f:
         writer = csv.writer(f)
-        writer.writerow([journal, title, date, desc, content])
+        writer.writerow([journal, title, date, desc, content, url, article_id(url, title, content)])
+    metrics.article_saved(url)
 
 # === Extraction d'un article complet ===
 def get_article_content_lesechos(soup):
@@ -129,8 +151,8 @@ def get_article_content_lesechos(soup):
         date = main_section.find(class_="sc-1h4katp-0")
         content_section = article_section.find(class_="sc-1s859o0-0")
 
-        if not content_section:
-            return None
+        if not content_section or not title or not date:
+            return None  # Titre ou date manquants : pas un article exploitable
 
         # Nettoyage du HTML (suppression des balises <a> et <em>)
         for a in soup.find_all("a"):
@@ -143,8 +165,8 @@ def get_article_content_lesechos(soup):
         content = "\n".join(p.get_text(strip=True) for p in content_section.find_all("p", recursive=False))
         return (
             "Les Echos",
-            title.get_text(strip=True) if title else "Titre indisponible",
-            date.get_text(strip=True) if date else "Date inconnue",
+            title.get_text(strip=True),
+            date.get_text(strip=True),
             desc.get_text(strip=True) if desc else "",
             content
         )
@@ -161,8 +183,26 @@ def fetch_soup(driver, url):
     Retourne :
         BeautifulSoup : La soupe de la page chargée.
     """
-    driver.get(url)
-    return BeautifulSoup(driver.page_source, "html.parser")
+    html = metrics.get_page(driver, url)
+    with metrics.stage("parse", url):
+        return BeautifulSoup(html, "html.parser")
+
+# === Extraction des liens d'une page d'archives ===
+def extract_article_urls_lesechos(soup):
+    """
+    Extrait d'une page d'archives Les Echos les URLs (absolues) des articles.
+    Args:
+        soup (BeautifulSoup): La soupe de la page d'archives.
+    Retourne :
+        list : Les URLs des articles, dans l'ordre de la page
+    """
+    urls = []
+    for card in soup.find_all(class_="sc-19z4l96-2"):
+        a_tag = card.find("a")
+        if not a_tag or "href" not in a_tag.attrs:
+            continue
+        urls.append(BASE_URL + a_tag["href"])
+    return urls
 
 # === Traitement d'une page d'archives ===
 def process_archive_page(driver, year, month, page):
@@ -174,28 +214,25 @@ def process_archive_page(driver, year, month, page):
         month (int): Mois.
         page (int): Numéro de page.
     """
-    url = f"https://www.lesechos.fr/{year}/{month:02d}/?page={page}"
+    url = f"{BASE_URL}/{year}/{month:02d}/?page={page}"
     print(f"🔎 Traitement de {url}")
     soup = fetch_soup(driver, url)
 
-    for card in soup.find_all(class_="sc-19z4l96-2"):
-        a_tag = card.find("a")
-        if not a_tag or "href" not in a_tag.attrs:
-            continue
-        article_url = "https://www.lesechos.fr" + a_tag["href"]
-
+    for article_url in extract_article_urls_lesechos(soup):
         article_soup = fetch_soup(driver, article_url)
         article = get_article_content_lesechos(article_soup)
         if not article:
             continue
 
         _, title, date_str, desc, text = article
+        if not text.strip():
+            continue  # Corps vide : non sauvegardé et non compté dans les 10 articles du jour
 
         if get_article_count(date_str) >= 10:
             print(f"⏭️ Déjà 10 articles pour le {date_str}, on passe.")
             continue
 
-        save_to_csv("Les Echos", title, date_str, desc, text)
+        save_to_csv("Les Echos", title, date_str, desc, text, article_url)
         update_article_count(date_str)
         print(f"✅ Article sauvé : {title[:60]}...")
 
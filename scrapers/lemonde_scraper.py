@@ -8,6 +8,10 @@ import multiprocessing
 from multiprocessing import Lock
 import csv
 from datetime import date, timedelta
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Racine du projet
+from article_ids import article_id
+from crawl_metrics import metrics
 
 ##### lemonde_scraper.py #####
 # Ce Programme est conçu pour récupérer des articles du journal Le Monde à partir de ses archives.
@@ -18,6 +22,8 @@ from datetime import date, timedelta
 
 START_DATE = date(2015, 1, 1)  # Date de départ pour les archives du Monde
 END_DATE = date(2025, 1, 1)  # Date de fin pour les archives du Monde
+# Racine du site (variable d'environnement LEMONDE_BASE_URL pour viser le serveur local de bench/standin_server.py)
+BASE_URL = os.environ.get("LEMONDE_BASE_URL", "https://www.lemonde.fr")
 
 # Configuration des options Selenium pour Firefox (dépend de l'installation de geckodriver)
 options = Options()
@@ -107,7 +113,7 @@ def get_article_content_monde(soup):
     return "Le Monde",article_title, article_date, article_desc, raw_text
 
 # Sauvegarde les informations d'un article dans un fichier CSV (accès protégé par un verrou)
-def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text):
+def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text, article_url):
     """
     Sauvegarde les informations d'un article dans un fichier CSV (accès protégé par un verrou).
 
@@ -117,32 +123,32 @@ def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text):
         article_date (str): La date de l'article.
         article_desc (str): La description de l'article.
         raw_text (str): Le texte brut de l'article.
+        article_url (str): L'URL de l'article (sert à calculer son identifiant stable).
     Returns:
         None
     """
     lock.acquire()
-    with open('articles_test.csv', mode='a') as file:
+    with metrics.stage("csv", article_url), open('articles_test.csv', mode='a') as file:
         writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        writer.writerow([journal_name,article_title, article_date, article_desc, raw_text])
+        writer.writerow([journal_name,article_title, article_date, article_desc, raw_text,
+                         article_url, article_id(article_url, article_title, raw_text)])
     lock.release()
+    metrics.article_saved(article_url)
 
-# Récupère les URLs des articles du Monde pour une date donnée et les traite
-def getArticleURLMonde(driver, soup):
+# Extrait de la page d'archives du Monde les URLs des articles à récupérer
+def extract_article_urls_monde(soup):
     """
-    Récupère les URLs des articles du Monde pour une date donnée et les traite.
+    Extrait de la page d'archives du Monde les URLs des articles à récupérer.
 
     Args:
-        driver (webdriver): Instance Selenium WebDriver.
         soup (BeautifulSoup): La soupe BeautifulSoup de la page d'archives.
 
     Returns:
-        int: Le nombre d'articles sauvegardés.
+        list: Les URLs des articles, dans l'ordre de la page, filtrées selon les mots-clés inclus et exclus.
     """
-    count = 0
+    urls = []
     river = soup.find(class_="river")
     for section in river.find_all(class_="teaser"):
-        if count >= 10:
-            break
         link = section.find("a")
         if not link:
             continue
@@ -151,15 +157,37 @@ def getArticleURLMonde(driver, soup):
             continue
         if any(word in article_url for word in exclu): # Exclut les articles indésirables
             continue
-        if "https://www.lemonde.fr" not in article_url: # Vérifie que l'URL est bien celle du Monde
+        if BASE_URL not in article_url: # Vérifie que l'URL est bien celle du Monde
             continue
+        urls.append(article_url)
+    return urls
+
+# Récupère les URLs des articles du Monde pour une date donnée et les traite
+def getArticleURLMonde(driver, soup):
+    """
+    Récupère les URLs des articles du Monde pour une date donnée et les traite.
+
+    Args:
+        driver (webdriver): Instance Selenium WebDriver.
+        soup (BeautifulSoup): La soupe BeautifulSoup de la page d'archives.
+
+    Returns:
+        int: Le nombre d'articles sauvegardés.
+    """
+    count = 0
+    for article_url in extract_article_urls_monde(soup):
+        if count >= 10:
+            break
         print("Fetching article from URL:", article_url)
         soup = fetch_article(driver, article_url)
         if soup is None:
             continue
         journal_name, article_title, article_date, article_desc, raw_text = get_article_content_monde(soup)
+        if not article_title or not raw_text.strip():
+            # Page de campagne ou sans article : non sauvegardée et non comptée dans les 10 articles du jour
+            continue
         article_date_str = article_date[2] + " " + article_date[3] + " " + article_date[4]
-        saveToCSV(journal_name, article_title, article_date_str, article_desc, raw_text)
+        saveToCSV(journal_name, article_title, article_date_str, article_desc, raw_text, article_url)
         count += 1
     return count
 
@@ -175,10 +203,11 @@ def fetch_article(driver,url):
     Returns:
         BeautifulSoup | None: La soupe BeautifulSoup de la page de l'article, ou None si la page n'est pas trouvée.
     """
-    driver.get(url)
-    if driver.current_url == "https://www.lemonde.fr" or driver.current_url == "https://www.lemonde.fr/en/":
+    html = metrics.get_page(driver, url)
+    if driver.current_url == BASE_URL or driver.current_url == BASE_URL + "/en/":
         return None
-    soup = BeautifulSoup(driver.page_source, "html.parser")
+    with metrics.stage("parse", url):
+        soup = BeautifulSoup(html, "html.parser")
     return soup
 
 # Récupère les archives du Monde pour une date donnée (jusqu'à 10 articles)
@@ -196,7 +225,7 @@ def fetch_archives_monde(driver, date):
     attempts = 0
     saved_articles = 0
     while saved_articles < 10 and attempts < 3:
-        url = f"https://www.lemonde.fr/archives-du-monde/{date}" # URL pour les archives du Monde
+        url = f"{BASE_URL}/archives-du-monde/{date}" # URL pour les archives du Monde
         soup = fetch_article(driver, url)
         if soup:
             saved_articles = getArticleURLMonde(driver, soup)
@@ -216,11 +245,12 @@ def worker_init(date):
         None
     """
     driver = webdriver.Firefox(options=options)
-    driver.get("https://www.lemonde.fr")
+    driver.get(BASE_URL)
     driver.add_cookie({"name": "lmd_a_s", "value": "I%2BMVwLYXuI9D5yqg9arDKw9s8SEStIKz2B8ayMidZPY60Wl9y%2BAwig15cBDVo1Nw"})
     fetch_archives_monde(driver,date)
     save_progress(date)
     driver.quit()
+    metrics.flush()  # Les processus du multiprocessing se terminent sans passer par atexit
 
 if __name__ == "__main__":
 
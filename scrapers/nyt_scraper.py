@@ -7,6 +7,10 @@ from datetime import date, timedelta
 import re 
 from selenium.webdriver.common.by import By
 import csv
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Racine du projet
+from article_ids import article_id
+from crawl_metrics import metrics
 
 ##### nyt_scraper.py #####
 # Ce Programme est conçu pour récupérer des articles du journal The New York Times à partir de ses archives.
@@ -23,6 +27,8 @@ PROGRESS_FILE = "progress_nyt.txt"
 
 START_DATE = date(2015, 1, 1)  # Date de départ pour les archives du NYT
 END_DATE = date(2025, 1, 1)  # Date de fin pour les archives du NYT
+# Racine du site (variable d'environnement NYT_BASE_URL pour viser le serveur local de bench/standin_server.py)
+BASE_URL = os.environ.get("NYT_BASE_URL", "https://www.nytimes.com")
 
 # Dictionnaire pour stocker les cookies (à remplir si besoin avec cookies NYT)
 cookies = {
@@ -68,9 +74,9 @@ def fetch_archives_nyt(driver,date):
     Returns:
         None
     """
-    url = 'https://www.nytimes.com/search?dropmab=false&endDate='+date+'&lang=en&query=&sections=Business|nyt%3A%2F%2Fsection%2F0415b2b0-513a-5e78-80da-21ab770cb753%2CNew%20York|nyt%3A%2F%2Fsection%2F39480374-66d3-5603-9ce1-58cfa12988e2%2COpinion|nyt%3A%2F%2Fsection%2Fd7a71185-aa60-5635-bce0-5fab76c7c297%2CU.S.|nyt%3A%2F%2Fsection%2Fa34d3d6c-c77f-5931-b951-241b4e28681c%2CWorld|nyt%3A%2F%2Fsection%2F70e865b6-cc70-5181-84c9-8368b3a5c34b&sort=best&startDate='+date+'&types=article'
+    url = BASE_URL+'/search?dropmab=false&endDate='+date+'&lang=en&query=&sections=Business|nyt%3A%2F%2Fsection%2F0415b2b0-513a-5e78-80da-21ab770cb753%2CNew%20York|nyt%3A%2F%2Fsection%2F39480374-66d3-5603-9ce1-58cfa12988e2%2COpinion|nyt%3A%2F%2Fsection%2Fd7a71185-aa60-5635-bce0-5fab76c7c297%2CU.S.|nyt%3A%2F%2Fsection%2Fa34d3d6c-c77f-5931-b951-241b4e28681c%2CWorld|nyt%3A%2F%2Fsection%2F70e865b6-cc70-5181-84c9-8368b3a5c34b&sort=best&startDate='+date+'&types=article'
     print(url)
-    soup = fetch_article(url)
+    soup = fetch_article(driver, url, 0)
     getArticleURLNYT(driver,soup)
 
 def fetch_article(driver, url, condition):
@@ -87,19 +93,36 @@ def fetch_article(driver, url, condition):
     """
     driver.set_page_load_timeout(10)
     try:
-        driver.get(url)
+        with metrics.stage("get", url):
+            driver.get(url)
     except TimeoutException:
         print("TIMEOUT !!!")
         reset_ip()
-        driver.get(url)
+        with metrics.stage("get", url):
+            driver.get(url)
     if condition == 1:
         button = driver.find_element(By.CSS_SELECTOR, '[data-testid="search-show-more-button"]')
         button.click()
     time.sleep(1)
-    page_source = driver.page_source
-    soup = BeautifulSoup(page_source, "html.parser")
+    with metrics.stage("page_source", url):
+        page_source = driver.page_source
+    metrics.page(url, page_source, getattr(driver, "status_code", "ok"))
+    with metrics.stage("parse", url):
+        soup = BeautifulSoup(page_source, "html.parser")
     return soup
 
+def extract_search_results_nyt(soup):
+    """
+    Extrait les URLs (relatives) des résultats de la page de recherche du NYT.
+
+    Args:
+        soup (BeautifulSoup): La soupe de la page de résultats de recherche.
+
+    Returns:
+        list: Les URLs des résultats, dans l'ordre de la page.
+    """
+    return [li.find("a")["href"] for li in soup.find_all("li") if li.get("data-testid") == "search-bodega-result"]
+
 def getArticleURLNYT(driver, soup):
     """
     Extrait les URLs des articles et traite chaque article.
@@ -113,52 +136,55 @@ def getArticleURLNYT(driver, soup):
     """
     i=1
     print("Fetching articles from URL")
-    liste = soup.find_all("ol")
-    for li in soup.find_all("li"):
-        if li.get("data-testid") == "search-bodega-result":
-            print(to_fetch)
-            print(articles_fetched)
-            if i<=(10-to_fetch):
-                i+=1
-                continue
-            if i>=(20-articles_fetched):
-                break
-            article_url = li.find("a")["href"]
-            print(article_url)
-            if not re.match(r"^/\d{4}/\d{2}/\d{2}($|/|\?)", article_url):
-                continue
-            article_date = ""+article_url.split("/")[1]+"-"+article_url.split("/")[2]+"-"+article_url.split("/")[3]
-            print(article_date)
-            try:
-                print("Fetching article from URL:", article_url)
-                soup = fetch_article(driver, "https://www.nytimes.com"+article_url,0)
-                journal_name,article_title, article_desc, raw_text = get_article_content_nyt(soup)
-            except ValueError:
-                print("You got Captcha-ed ... RESETTING IP ...")
-                retries = 0
-                while retries<2:
-                    try:
-                        reset_ip()
-                        print("Fetching article from URL:", article_url)
-                        soup = fetch_article(driver, "https://www.nytimes.com"+article_url,0)
-                        journal_name,article_title, article_desc, raw_text = get_article_content_nyt(soup)
-                        break
-                    except ValueError:
-                        retries+=1
-                        continue
-                    except TimeoutException:
-                        retries+=1
-                        continue
-                if retries==2: 
-                    print("Driver is flagged, resetting ...")
-                    # Réinitialise le driver et relance la fonction principale
-                    driver.quit()
-                    main()
-            saveToCSV(journal_name,article_title, article_date, article_desc, raw_text)
-            i=i+1
-            print(article_title+" saved to CSV")
-
-def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text):
+    for article_url in extract_search_results_nyt(soup):
+        print(to_fetch)
+        print(articles_fetched)
+        if i<=(10-to_fetch):
+            i+=1
+            continue
+        if i>=(20-articles_fetched):
+            break
+        print(article_url)
+        if not re.match(r"^/\d{4}/\d{2}/\d{2}($|/|\?)", article_url):
+            continue
+        article_date = ""+article_url.split("/")[1]+"-"+article_url.split("/")[2]+"-"+article_url.split("/")[3]
+        print(article_date)
+        try:
+            print("Fetching article from URL:", article_url)
+            soup = fetch_article(driver, BASE_URL+article_url,0)
+            journal_name,article_title, article_desc, raw_text = get_article_content_nyt(soup)
+        except ValueError:
+            print("You got Captcha-ed ... RESETTING IP ...")
+            metrics.count_status(BASE_URL+article_url, "captcha")
+            retries = 0
+            while retries<2:
+                try:
+                    reset_ip()
+                    print("Fetching article from URL:", article_url)
+                    soup = fetch_article(driver, BASE_URL+article_url,0)
+                    journal_name,article_title, article_desc, raw_text = get_article_content_nyt(soup)
+                    break
+                except ValueError:
+                    retries+=1
+                    continue
+                except TimeoutException:
+                    retries+=1
+                    continue
+            if retries==2: 
+                print("Driver is flagged, resetting ...")
+                # Réinitialise le driver et relance la fonction principale
+                driver.quit()
+                main()
+        if not article_title or not raw_text.strip():
+            # Page sans article : non sauvegardée et non comptée dans les 10 articles du jour
+            print("No article content, skipping")
+            continue
+        saveToCSV(journal_name,article_title, article_date, article_desc, raw_text,
+                  BASE_URL+article_url)
+        i=i+1
+        print(article_title+" saved to CSV")
+
+def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text, article_url):
     """
     Sauvegarde les informations de l'article dans un fichier CSV.
 
@@ -168,13 +194,16 @@ def saveToCSV(journal_name,article_title, article_date, article_desc, raw_text):
         article_date (str): La date de l'article.
         article_desc (str): La description de l'article.
         raw_text (str): Le texte brut de l'article.
+        article_url (str): L'URL de l'article (sert à calculer son identifiant stable).
 
     Returns:
         None
     """
-    with open('article_nyt.csv', mode='a') as file:
+    with metrics.stage("csv", article_url), open('article_nyt.csv', mode='a') as file:
         writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        writer.writerow([journal_name,article_title, article_date, article_desc, raw_text])
+        writer.writerow([journal_name,article_title, article_date, article_desc, raw_text,
+                         article_url, article_id(article_url, article_title, raw_text)])
+    metrics.article_saved(article_url)
     update_article_count(article_date)
 
 def update_article_count(article_date):
@@ -222,7 +251,7 @@ def get_article_content_nyt(soup):
         if soup.find("iframe", {"src": lambda x: x and "captcha-delivery.com" in x}): # Détection de captcha
             raise ValueError("You got Captcha-ed ... RESETTING IP ...") # Réinitialisation de l'IP
         else :
-            return "The New York Times", "",["","","","",""],"",""
+            return "The New York Times", "", "", ""  # Page sans article : rien à sauvegarder
     article_title = article_title.get_text(strip=True)
     article_desc = soup.find(id="article-summary")
     if not article_desc :
@@ -230,6 +259,8 @@ def get_article_content_nyt(soup):
     if article_desc:
         article_desc = article_desc.get_text(strip=True)
     article_content = soup.find(class_="meteredContent")
+    if not article_content:
+        return "The New York Times", article_title, article_desc or "", ""
     raw_text = "\n".join(p.get_text(strip=True) for p in article_content.find_all(["p"],recursive=True))
     return "The New York Times",article_title, article_desc, raw_text
 
@@ -296,7 +327,7 @@ def main():
     daily_counts = process_daily_article_counts(daily_counts_file)
 
     with Driver(uc=True, headless=False) as driver:
-        driver.get("https://www.nytimes.com/")
+        driver.get(BASE_URL+"/")
         for key, value in cookies.items():
             driver.add_cookie({'name': key, 'value': value})
         print(f"Added {len(cookies)} cookies.")
@@ -0,0 +1,245 @@
+import os
+import json
+import glob
+import time
+import shutil
+import numpy as np
+import pandas as pd
+import zstandard
+
+### text_store.py ###
+# Ce module stocke les articles dans un format compressé : le texte des articles (colonne "content"), qui représente
+# l'essentiel du volume, est compressé article par article avec zstd et un dictionnaire entraîné pour chaque journal
+# sur un échantillon de ses articles. Le dictionnaire contient les passages répétés d'un article à l'autre
+# (encarts d'abonnement du Monde, "RELATED ARTICLES" du Daily Mail, signatures...), qui ne coûtent alors presque
+# plus rien, même pour un article court compressé seul.
+# Un store est un dossier "<nom>.zstore" :
+# - metadata.csv : toutes les colonnes sauf "content" (journal, titre, date, label...),
+# - content.bin : les textes compressés mis bout à bout,
+# - index.npy : position, taille et dictionnaire du texte de chaque article (accès direct à un article),
+# - dict_<k>.zdict et meta.json : dictionnaires des journaux, paramètres de compression et types des colonnes
+#   (rétablis à la lecture de metadata.csv).
+# read_articles et write_articles lisent et écrivent indifféremment un CSV, un Parquet ou un store : les scripts
+# qui les utilisent (openai_label.py, local_label.py, hybrid_label.py, fine_tune.py...) acceptent les trois formats.
+
+STORE_SUFFIX = ".zstore"  # Extension des dossiers de store
+INPUT_FILES = "*_with_bias*.csv"  # Fichiers convertis par l'exécution du script (motif glob)
+COMPRESSION_LEVEL = 15  # Niveau de compression zstd (1 à 22 ; plus lent à écrire, la lecture reste aussi rapide)
+DICT_SIZE = 112_640  # Taille maximale du dictionnaire d'un journal (en octets)
+DICT_SAMPLE_ARTICLES = 2000  # Nombre d'articles tirés au hasard pour entraîner le dictionnaire d'un journal
+DICT_MIN_ARTICLES = 100  # En dessous de ce nombre d'articles, le journal est compressé sans dictionnaire
+SEED = 42  # Graine du tirage de l'échantillon
+
+NO_DICT = -1  # Article compressé sans dictionnaire
+MISSING = -1  # Taille d'un texte absent (NaN)
+
+def is_store(path):
+    return str(path).rstrip("/").endswith(STORE_SUFFIX)
+
+# Journal de chaque article ("Unknown" s'il est absent ou si le DataFrame n'a pas de colonne "newspaper")
+def newspaper_names(df):
+    if "newspaper" not in df:
+        return pd.Series("Unknown", index=df.index)
+    return df["newspaper"].fillna("Unknown")
+
+# Entraîne un dictionnaire zstd par journal à partir d'un échantillon de ses articles
+# Retourne la liste des journaux et celle de leurs dictionnaires.
+def train_dictionaries(df, dict_size=DICT_SIZE, sample_articles=DICT_SAMPLE_ARTICLES,
+                       min_articles=DICT_MIN_ARTICLES, seed=SEED):
+    newspapers, dictionaries = [], []
+    contents = df["content"].dropna().astype(str)
+    for newspaper, texts in contents.groupby(newspaper_names(df)):
+        if len(texts) < min_articles:
+            continue
+        sample = texts.sample(min(sample_articles, len(texts)), random_state=seed)
+        try:
+            dictionary = zstandard.train_dictionary(dict_size, [text.encode("utf-8") for text in sample])
+        except zstandard.ZstdError:
+            continue  # Échantillon trop petit ou trop peu répétitif : pas de dictionnaire
+        newspapers.append(newspaper)
+        dictionaries.append(dictionary)
+    return newspapers, dictionaries
+
+# Compresse les textes d'un DataFrame et les ajoute à la fin de content.bin
+# Retourne l'index (position, taille, dictionnaire) des textes ajoutés.
+def _append_contents(df, path, newspapers, dictionaries, level):
+    compressors = [zstandard.ZstdCompressor(level=level, dict_data=d) for d in dictionaries]
+    plain = zstandard.ZstdCompressor(level=level)
+    dict_ids = pd.Series(range(len(newspapers)), index=newspapers, dtype=np.int64)
+    dict_ids = newspaper_names(df).map(dict_ids).fillna(NO_DICT).astype(np.int64).to_numpy()
+    index = np.empty((len(df), 3), dtype=np.int64)
+    with open(os.path.join(path, "content.bin"), "ab") as file:
+        offset = file.tell()
+        for row, (content, dict_id) in enumerate(zip(df["content"], dict_ids)):
+            if pd.isna(content):
+                index[row] = (offset, MISSING, dict_id)
+                continue
+            compressor = compressors[dict_id] if dict_id != NO_DICT else plain
+            frame = compressor.compress(str(content).encode("utf-8"))
+            file.write(frame)
+            index[row] = (offset, len(frame), dict_id)
+            offset += len(frame)
+    return index
+
+# Écrit les dictionnaires numérotés à partir de first (dict_<first>.zdict, dict_<first + 1>.zdict...)
+def _write_dictionaries(path, dictionaries, first=0):
+    for k, dictionary in enumerate(dictionaries, start=first):
+        with open(os.path.join(path, f"dict_{k}.zdict"), "wb") as file:
+            file.write(dictionary.as_bytes())
+
+def _write_meta(path, meta):
+    with open(os.path.join(path, "meta.json"), "w") as file:
+        json.dump(meta, file, indent=2, ensure_ascii=False)
+
+# Écrit un DataFrame d'articles dans un nouveau store (les dictionnaires sont entraînés sur ce DataFrame)
+def write_store(df, path, level=COMPRESSION_LEVEL, dict_size=DICT_SIZE):
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    newspapers, dictionaries = train_dictionaries(df, dict_size)
+    _write_dictionaries(path, dictionaries)
+    dtypes = {column: str(dtype) for column, dtype in df.dtypes.items() if column != "content"}
+    _write_meta(path, {"columns": list(df.columns), "dtypes": dtypes, "newspapers": newspapers, "level": level})
+    np.save(os.path.join(path, "index.npy"), _append_contents(df, path, newspapers, dictionaries, level))
+    df.drop(columns="content").to_csv(os.path.join(path, "metadata.csv"), index=False)
+
+# Ajoute des articles à un store existant, avec les dictionnaires déjà entraînés
+# Un journal sans dictionnaire qui atteint DICT_MIN_ARTICLES (articles du store et ajoutés) reçoit le sien, entraîné
+# sur l'ensemble de ses articles ; ses articles déjà stockés restent compressés sans dictionnaire.
+def append_store(df, path):
+    store = TextStore(path)
+    if list(df.columns) != store.columns:
+        raise ValueError(f"Colonnes différentes de celles du store {path} : {store.columns}")
+    new_names = newspaper_names(df)
+    missing = set(new_names) - set(store.newspapers)
+    if missing:
+        stored = np.flatnonzero(newspaper_names(store.metadata).isin(missing))
+        candidates = pd.concat([pd.DataFrame({"newspaper": newspaper_names(store.metadata).iloc[stored],
+                                              "content": store.contents(stored)}),
+                                pd.DataFrame({"newspaper": new_names[new_names.isin(missing)],
+                                              "content": df["content"][new_names.isin(missing)]})],
+                               ignore_index=True)
+        newspapers, dictionaries = train_dictionaries(candidates)
+        if newspapers:
+            _write_dictionaries(path, dictionaries, first=len(store.newspapers))
+            store.newspapers, store.dictionaries = store.newspapers + newspapers, store.dictionaries + dictionaries
+            _write_meta(path, {"columns": store.columns, "dtypes": store.dtypes, "newspapers": store.newspapers,
+                               "level": store.level})
+    index = _append_contents(df, path, store.newspapers, store.dictionaries, store.level)
+    np.save(os.path.join(path, "index.npy"), np.concatenate([store.index, index]))
+    df.drop(columns="content").to_csv(os.path.join(path, "metadata.csv"), mode="a", header=False, index=False)
+
+
+# Lecture d'un store : métadonnées en mémoire, textes décompressés à la demande (accès direct par position)
+class TextStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as file:
+            meta = json.load(file)
+        self.columns, self.newspapers, self.level = meta["columns"], meta["newspapers"], meta["level"]
+        self.dtypes = meta.get("dtypes", {})  # Absent des stores écrits avant l'enregistrement des types
+        self.dictionaries = []
+        for k in range(len(self.newspapers)):
+            with open(os.path.join(path, f"dict_{k}.zdict"), "rb") as file:
+                self.dictionaries.append(zstandard.ZstdCompressionDict(file.read()))
+        self.decompressors = [zstandard.ZstdDecompressor(dict_data=d) for d in self.dictionaries]
+        self.plain = zstandard.ZstdDecompressor()
+        self.index = np.load(os.path.join(path, "index.npy"))
+        self._metadata = None
+        content_file = os.path.join(path, "content.bin")
+        self.data = np.memmap(content_file, dtype=np.uint8, mode="r") if os.path.getsize(content_file) else b""
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            metadata = pd.read_csv(os.path.join(self.path, "metadata.csv"), float_precision="round_trip")
+            for column, dtype in self.dtypes.items():
+                if dtype.startswith("datetime64"):
+                    metadata[column] = pd.to_datetime(metadata[column]).astype(dtype)
+                elif column in metadata and str(metadata[column].dtype) != dtype:
+                    metadata[column] = metadata[column].astype(dtype)
+            self._metadata = metadata
+        return self._metadata
+
+    def __len__(self):
+        return len(self.index)
+
+    # Texte de l'article en position i (NaN s'il était absent)
+    def content(self, i):
+        offset, size, dict_id = self.index[i]
+        if size == MISSING:
+            return np.nan
+        decompressor = self.decompressors[dict_id] if dict_id != NO_DICT else self.plain
+        return decompressor.decompress(bytes(self.data[offset:offset + size])).decode("utf-8")
+
+    # Textes de plusieurs articles (tous par défaut)
+    def contents(self, positions=None):
+        positions = range(len(self)) if positions is None else positions
+        return [self.content(i) for i in positions]
+
+    # Articles complets (métadonnées et texte) aux positions données
+    def articles(self, positions=None):
+        df = self.metadata if positions is None else self.metadata.iloc[positions]
+        return df.assign(content=self.contents(positions))[self.columns]
+
+
+# Lit un fichier d'articles CSV, Parquet ou un store compressé
+# columns : colonnes à lire (les textes d'un store ne sont décompressés que si "content" est demandé)
+def read_articles(path, columns=None):
+    if is_store(path):
+        store = TextStore(path)
+        if columns is not None and "content" not in columns:
+            return store.metadata[list(columns)]
+        df = store.articles()
+        return df if columns is None else df[list(columns)]
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+# Lit un fichier d'articles CSV, Parquet ou un store compressé par morceaux de chunksize articles
+def iter_articles(path, chunksize):
+    if is_store(path):
+        store = TextStore(path)
+        for start in range(0, len(store), chunksize):
+            yield store.articles(range(start, min(start + chunksize, len(store))))
+    elif path.endswith(".parquet"):
+        yield pd.read_parquet(path)
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+# Écrit un fichier d'articles CSV, Parquet ou un store compressé (selon l'extension)
+def write_articles(df, path):
+    if is_store(path):
+        write_store(df, path)
+    elif path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+# Taille totale d'un fichier ou d'un dossier (en octets)
+def disk_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(file) for file in glob.glob(os.path.join(path, "*")))
+    return os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    # Convertit chaque fichier en store et compare la taille et les temps de lecture
+    for csv_path in sorted(glob.glob(INPUT_FILES)):
+        store_path = os.path.splitext(csv_path)[0] + STORE_SUFFIX
+        df = pd.read_csv(csv_path)
+        start = time.time()
+        write_store(df, store_path)
+        elapsed = time.time() - start
+        csv_size, store_size = disk_size(csv_path), disk_size(store_path)
+        print(f"{csv_path}: {csv_size / 1e6:.1f} MB -> {store_path}: {store_size / 1e6:.1f} MB "
+              f"(x{csv_size / store_size:.1f}, written in {elapsed:.1f}s)")
+
+        start = time.time()
+        restored = read_articles(store_path)
+        print(f"  full read: {time.time() - start:.2f}s, identical: {restored.equals(df)}")
+        store = TextStore(store_path)
+        positions = np.random.default_rng(SEED).integers(0, len(store), size=min(1000, len(store)))
+        start = time.time()
+        store.contents(positions)
+        print(f"  random access: {(time.time() - start) / len(positions) * 1e6:.0f} µs per article")
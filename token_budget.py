@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import hashlib
+
+### token_budget.py ###
+# Ce module regroupe les outils de comptage de tokens utilisés avant la labellisation :
+# - comptage de tous les textes d'un dataset en une fois avec l'encodeur batch de tiktoken (multi-thread),
+#   avec un cache SQLite des comptes pour ne jamais réencoder un texte déjà vu,
+# - troncature des articles trop longs à un budget de tokens en gardant le début et la fin de l'article,
+# - prévision du coût et de la durée d'un run avant de le lancer.
+
+TOKEN_COUNT_CACHE = "token_counts.sqlite"  # Fichier SQLite du cache des comptes de tokens
+NUM_THREADS = os.cpu_count() or 4  # Nombre de threads pour l'encodage batch
+TRUNCATION_MARKER = "\n[...]\n"  # Inséré entre le début et la fin d'un article tronqué
+
+# Hash d'un texte utilisé comme clé du cache
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# Compte les tokens d'une liste de textes
+# Les comptes déjà connus sont lus dans le cache, les autres sont calculés en une fois avec encode_batch.
+def count_tokens(encoding, texts, num_threads=NUM_THREADS, cache_path=TOKEN_COUNT_CACHE):
+    texts = [str(text) for text in texts]
+    keys = [text_hash(text) for text in texts]
+    counts = {}
+
+    conn = None
+    if cache_path:
+        conn = sqlite3.connect(cache_path)
+        conn.execute("CREATE TABLE IF NOT EXISTS token_counts (key TEXT PRIMARY KEY, n_tokens INTEGER)")
+        unique_keys = list(set(keys))
+        for i in range(0, len(unique_keys), 900):  # Limite SQLite du nombre de paramètres par requête
+            chunk = unique_keys[i:i + 900]
+            rows = conn.execute(
+                f"SELECT key, n_tokens FROM token_counts WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            counts.update(rows)
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in counts and key not in missing:
+            missing[key] = text
+    if missing:
+        encoded = encoding.encode_batch(list(missing.values()), num_threads=num_threads)
+        new_counts = {key: len(tokens) for key, tokens in zip(missing.keys(), encoded)}
+        counts.update(new_counts)
+        if conn is not None:
+            conn.executemany("INSERT OR REPLACE INTO token_counts VALUES (?, ?)", new_counts.items())
+            conn.commit()
+    if conn is not None:
+        conn.close()
+    return [counts[key] for key in keys]
+
+
+# Sélectionne le début et la fin d'un texte pour tenir dans le budget
+# On garde des paragraphes entiers tant que possible (le début porte le sujet, la fin la conclusion),
+# et on ne coupe au niveau des tokens que si le premier paragraphe dépasse à lui seul la part du début.
+def select_head_tail(encoding, paragraphs, paragraph_tokens, budget, head_ratio=0.7):
+    head_budget = int(budget * head_ratio)
+    head, used, cut = [], 0, False
+    for paragraph, n_tokens in zip(paragraphs, paragraph_tokens):
+        if used + n_tokens > head_budget:
+            break
+        head.append(paragraph)
+        used += n_tokens
+    if not head:
+        head = [encoding.decode(encoding.encode(paragraphs[0])[:head_budget])]
+        used, cut = head_budget, True
+
+    tail_budget = budget - used
+    tail, used = [], 0
+    for paragraph, n_tokens in zip(reversed(paragraphs[len(head):]), reversed(paragraph_tokens[len(head):])):
+        if used + n_tokens > tail_budget:
+            break
+        tail.insert(0, paragraph)
+        used += n_tokens
+    if not cut and len(head) + len(tail) >= len(paragraphs):
+        return "\n".join(head + tail)
+    return "\n".join(head) + TRUNCATION_MARKER + "\n".join(tail)
+
+
+# Tronque chaque texte dont le nombre de tokens dépasse le budget
+# Les paragraphes de tous les textes trop longs sont encodés ensemble avec encode_batch.
+def truncate_to_budget(encoding, texts, token_counts, budget, head_ratio=0.7, num_threads=NUM_THREADS):
+    texts = [str(text) for text in texts]
+    too_long = [i for i, n_tokens in enumerate(token_counts) if n_tokens > budget]
+    if not too_long:
+        return texts
+
+    split = {i: texts[i].split("\n") for i in too_long}
+    all_paragraphs = [paragraph for i in too_long for paragraph in split[i]]
+    all_counts = [len(tokens) for tokens in encoding.encode_batch(all_paragraphs, num_threads=num_threads)]
+
+    truncated = list(texts)
+    offset = 0
+    for i in too_long:
+        n = len(split[i])
+        truncated[i] = select_head_tail(encoding, split[i], all_counts[offset:offset + n], budget, head_ratio)
+        offset += n
+    print(f"{len(too_long)} articles truncated to {budget} tokens")
+    return truncated
+
+
+# Prévision du coût et de la durée d'un run à partir du nombre de tokens de chaque requête
+# La durée est bornée par la limite de tokens par minute (TPM) et par celle de requêtes par minute (RPM).
+def forecast_run(prompt_tokens, output_tokens_per_request, price_input_per_m, price_output_per_m,
+                 tpm_limit, rpm_limit=None):
+    n_requests = len(prompt_tokens)
+    input_tokens = int(sum(prompt_tokens))
+    output_tokens = n_requests * output_tokens_per_request
+    cost = input_tokens / 1e6 * price_input_per_m + output_tokens / 1e6 * price_output_per_m
+    minutes = input_tokens / tpm_limit
+    if rpm_limit:
+        minutes = max(minutes, n_requests / rpm_limit)
+    forecast = {
+        "requests": n_requests,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": cost,
+        "minutes": minutes,
+    }
+    print(f"Forecast: {n_requests} requests, {input_tokens} input tokens, ~{output_tokens} output tokens, "
+          f"~${cost:.2f}, ~{minutes:.0f} min")
+    return forecast
@@ -0,0 +1,106 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from text_store import iter_articles
+
+### token_cache.py ###
+# Ce module pré-tokenise un dataset d'articles annotés une fois pour toutes et stocke les tokens
+# dans des fichiers binaires lus en mémoire mappée (numpy.memmap) par fine_tune.py.
+# Le cache est identifié par le tokenizer, la longueur maximale et un hash du fichier de données :
+# relancer un entraînement sur les mêmes données ne retokenise rien, et un dataset plus gros que la RAM
+# reste utilisable puisque le CSV est lu par morceaux et que les tokens ne sont jamais chargés en entier.
+
+TOKEN_CACHE_DIR = "./token_cache"  # Dossier racine des caches de tokens
+CSV_CHUNK_SIZE = 5000  # Nombre de lignes du CSV lues et tokenisées à la fois
+CACHE_VERSION = 1  # À incrémenter si le format du cache ou le nettoyage des données change
+
+# Hash du contenu d'un fichier (lu par blocs pour ne pas le charger en mémoire)
+# Pour un store compressé (dossier, voir text_store.py), hash de tous ses fichiers
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    paths = sorted(os.path.join(path, name) for name in os.listdir(path)) if os.path.isdir(path) else [path]
+    for file_path in paths:
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(block_size), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+# Clé du cache : tokenizer (nom et taille du vocabulaire), paramètres de tokenisation et hash des données
+def cache_key(tokenizer, data_hash, **params):
+    description = {
+        "version": CACHE_VERSION,
+        "tokenizer": tokenizer.name_or_path,
+        "tokenizer_class": type(tokenizer).__name__,
+        "vocab_size": len(tokenizer),
+        "data": data_hash,
+        **params,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+# Tokenise le CSV par morceaux et écrit les tokens dans le dossier du cache
+# prepare_chunk nettoie un morceau du CSV (mêmes règles que pour l'entraînement) et retourne un DataFrame
+# avec les colonnes "content" et "class_label".
+# Fichiers écrits : input_ids.bin (int32, tokens de tous les articles à la suite), lengths.bin (int32),
+# labels.bin (int64) et meta.json.
+def build_token_cache(csv_file, tokenizer, cache_path, prepare_chunk, max_length=512, tokenizer_kwargs=None):
+    tmp_path = cache_path + ".tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    n_articles = 0
+    n_tokens = 0
+    with open(os.path.join(tmp_path, "input_ids.bin"), "wb") as ids_file, \
+         open(os.path.join(tmp_path, "lengths.bin"), "wb") as lengths_file, \
+         open(os.path.join(tmp_path, "labels.bin"), "wb") as labels_file:
+        for chunk in iter_articles(csv_file, CSV_CHUNK_SIZE):
+            chunk = prepare_chunk(chunk)
+            if chunk.empty:
+                continue
+            encodings = tokenizer(chunk["content"].tolist(), truncation=True, max_length=max_length,
+                                  **(tokenizer_kwargs or {}))
+            lengths = np.array([len(ids) for ids in encodings["input_ids"]], dtype=np.int32)
+            np.concatenate([np.asarray(ids, dtype=np.int32) for ids in encodings["input_ids"]]).tofile(ids_file)
+            lengths.tofile(lengths_file)
+            chunk["class_label"].to_numpy(dtype=np.int64).tofile(labels_file)
+            n_articles += len(lengths)
+            n_tokens += int(lengths.sum())
+            print(f"Tokenized {n_articles} articles ({n_tokens} tokens)")
+    with open(os.path.join(tmp_path, "meta.json"), "w") as file:
+        json.dump({"n_articles": n_articles, "n_tokens": n_tokens, "csv_file": csv_file,
+                   "tokenizer": tokenizer.name_or_path, "max_length": max_length}, file, indent=2)
+    # Le dossier n'est renommé qu'une fois complet : un cache interrompu n'est jamais utilisé
+    if os.path.exists(cache_path):
+        shutil.rmtree(cache_path)
+    os.replace(tmp_path, cache_path)
+
+
+# Ouvre un cache en mémoire mappée
+# Retourne un dict avec input_ids (memmap), offsets, lengths et labels (les deux derniers sont petits et lus en entier).
+def load_token_cache(cache_path):
+    with open(os.path.join(cache_path, "meta.json"), "r") as file:
+        meta = json.load(file)
+    lengths = np.fromfile(os.path.join(cache_path, "lengths.bin"), dtype=np.int32).astype(np.int64)
+    input_ids = np.memmap(os.path.join(cache_path, "input_ids.bin"), dtype=np.int32, mode="r",
+                          shape=(meta["n_tokens"],)) if meta["n_tokens"] else np.zeros(0, dtype=np.int32)
+    return {
+        "input_ids": input_ids,
+        "lengths": lengths,
+        "offsets": np.concatenate([[0], np.cumsum(lengths)]),
+        "labels": np.fromfile(os.path.join(cache_path, "labels.bin"), dtype=np.int64),
+        "meta": meta,
+    }
+
+
+# Retourne le cache de tokens du fichier CSV, en le construisant s'il n'existe pas encore
+def get_token_cache(csv_file, tokenizer, prepare_chunk, max_length=512, cache_dir=TOKEN_CACHE_DIR,
+                    tokenizer_kwargs=None):
+    key = cache_key(tokenizer, file_hash(csv_file), max_length=max_length, tokenizer_kwargs=tokenizer_kwargs or {})
+    cache_path = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(cache_path, "meta.json")):
+        print(f"Building token cache {cache_path} ...")
+        build_token_cache(csv_file, tokenizer, cache_path, prepare_chunk, max_length, tokenizer_kwargs)
+    else:
+        print(f"Using token cache {cache_path}")
+    return load_token_cache(cache_path)
@@ -0,0 +1,120 @@
+import re
+import pandas as pd
+from text_store import read_articles, write_articles
+
+### validate_articles.py ###
+# Ce script vérifie les articles scrapés avant la labellisation et met de côté ceux qui ne sont pas de vrais articles :
+# corps vide ou trop court (pages de campagne, pages non-articles du NYT...), date illisible, titre manquant,
+# texte de remplissage ("Titre indisponible", "Date inconnue", murs d'abonnement...) ou langue différente
+# de celle du journal. Les règles sont définies par journal et toutes les vérifications sont vectorisées
+# (une opération pandas par règle sur tout le dataset). Les articles rejetés sont écrits dans un fichier
+# de quarantaine avec les raisons du rejet, pour ne plus payer la labellisation d'articles vides.
+
+INPUT_FILE = "articles_monde.csv"  # Fichier CSV des articles scrapés
+OUTPUT_FILE = "articles_monde_valid.csv"  # Articles valides (à labelliser)
+QUARANTINE_FILE = "articles_monde_quarantine.csv"  # Articles rejetés, avec la colonne "reasons"
+
+# Règles par journal : longueur minimale du corps (en caractères) et langue attendue
+DEFAULT_RULES = {"min_chars": 400, "language": None}
+NEWSPAPER_RULES = {
+    "Le Monde": {"min_chars": 500, "language": "fr"},
+    "20 Minutes": {"min_chars": 300, "language": "fr"},
+    "Les Echos": {"min_chars": 500, "language": "fr"},
+    "The New York Times": {"min_chars": 500, "language": "en"},
+    "Daily Mail": {"min_chars": 400, "language": "en"},
+}
+
+# Textes de remplissage produits par les scrapers ou les sites (titre, date ou corps de l'article)
+BOILERPLATE_PATTERN = re.compile(
+    r"titre indisponible|date inconnue|cet article est réservé aux abonnés|il vous reste \d+% de cet article"
+    r"|subscribe to continue reading|please enable javascript|you have been blocked|access denied",
+    re.IGNORECASE,
+)
+
+# Mots-outils fréquents utilisés pour vérifier la langue du corps de l'article
+STOPWORDS = {
+    "fr": ["le", "la", "les", "des", "est", "une", "du", "et", "que", "qui", "dans", "pour", "pas", "sur", "au"],
+    "en": ["the", "and", "is", "of", "to", "that", "with", "for", "was", "on", "are", "by", "this", "from", "it"],
+}
+LANGUAGE_SAMPLE_CHARS = 2000  # Nombre de caractères du début du corps utilisés pour la vérification de langue
+
+FRENCH_MONTHS = {
+    "janvier": 1, "février": 2, "fevrier": 2, "mars": 3, "avril": 4, "mai": 5, "juin": 6, "juillet": 7,
+    "août": 8, "aout": 8, "septembre": 9, "octobre": 10, "novembre": 11, "décembre": 12, "decembre": 12,
+}
+
+# Convertit une colonne de dates (ISO "YYYY-MM-DD" ou française "1 janvier 2015" / "1er janvier 2015") en datetime
+# Les dates illisibles donnent NaT.
+def parse_dates(dates):
+    dates = dates.fillna("").astype(str).str.strip()
+    iso = pd.to_datetime(dates.str[:10], format="%Y-%m-%d", errors="coerce")
+    parts = dates.str.lower().str.extract(r"^(\d{1,2})(?:er)?\s+([a-zéûô]+)\s+(\d{4})$")
+    french = pd.to_datetime(
+        pd.DataFrame({
+            "year": pd.to_numeric(parts[2], errors="coerce"),
+            "month": parts[1].map(FRENCH_MONTHS),
+            "day": pd.to_numeric(parts[0], errors="coerce"),
+        }),
+        errors="coerce",
+    )
+    return iso.fillna(french)
+
+# Compte les mots-outils d'une langue dans chaque texte
+def count_stopwords(texts, language):
+    return texts.str.count(r"\b(?:" + "|".join(STOPWORDS[language]) + r")\b")
+
+# Applique toutes les règles à un DataFrame d'articles
+# Retourne un DataFrame de booléens (une colonne par règle, True si l'article échoue la règle).
+# Sans colonne "newspaper", les règles par défaut (DEFAULT_RULES) s'appliquent à tous les articles.
+def check_articles(df):
+    newspapers = df["newspaper"] if "newspaper" in df else [None] * len(df)
+    rules = pd.DataFrame([NEWSPAPER_RULES.get(name, DEFAULT_RULES) for name in newspapers], index=df.index,
+                         columns=list(DEFAULT_RULES))  # Colonnes présentes même pour un DataFrame vide
+    title = df["title"].fillna("").astype(str).str.strip()
+    content = df["content"].fillna("").astype(str).str.strip()
+
+    failures = pd.DataFrame(index=df.index)
+    failures["empty_body"] = content.str.len() == 0
+    failures["short_body"] = ~failures["empty_body"] & (content.str.len() < rules["min_chars"])
+    failures["missing_title"] = title.str.len() == 0
+    failures["bad_date"] = parse_dates(df["date"]).isna()
+    failures["boilerplate"] = (
+        title.str.contains(BOILERPLATE_PATTERN)
+        | df["date"].fillna("").astype(str).str.contains(BOILERPLATE_PATTERN)
+        | content.str[:LANGUAGE_SAMPLE_CHARS].str.contains(BOILERPLATE_PATTERN)
+    )
+
+    # Langue : le début du corps doit contenir plus de mots-outils de la langue attendue que de l'autre langue
+    sample = content.str[:LANGUAGE_SAMPLE_CHARS].str.lower()
+    french, english = count_stopwords(sample, "fr"), count_stopwords(sample, "en")
+    failures["wrong_language"] = ~failures["empty_body"] & (
+        ((rules["language"] == "fr") & (french <= english)) | ((rules["language"] == "en") & (english <= french))
+    )
+    return failures
+
+# Sépare les articles valides des articles rejetés
+# Retourne (articles valides, articles rejetés avec la colonne "reasons" listant les règles échouées).
+def validate_articles(df):
+    failures = check_articles(df)
+    rejected = failures.any(axis=1).to_numpy()
+    # Produit booléen x nom de règle : concatène les noms des règles échouées de chaque ligne
+    reasons = failures.dot(failures.columns + ";").str.rstrip(";")
+    quarantine = df[rejected].copy()
+    quarantine["reasons"] = reasons[rejected]
+    return df[~rejected], quarantine
+
+# Affiche le nombre d'articles rejetés par règle et par journal
+def print_report(df, quarantine):
+    print(f"{len(df) - len(quarantine)} / {len(df)} articles valid, {len(quarantine)} quarantined")
+    if len(quarantine):
+        print(quarantine["reasons"].str.split(";").explode().value_counts().to_string())
+        if "newspaper" in quarantine:
+            print(quarantine.groupby("newspaper").size().to_string())
+
+
+if __name__ == "__main__":
+    df = read_articles(INPUT_FILE)
+    valid, quarantine = validate_articles(df)
+    write_articles(valid, OUTPUT_FILE)
+    quarantine.to_csv(QUARANTINE_FILE, index=False)
+    print_report(df, quarantine)